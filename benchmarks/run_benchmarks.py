@@ -0,0 +1,245 @@
+"""Engine benchmarks for runci.
+
+Runs synthetic projects through the engine with in-process runners, so that
+only the engine overhead is measured, and saves the results as JSON:
+
+    python benchmarks/run_benchmarks.py -o results.json
+    python benchmarks/run_benchmarks.py --quick --baseline results.json
+"""
+import asyncio
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+
+import click
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from runci.cli.main import run_project  # noqa: E402
+from runci.engine import core  # noqa: E402
+from runci.engine.runner.base import RunnerBase  # noqa: E402
+from runci.entities import event  # noqa: E402
+from runci.entities.config import Project, Target, Step  # noqa: E402
+from runci.entities.parameters import Parameters  # noqa: E402
+
+RESULTS_VERSION = 1
+
+
+class NoopRunner(RunnerBase):
+    "Runner doing nothing but sleeping for the optional duration of its spec"
+    _selector = 'bench-noop'
+
+    async def run_internal(self, context):
+        await asyncio.sleep(self._step.spec.get('sleep', 0))
+
+
+class OutputRunner(RunnerBase):
+    "Runner emitting as many output chunks as its spec asks for"
+    _selector = 'bench-output'
+
+    async def run_internal(self, context):
+        chunk = b'x' * (self._step.spec.get('size', 80) - 1) + b'\n'
+        for i in range(self._step.spec.get('count', 1000)):
+            self._log_message(sys.stdout, chunk)
+            if i % 100 == 0:
+                # Let the event bus run, the way pipe reads interleave with it.
+                await asyncio.sleep(0)
+
+
+def _target(name, dependencies, step_type='bench-noop', spec=None):
+    return Target(name, dependencies, [Step(name, step_type, spec or dict())])
+
+
+def chain_project(size: int) -> Project:
+    return Project([], [_target("t%d" % i, ["t%d" % (i - 1)] if i > 0 else []) for i in range(size)])
+
+
+def fanout_project(size: int) -> Project:
+    targets = [_target("t%d" % i, []) for i in range(size)]
+    targets.append(_target("all", [t.name for t in targets]))
+    return Project([], targets)
+
+
+def diamond_project(size: int) -> Project:
+    "Stacked diamonds: each layer of two targets depends on the single target below"
+    targets = [_target("d0", [])]
+    for i in range(1, size + 1):
+        targets.append(_target("l%d" % i, ["d%d" % (i - 1)]))
+        targets.append(_target("r%d" % i, ["d%d" % (i - 1)]))
+        targets.append(_target("d%d" % i, ["l%d" % i, "r%d" % i]))
+    return Project([], targets)
+
+
+def random_project(size: int, max_dependencies: int = 4, seed: int = 0) -> Project:
+    "Random DAG: each target depends on a few of the targets created before it"
+    generator = random.Random(seed)
+    targets = []
+    for i in range(size):
+        count = min(i, generator.randint(0, max_dependencies))
+        dependencies = ["t%d" % j for j in sorted(generator.sample(range(i), count))]
+        targets.append(_target("t%d" % i, dependencies))
+    return Project([], targets)
+
+
+def get_sinks(project: Project) -> list:
+    "Targets nobody depends on, which are the ones to run"
+    dependencies = set([name for target in project.targets for name in target.dependencies])
+    return [target.name for target in project.targets if target.name not in dependencies]
+
+
+@contextmanager
+def quiet_output():
+    "Send the terminal listener output to the null device"
+    stdout = sys.stdout
+    with open(os.devnull, 'w') as devnull:
+        sys.stdout = devnull
+        try:
+            yield
+        finally:
+            sys.stdout = stdout
+
+
+def create_context(project: Project, targets: list):
+    context = core.create_context(project, Parameters("runci.yml", targets, 0))
+    context.runners[NoopRunner.get_selector()] = NoopRunner
+    context.runners[OutputRunner.get_selector()] = OutputRunner
+    return context
+
+
+def run_pipeline(context) -> float:
+    "Run the whole pipeline the way the command line does, and return its duration"
+    with quiet_output():
+        started = time.perf_counter()
+        asyncio.run(run_project(context))
+        return time.perf_counter() - started
+
+
+def benchmark_scheduling(name: str, project: Project) -> dict:
+    targets = get_sinks(project)
+    started = time.perf_counter()
+    context = create_context(project, targets)
+    core.DependencyTree(context)
+    compile_time = time.perf_counter() - started
+
+    context = create_context(project, targets)
+    run_time = run_pipeline(context)
+    jobs = len(project.targets)
+    return {
+        "jobs": jobs,
+        "compile_seconds": compile_time,
+        "run_seconds": run_time,
+        "overhead_per_job_us": run_time / jobs * 1e6,
+    }
+
+
+def benchmark_events(jobs: int, messages: int) -> dict:
+    "Measure events per second through Job._log_event, the event bus and the listeners"
+    counted = [0]
+
+    def count(job_event):
+        counted[0] += 1
+
+    spec = {"count": messages, "size": 80}
+    project = Project([], [_target("o%d" % i, [], 'bench-output', spec) for i in range(jobs)])
+    context = create_context(project, [t.name for t in project.targets])
+    context.listeners[event.JobMessageEvent] = context.listeners.get(event.JobMessageEvent, []) + [count]
+    run_time = run_pipeline(context)
+    return {
+        "jobs": jobs,
+        "events": counted[0],
+        "run_seconds": run_time,
+        "events_per_second": counted[0] / run_time,
+    }
+
+
+def benchmark_startup(repeat: int) -> dict:
+    "Measure the time to start the command line and print its help"
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    args = [sys.executable, '-c', 'from runci.cli.main import main; main(["--help"])']
+    durations = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        subprocess.run(args, cwd=root, stdout=subprocess.DEVNULL, check=True)
+        durations.append(time.perf_counter() - started)
+    return {"repeat": repeat, "median_seconds": statistics.median(durations), "min_seconds": min(durations)}
+
+
+def get_peak_rss():
+    "Peak resident set size of the benchmark process, in KiB, when the platform reports it"
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS reports bytes, Linux kilobytes
+    return peak // 1024 if sys.platform == 'darwin' else peak
+
+
+def run_benchmarks(quick: bool) -> dict:
+    scale = 10 if quick else 1
+    results = dict()
+    shapes = [
+        ("chain_1000", chain_project(1000 // scale)),
+        ("fanout_1000", fanout_project(1000 // scale)),
+        ("diamond_300", diamond_project(300 // scale)),
+        ("random_10000", random_project(10000 // scale)),
+    ]
+    for name, project in shapes:
+        click.echo("Running %s" % name, err=True)
+        results["scheduling_" + name] = benchmark_scheduling(name, project)
+
+    click.echo("Running events", err=True)
+    results["events"] = benchmark_events(8, 20000 // scale)
+    click.echo("Running startup", err=True)
+    results["startup"] = benchmark_startup(3 if quick else 10)
+    results["peak_rss_kib"] = get_peak_rss()
+    return results
+
+
+def compare(results: dict, baseline: dict):
+    "Print the ratio of every measure to its baseline value"
+    for name, measures in results.items():
+        baseline_measures = baseline.get(name, None)
+        if not isinstance(measures, dict):
+            measures, baseline_measures = {"value": measures}, {"value": baseline_measures}
+        for measure, value in measures.items():
+            reference = (baseline_measures or dict()).get(measure, None)
+            if isinstance(value, (int, float)) and isinstance(reference, (int, float)) and reference != 0:
+                click.echo("%-30s %-22s %12.3f %7.2fx" % (name, measure, value, value / reference))
+
+
+@click.command()
+@click.option('-o', '--output', 'output', type=click.Path(dir_okay=False), default=None,
+              help="File the JSON results are written to.")
+@click.option('--baseline', 'baseline', type=click.File('r'), default=None,
+              help="JSON results of a previous run to compare with.")
+@click.option('--quick', is_flag=True, default=False, help="Run smaller projects.")
+def main(output, baseline, quick):
+    document = {
+        "version": RESULTS_VERSION,
+        "timestamp": time.time(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "quick": quick,
+        "results": run_benchmarks(quick),
+    }
+
+    data = json.dumps(document, indent=2, sort_keys=True)
+    if output is None:
+        click.echo(data)
+    else:
+        with open(output, 'w') as datastream:
+            datastream.write(data + "\n")
+
+    if baseline is not None:
+        compare(document["results"], json.load(baseline)["results"])
+
+
+if __name__ == '__main__':
+    main()
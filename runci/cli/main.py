@@ -7,14 +7,33 @@ from runci.dal.yaml import load_project
 from runci.entities.parameters import Parameters
 from runci.engine import core
 from runci.engine.job import JobStatus
+from runci.engine.pull import DEFAULT_MAX_PULLS
 
 DEFAULT_CONFIG_FILE = "runci.yml"
+STATE_DIRECTORY = ".runci"
+DEFAULT_BUFFER_SIZE = 16 * 1024 * 1024
 
 
 @click.command()
 @click.option('-f', '--file', 'file', type=click.File('r', lazy=True), default=DEFAULT_CONFIG_FILE)
+@click.option('-j', '--jobs', 'jobs', type=click.IntRange(min=1), default=None,
+              help="Maximum number of job slots used concurrently.")
+@click.option('--buffer-size', 'buffersize', type=click.IntRange(min=1), default=DEFAULT_BUFFER_SIZE,
+              help="Maximum size in bytes of the output buffered for each job.")
+@click.option('--buffer-overflow', 'overflow', type=click.Choice(['pause', 'spill']), default='pause',
+              help="Pause the job output or spill it to a temporary file when its buffer is full.")
+@click.option('--docker-backend', 'backend', type=click.Choice(['cli', 'api']), default='cli',
+              help="Run docker steps through the docker command line or the docker Engine API.")
+@click.option('--max-pulls', 'pulls', type=click.IntRange(min=1), default=DEFAULT_MAX_PULLS,
+              help="Maximum number of docker images pulled concurrently.")
+@click.option('--pull-ttl', 'pullttl', type=click.IntRange(min=0), default=0,
+              help="Seconds during which a pulled image is not pulled again. Disabled when 0.")
+@click.option('--metrics-file', 'metrics', type=click.Path(dir_okay=False), default=None,
+              help="Prometheus textfile the run metrics are written to.")
+@click.option('--compact-buffer', 'compact', is_flag=True, default=False,
+              help="Hold the buffered output of each job in compact arrays, trading some CPU for memory.")
 @click.argument('targets', nargs=-1)
-def main(targets, file):
+def main(targets, file, jobs, buffersize, overflow, backend, pulls, pullttl, metrics, compact):
     if len(targets) == 0:
         targets = ["default"]
 
@@ -22,14 +41,21 @@ def main(targets, file):
        and isinstance(file.name, str) \
        and os.path.isfile(file.name):
         # If filename available and file exists, load file to allow docker-compose integration
-        parameters = Parameters(file.name, targets, 1)
+        statedir = os.path.join(os.path.dirname(os.path.abspath(file.name)), STATE_DIRECTORY)
+        parameters = Parameters(file.name, targets, 1, jobs, statedir, buffersize, overflow, backend, pulls, pullttl,
+                                metrics, compact)
     else:
-        parameters = Parameters(file, targets, 1)
-    project = load_project(parameters)
+        parameters = Parameters(file, targets, 1, jobs, None, buffersize, overflow, backend, pulls, pullttl,
+                                metrics, compact)
+    try:
+        project = load_project(parameters, validate=core.validate_project)
+    except core.RunCIEngineException as e:
+        print("Invalid configuration: %s" % e, file=sys.stderr)
+        sys.exit(1)
     context = core.create_context(project, parameters)
 
     print("Running RunCI pipeline for the following target(s): %s" % str.join(" ", targets))
-    unknown_targets = [t for t in targets if t not in [t.name for t in project.targets]]
+    unknown_targets = [t for t in targets if t not in project.index]
     if any(unknown_targets):
         print("Unkown targets: %s" % str.join(" ", unknown_targets), file=sys.stderr)
         sys.exit(1)
@@ -54,17 +80,17 @@ async def run_project(context):
     tree = core.DependencyTree(context)
     task = tree.start()
 
-    is_running = True
-    while is_running:
-        is_running = not task.done()
+    try:
+        await context.bus.run(task)
+        await task
+    finally:
+        core.close_context(context)
+        report_teardown_failures(context)
+    return tree.status
 
-        working_jobs = [job for job in core.get_jobs(context) if job.has_new_events()]
-        if any(working_jobs):
-            for job in working_jobs:
-                await job.process_events(no_wait=False)
-        else:
-            # Looks like no job has been started yet. Wait a moment.
-            await asyncio.sleep(0.1)
 
-    await task
-    return tree.status
+def report_teardown_failures(context):
+    "Print the output of the background teardowns that failed, once the run is over"
+    for name, output in context.cleanup.failures if context.cleanup is not None else []:
+        print("Teardown of %s failed:" % name, file=sys.stderr)
+        print(output, file=sys.stderr)
@@ -0,0 +1,107 @@
+"""File digest index data layer for runci"""
+import hashlib
+import marshal
+import os
+import tempfile
+import threading
+import time
+
+INDEX_FILE = "hashindex"
+INDEX_VERSION = 1
+
+# Files modified this recently may still change within the same mtime tick: they are not indexed.
+RACY_DELAY_NS = 2 * 10**9
+
+
+def get_file_digest(path: str) -> str:
+    digest = hashlib.sha256()
+    if os.path.islink(path):
+        digest.update(os.readlink(path).encode('utf-8'))
+    else:
+        with open(path, 'rb') as datastream:
+            for chunk in iter(lambda: datastream.read(1 << 20), b''):
+                digest.update(chunk)
+
+    return digest.hexdigest()
+
+
+class HashIndex(object):
+    """Persistent index of file digests.
+
+    Maps a file path to its (mtime_ns, size, inode, digest), so that a file is
+    only hashed again when its stat information has changed. The index is kept
+    in memory only when no state directory is given.
+    """
+    _statedir: str
+    _entries: dict
+    _dirty: bool
+    _lock: threading.Lock
+
+    def __init__(self, statedir=None):
+        self._statedir = statedir
+        self._entries = None
+        self._dirty = False
+        self._lock = threading.Lock()
+
+    @property
+    def path(self):
+        if self._statedir is None:
+            return None
+        return os.path.join(self._statedir, INDEX_FILE)
+
+    def _load(self) -> dict:
+        if self.path is None or not os.path.isfile(self.path):
+            return dict()
+
+        try:
+            with open(self.path, 'rb') as datastream:
+                version, entries = marshal.load(datastream)
+        except (OSError, EOFError, ValueError, TypeError):
+            return dict()
+
+        return entries if version == INDEX_VERSION else dict()
+
+    def _get_entries(self) -> dict:
+        with self._lock:
+            if self._entries is None:
+                self._entries = self._load()
+            return self._entries
+
+    def get_digest(self, path: str) -> str:
+        "Return the digest of a file, hashing it only if it changed since it was indexed. Thread safe."
+        key = os.path.abspath(path)
+        stat = os.lstat(key)
+        signature = (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+        entries = self._get_entries()
+
+        entry = entries.get(key, None)
+        if entry is not None and entry[:3] == signature:
+            return entry[3]
+
+        digest = get_file_digest(key)
+        if time.time_ns() - stat.st_mtime_ns > RACY_DELAY_NS:
+            with self._lock:
+                entries[key] = signature + (digest,)
+                self._dirty = True
+
+        return digest
+
+    def save(self):
+        "Persist the index if it changed. Thread safe."
+        if self.path is None:
+            return
+
+        with self._lock:
+            if not self._dirty:
+                return
+
+            os.makedirs(self._statedir, exist_ok=True)
+            descriptor, temp_path = tempfile.mkstemp(prefix=INDEX_FILE + ".", suffix=".tmp", dir=self._statedir)
+            try:
+                with os.fdopen(descriptor, 'wb') as datastream:
+                    marshal.dump((INDEX_VERSION, self._entries), datastream)
+                os.replace(temp_path, self.path)
+            except BaseException:
+                os.remove(temp_path)
+                raise
+            self._dirty = False
@@ -0,0 +1,35 @@
+"""Step duration history data layer for runci"""
+import json
+import os
+import tempfile
+
+HISTORY_FILE = "history.json"
+
+
+def load_history(statedir) -> dict:
+    path = os.path.join(statedir, HISTORY_FILE)
+    try:
+        with open(path, 'r') as datastream:
+            data = json.load(datastream)
+    except (OSError, ValueError):
+        # Missing or corrupted history only costs scheduling accuracy.
+        return dict()
+
+    if not isinstance(data, dict):
+        return dict()
+
+    # Durations that are not numbers would break the ranking of the jobs.
+    return dict([(key, value) for key, value in data.items() if isinstance(value, (int, float))])
+
+
+def save_history(statedir, history: dict):
+    os.makedirs(statedir, exist_ok=True)
+    path = os.path.join(statedir, HISTORY_FILE)
+    descriptor, temp_path = tempfile.mkstemp(prefix=HISTORY_FILE + ".", suffix=".tmp", dir=statedir)
+    try:
+        with os.fdopen(descriptor, 'w') as datastream:
+            json.dump(history, datastream, sort_keys=True)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.remove(temp_path)
+        raise
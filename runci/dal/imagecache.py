@@ -0,0 +1,89 @@
+"""Pulled image cache data layer for runci"""
+import json
+import os
+import tempfile
+import time
+
+IMAGE_CACHE_FILE = "images.json"
+
+
+class ImageCache(object):
+    """Persistent cache of the local identifier of pulled images.
+
+    Maps an image reference to the Id of the local image it resolved to when it
+    was last pulled, along with the time of that pull. The Id is the digest of
+    the local image configuration, not the registry digest of the reference.
+    Entries older than ttl seconds are ignored. Changes are written by save(),
+    once per run. The cache is kept in memory only when no state directory is given.
+    """
+    _statedir: str
+    _ttl: float
+    _entries: dict
+    _dirty: bool
+
+    def __init__(self, statedir=None, ttl: float = 0):
+        self._statedir = statedir
+        self._ttl = ttl
+        self._entries = None
+        self._dirty = False
+
+    @property
+    def path(self):
+        if self._statedir is None:
+            return None
+        return os.path.join(self._statedir, IMAGE_CACHE_FILE)
+
+    def _load(self) -> dict:
+        if self.path is None:
+            return dict()
+
+        try:
+            with open(self.path, 'r') as datastream:
+                data = json.load(datastream)
+        except (OSError, ValueError):
+            # A missing or corrupted cache only costs a pull.
+            return dict()
+
+        if not isinstance(data, dict):
+            return dict()
+
+        return dict([(image, tuple(entry)) for image, entry in data.items()
+                     if isinstance(entry, list) and len(entry) == 2])
+
+    def _get_entries(self) -> dict:
+        if self._entries is None:
+            self._entries = self._load()
+        return self._entries
+
+    def get(self, image: str, now: float = None):
+        "Return the cached Id of an image and its age in seconds, or None when missing or expired"
+        entry = self._get_entries().get(image, None)
+        if entry is None:
+            return None
+
+        image_id, checked = entry
+        age = (now if now is not None else time.time()) - checked
+        if age < 0 or age >= self._ttl:
+            return None
+        return image_id, age
+
+    def set(self, image: str, image_id: str, now: float = None):
+        "Record the Id of the local image an image reference has just been pulled to"
+        self._get_entries()[image] = (image_id, now if now is not None else time.time())
+        self._dirty = True
+
+    def save(self):
+        "Persist the cache if it changed"
+        if self.path is None or not self._dirty:
+            return
+
+        os.makedirs(self._statedir, exist_ok=True)
+        descriptor, temp_path = tempfile.mkstemp(prefix=IMAGE_CACHE_FILE + ".", suffix=".tmp", dir=self._statedir)
+        try:
+            with os.fdopen(descriptor, 'w') as datastream:
+                json.dump(self._entries, datastream, sort_keys=True)
+            os.replace(temp_path, self.path)
+        except BaseException:
+            os.remove(temp_path)
+            raise
+        self._dirty = False
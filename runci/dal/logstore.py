@@ -0,0 +1,146 @@
+"""Job log store data layer for runci
+
+Each job output is stored as an append-only log file, plus an index file
+holding the offset of the start of every line but the first, as native
+unsigned 64 bits integers. Any line can then be located in constant time.
+"""
+import array
+from bisect import bisect_right
+import contextlib
+import hashlib
+import mmap
+import os
+import re
+
+LOG_DIRECTORY = "logs"
+LOG_EXTENSION = ".log"
+INDEX_EXTENSION = ".idx"
+
+
+def get_log_paths(statedir: str, target_name: str):
+    # The hash of the raw name keeps apart the names sanitized the same way, such as "a/b" and "a_b".
+    name = "%s-%s" % (re.sub(r'[^A-Za-z0-9_.-]', '_', target_name),
+                      hashlib.sha1(target_name.encode('utf-8')).hexdigest()[:8])
+    directory = os.path.join(statedir, LOG_DIRECTORY)
+    return os.path.join(directory, name + LOG_EXTENSION), os.path.join(directory, name + INDEX_EXTENSION)
+
+
+class LogWriter(object):
+    """Write a job log and its line index, replacing the log of any previous run"""
+    _log: object
+    _index: object
+    _offset: int
+
+    def __init__(self, statedir: str, target_name: str):
+        log_path, index_path = get_log_paths(statedir, target_name)
+        os.makedirs(os.path.dirname(log_path), exist_ok=True)
+        with contextlib.ExitStack() as stack:
+            self._log = stack.enter_context(open(log_path, 'wb'))
+            self._index = stack.enter_context(open(index_path, 'wb'))
+            stack.pop_all()
+        self._offset = 0
+
+    def write(self, data: bytes):
+        self._log.write(data)
+
+        offsets = array.array('Q')
+        position = data.find(b'\n')
+        while position >= 0:
+            offsets.append(self._offset + position + 1)
+            position = data.find(b'\n', position + 1)
+
+        if len(offsets) > 0:
+            self._index.write(offsets.tobytes())
+        self._offset += len(data)
+
+    def close(self):
+        self._log.close()
+        self._index.close()
+
+
+class LogReader(object):
+    """Random access to a job log through memory maps of the log and its line index"""
+    _files: list
+    _maps: list
+    _log: mmap.mmap
+    _views: list
+    _index: memoryview
+    _size: int
+
+    def __init__(self, statedir: str, target_name: str):
+        with contextlib.ExitStack() as stack:
+            # Whatever has been opened is closed when the log or its index can't be.
+            self._files = [stack.enter_context(open(path, 'rb')) for path in get_log_paths(statedir, target_name)]
+            self._maps = []
+            for file in self._files:
+                mapped = self._map(file)
+                if isinstance(mapped, mmap.mmap):
+                    stack.callback(mapped.close)
+                self._maps.append(mapped)
+            stack.pop_all()
+
+        self._log = self._maps[0]
+        self._size = len(self._log)
+
+        index = memoryview(self._maps[1])
+        itemsize = array.array('Q').itemsize
+        self._index = index[:len(index) - len(index) % itemsize].cast('Q')
+        self._views = [self._index, index]
+
+    @staticmethod
+    def _map(file):
+        if os.fstat(file.fileno()).st_size == 0:
+            return b''
+        return mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __len__(self):
+        "Number of lines of the log"
+        last_start = self._index[-1] if len(self._index) > 0 else 0
+        return len(self._index) + (1 if self._size > last_start else 0)
+
+    def _get_bounds(self, number: int):
+        start = self._index[number - 1] if number > 0 else 0
+        end = self._index[number] if number < len(self._index) else self._size
+        return start, end
+
+    def get_line(self, number: int) -> bytes:
+        if number < 0 or number >= len(self):
+            raise IndexError("Line %d is out of range" % number)
+        start, end = self._get_bounds(number)
+        return self._log[start:end]
+
+    def get_lines(self, start: int = 0, stop: int = None):
+        stop = len(self) if stop is None else min(stop, len(self))
+        for number in range(max(start, 0), stop):
+            yield number, self.get_line(number)
+
+    def tail(self, count: int):
+        return self.get_lines(len(self) - count)
+
+    def grep(self, pattern: bytes):
+        "Yield the number and content of every line matching the regular expression"
+        regex = re.compile(pattern, re.MULTILINE)
+        position = 0
+        match = regex.search(self._log, position)
+        while match is not None:
+            number = bisect_right(self._index, match.start())
+            start, end = self._get_bounds(number)
+            yield number, self._log[start:end]
+
+            position = max(end, match.end())
+            match = regex.search(self._log, position) if position < self._size else None
+
+    def close(self):
+        for view in self._views:
+            view.release()
+        for mapped in self._maps:
+            if isinstance(mapped, mmap.mmap):
+                mapped.close()
+        for file in self._files:
+            file.close()
@@ -0,0 +1,80 @@
+"""Compiled project cache data layer for runci"""
+import hashlib
+import marshal
+import os
+
+from runci.entities import config
+
+PROJECT_CACHE_FILE = "project.cache"
+ENTRY_POINTS_CACHE_FILE = "entrypoints.cache"
+# Bump whenever the way projects are loaded changes, to discard projects compiled by older versions
+CACHE_VERSION = 2
+
+
+def get_config_digest(content: str) -> str:
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+
+def _to_data(project: config.Project):
+    services = [tuple(service) for service in project.services]
+    targets = [(target.name, target.dependencies, [tuple(step) for step in target.steps], target.weight)
+               for target in project.targets]
+    return services, targets
+
+
+def _from_data(data) -> config.Project:
+    services, targets = data
+    return config.Project([config.Service(*service) for service in services],
+                          [config.Target(name, dependencies, [config.Step(*step) for step in steps], weight)
+                           for name, dependencies, steps, weight in targets])
+
+
+def load_cached_project(statedir, digest: str):
+    "Return the project compiled from a configuration with this digest, or None when it is not cached"
+    path = os.path.join(statedir, PROJECT_CACHE_FILE)
+    try:
+        with open(path, 'rb') as datastream:
+            version, cached_digest, data = marshal.load(datastream)
+        if version != CACHE_VERSION or cached_digest != digest:
+            return None
+        return _from_data(data)
+    except (OSError, EOFError, ValueError, TypeError):
+        # A missing or corrupted cache only costs parsing the configuration again.
+        return None
+
+
+def save_cached_project(statedir, digest: str, project: config.Project):
+    try:
+        data = marshal.dumps((CACHE_VERSION, digest, _to_data(project)))
+    except ValueError:
+        # Specs holding values marshal can't serialize, such as dates, are not cached.
+        return
+
+    os.makedirs(statedir, exist_ok=True)
+    path = os.path.join(statedir, PROJECT_CACHE_FILE)
+    temp_path = "%s.%d.tmp" % (path, os.getpid())
+    with open(temp_path, 'wb') as datastream:
+        datastream.write(data)
+    os.replace(temp_path, path)
+
+
+def load_cached_entry_points(statedir, key: list):
+    "Return the entry points found in an environment with this key, or None when they are not cached"
+    path = os.path.join(statedir, ENTRY_POINTS_CACHE_FILE)
+    try:
+        with open(path, 'rb') as datastream:
+            version, cached_key, entry_points = marshal.load(datastream)
+        if version != CACHE_VERSION or cached_key != key:
+            return None
+        return entry_points
+    except (OSError, EOFError, ValueError, TypeError):
+        return None
+
+
+def save_cached_entry_points(statedir, key: list, entry_points: dict):
+    os.makedirs(statedir, exist_ok=True)
+    path = os.path.join(statedir, ENTRY_POINTS_CACHE_FILE)
+    temp_path = "%s.%d.tmp" % (path, os.getpid())
+    with open(temp_path, 'wb') as datastream:
+        marshal.dump((CACHE_VERSION, key, entry_points), datastream)
+    os.replace(temp_path, path)
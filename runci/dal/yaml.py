@@ -1,9 +1,17 @@
-from yaml import safe_load
+import yaml
+from runci.dal.projectcache import get_config_digest, load_cached_project, save_cached_project
 from runci.entities import config
 from runci.entities.parameters import Parameters
 
 """YAML data layer for runci"""
 
+# The libyaml based loader is much faster, but is only available when pyyaml has been built with it.
+SafeLoader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+
+
+def safe_load(datastream):
+    return yaml.load(datastream, Loader=SafeLoader)
+
 
 def __create_service(item):
     return config.Service(item[0], item[1])
@@ -23,7 +31,11 @@ def __create_target(item):
     if isinstance(dependencies, str):
         dependencies = dependencies.split(' ')
     steps = config.create_entities(__create_step, spec.get('steps', []))
-    return config.Target(name, dependencies, steps)
+    weight = spec.get('weight', spec.get('slots', 1))
+    if not isinstance(weight, int) or weight < 1:
+        raise Exception("Weight of target '%s' should be a positive integer" % name)
+
+    return config.Target(name, dependencies, steps, weight)
 
 
 def __create_step(item):
@@ -42,20 +54,52 @@ def __create_step(item):
     return config.Step(name, type, spec)
 
 
-def load_project(parameters):
+def load_project(parameters, validate=None):
+    """Load the project described by a configuration file.
+
+    With a state directory, the compiled project is cached there and reused as
+    long as the content of the configuration does not change. The validate
+    callable, when given, is called with the parsed project and raises when it
+    is invalid: only projects it has accepted are cached, so that a cached
+    project is not validated again.
+    """
     if isinstance(parameters, Parameters):
         file = parameters.dataconnection
+        statedir = parameters.statedir
     else:
         file = parameters
+        statedir = None
 
     if isinstance(file, str):
         datastream = open(file, 'r')
     else:
         datastream = file
 
-    data = safe_load(datastream)
+    content = datastream.read()
     datastream.close()
 
+    if statedir is None:
+        return _compile_project(content, validate)
+
+    digest = get_config_digest(content)
+    project = load_cached_project(statedir, digest)
+    if project is None:
+        project = _compile_project(content, validate)
+        save_cached_project(statedir, digest, project)
+
+    return project
+
+
+def _compile_project(content: str, validate):
+    project = _parse_project(content)
+    if validate is not None:
+        validate(project)
+    return project
+
+
+def _parse_project(content: str):
+    data = safe_load(content)
+
     services_data = data.get('services', {})
     services = config.create_entities(__create_service, services_data.items())
 
@@ -67,3 +111,18 @@ def load_project(parameters):
     targets = config.create_entities(__create_target, targets.items())
 
     return config.Project(services, targets)
+
+
+def load_compose_files(files) -> dict:
+    "Load docker-compose files, merging their services the way docker-compose overrides them"
+    version = None
+    services = dict()
+    for file in files:
+        with open(file, 'r') as datastream:
+            data = safe_load(datastream) or dict()
+
+        version = version or data.get('version', None)
+        for name, spec in (data.get('services', None) or dict()).items():
+            services.setdefault(name, dict()).update(spec or dict())
+
+    return {"version": version, "services": services}
@@ -0,0 +1,300 @@
+"""Docker build context helpers: .dockerignore matching, context walking, fingerprinting and archiving"""
+import asyncio
+import hashlib
+import json
+import os
+import posixpath
+import re
+import stat
+import tarfile
+import threading
+
+from runci.dal.hashindex import HashIndex, get_file_digest
+from runci.engine.dockerapi import FileSegment
+
+DOCKERIGNORE_FILE = ".dockerignore"
+DEFAULT_DOCKERFILE = "Dockerfile"
+ARCHIVED_DOCKERFILE = ".dockerfile.runci"
+FINGERPRINT_LABEL = "runci.fingerprint"
+ARCHIVE_CHUNK_SIZE = 256 * 1024
+ARCHIVE_BUFFER_SIZE = 8 * 1024 * 1024
+SENDFILE_THRESHOLD = 1024 * 1024
+
+
+def _translate_pattern(pattern: str) -> str:
+    "Translate a .dockerignore pattern into a regular expression, the way docker does"
+    regex = ''
+    index = 0
+    while index < len(pattern):
+        char = pattern[index]
+        index += 1
+        if char == '*' and pattern[index:index + 1] == '*':
+            index += 1
+            if pattern[index:index + 1] == '/':
+                index += 1
+            regex += '.*' if index == len(pattern) else '(.*/)?'
+        elif char == '*':
+            regex += '[^/]*'
+        elif char == '?':
+            regex += '[^/]'
+        elif char == '[':
+            end = pattern.find(']', index)
+            if end < 0:
+                regex += re.escape(char)
+            else:
+                char_class = pattern[index:end]
+                if char_class.startswith('!'):
+                    char_class = '^' + char_class[1:]
+                regex += '[' + char_class + ']'
+                index = end + 1
+        elif char == '\\' and index < len(pattern):
+            regex += re.escape(pattern[index])
+            index += 1
+        else:
+            regex += re.escape(char)
+
+    return '^' + regex + '$'
+
+
+class DockerIgnore(object):
+    """Represent the exclusion rules of a .dockerignore file.
+
+    The last matching pattern wins, and a pattern matching a directory also
+    matches everything below it.
+    """
+    _patterns: list
+
+    def __init__(self, lines=[]):
+        self._patterns = []
+        for line in lines:
+            pattern = line.strip()
+            if pattern == '' or pattern.startswith('#'):
+                continue
+
+            negated = pattern.startswith('!')
+            if negated:
+                pattern = pattern[1:].strip()
+
+            pattern = posixpath.normpath(pattern.replace(os.sep, '/')).lstrip('/')
+            self._patterns.append((re.compile(_translate_pattern(pattern)), negated))
+
+    @classmethod
+    def load(cls, context_path: str):
+        path = os.path.join(context_path, DOCKERIGNORE_FILE)
+        if not os.path.isfile(path):
+            return cls()
+
+        with open(path, 'r') as datastream:
+            return cls(datastream.read().splitlines())
+
+    @property
+    def has_exceptions(self) -> bool:
+        return any([negated for _, negated in self._patterns])
+
+    def is_excluded(self, path: str) -> bool:
+        "Tell whether a context-relative, slash separated path is excluded"
+        candidates = [path]
+        parent = posixpath.dirname(path)
+        while parent != '':
+            candidates.append(parent)
+            parent = posixpath.dirname(parent)
+
+        excluded = False
+        for regex, negated in self._patterns:
+            if any([regex.match(candidate) for candidate in candidates]):
+                excluded = not negated
+
+        return excluded
+
+
+def walk_context(context_path: str, dockerignore: DockerIgnore = None, directories: bool = False):
+    """Yield the relative path of every file or symlink sent with the build context, in a stable order.
+
+    With directories, the included directories are yielded as well, before their content.
+    """
+    if dockerignore is None:
+        dockerignore = DockerIgnore.load(context_path)
+
+    # Excluded directories can only be skipped when no exception may include their content back.
+    can_prune = not dockerignore.has_exceptions
+    for root, subdirectories, files in os.walk(context_path):
+        relative_root = os.path.relpath(root, context_path).replace(os.sep, '/')
+        prefix = '' if relative_root == '.' else relative_root + '/'
+
+        entries = list(files)
+        walked_directories = []
+        for directory in sorted(subdirectories):
+            if os.path.islink(os.path.join(root, directory)):
+                entries.append(directory)
+            elif not (can_prune and dockerignore.is_excluded(prefix + directory)):
+                walked_directories.append(directory)
+        subdirectories[:] = walked_directories
+
+        if directories:
+            entries.extend(walked_directories)
+        for entry in sorted(entries):
+            if not dockerignore.is_excluded(prefix + entry):
+                yield prefix + entry
+
+
+def get_fingerprint(context_path: str, dockerfile: str, spec, index: HashIndex = None) -> str:
+    """Compute the fingerprint of a docker build.
+
+    It covers the step spec, the Dockerfile and every file of the build context
+    which is not excluded by .dockerignore. File digests are read from the index
+    when one is given.
+    """
+    get_digest = get_file_digest if index is None else index.get_digest
+    if dockerfile is None:
+        dockerfile = os.path.join(context_path, DEFAULT_DOCKERFILE)
+
+    fingerprint = hashlib.sha256()
+    fingerprint.update(json.dumps(spec, sort_keys=True, default=str).encode('utf-8'))
+    fingerprint.update(("\0Dockerfile\0%s\n" % get_digest(dockerfile)).encode('utf-8'))
+    for path in walk_context(context_path):
+        file_digest = get_digest(os.path.join(context_path, path))
+        fingerprint.update(("%s\0%s\n" % (path, file_digest)).encode('utf-8'))
+
+    return fingerprint.hexdigest()
+
+
+async def compute_fingerprint(context_path: str, dockerfile: str, spec, index: HashIndex = None) -> str:
+    """Compute a build fingerprint in a worker thread, so that other jobs keep running meanwhile.
+
+    The index is saved by the engine at the end of the run.
+    """
+    return await asyncio.get_event_loop().run_in_executor(None, get_fingerprint, context_path, dockerfile, spec, index)
+
+
+def get_archived_dockerfile(context_path: str, dockerfile: str) -> str:
+    "Return the path of the Dockerfile inside the context archive"
+    if dockerfile is None:
+        return DEFAULT_DOCKERFILE
+
+    relative_path = os.path.relpath(dockerfile, context_path)
+    if relative_path.startswith(os.pardir):
+        # Dockerfiles outside of the context are sent along with it, the way docker does.
+        return ARCHIVED_DOCKERFILE
+    return relative_path.replace(os.sep, '/')
+
+
+def _get_tarinfo(path: str, name: str) -> tarfile.TarInfo:
+    info = tarfile.TarInfo(name)
+    status = os.lstat(path)
+    info.mode = stat.S_IMODE(status.st_mode)
+    info.mtime = int(status.st_mtime)
+    if stat.S_ISLNK(status.st_mode):
+        info.type = tarfile.SYMTYPE
+        info.linkname = os.readlink(path)
+    elif stat.S_ISDIR(status.st_mode):
+        info.type = tarfile.DIRTYPE
+    else:
+        info.size = status.st_size
+    return info
+
+
+class _ContextArchiveProducer(object):
+    """Produce the tar archive of a build context in chunks of chunk_size bytes.
+
+    Chunks and file segments are handed to put, which may block to apply backpressure.
+    """
+
+    def __init__(self, put, chunk_size: int, sendfile_threshold: int):
+        self._put = put
+        self._chunk_size = chunk_size
+        self._sendfile_threshold = sendfile_threshold
+        self._chunk = bytearray(chunk_size)
+        self._position = 0
+
+    def _flush(self):
+        if self._position > 0:
+            self._put(memoryview(self._chunk)[:self._position])
+            self._chunk = bytearray(self._chunk_size)
+            self._position = 0
+
+    def _write(self, data):
+        view = memoryview(data)
+        while len(view) > 0:
+            size = min(len(view), self._chunk_size - self._position)
+            self._chunk[self._position:self._position + size] = view[:size]
+            self._position += size
+            view = view[size:]
+            if self._position == self._chunk_size:
+                self._flush()
+
+    def _copy_file(self, path: str, remaining: int):
+        with open(path, 'rb') as f:
+            while remaining > 0:
+                if self._position == self._chunk_size:
+                    self._flush()
+                size = min(remaining, self._chunk_size - self._position)
+                read = f.readinto(memoryview(self._chunk)[self._position:self._position + size])
+                if not read:
+                    # The file shrank since it was listed: keep the archive consistent.
+                    self._write(bytes(remaining))
+                    return
+                self._position += read
+                remaining -= read
+
+    def add(self, path: str, name: str):
+        info = _get_tarinfo(path, name)
+        self._write(info.tobuf(tarfile.PAX_FORMAT, 'utf-8', 'surrogateescape'))
+        if info.size >= self._sendfile_threshold:
+            self._flush()
+            self._put(FileSegment(path, 0, info.size))
+        elif info.size > 0:
+            self._copy_file(path, info.size)
+        self._write(bytes(-info.size % tarfile.BLOCKSIZE))
+
+    def produce(self, context_path: str, dockerfile: str):
+        for path in walk_context(context_path, directories=True):
+            self.add(os.path.join(context_path, path), path)
+
+        if get_archived_dockerfile(context_path, dockerfile) == ARCHIVED_DOCKERFILE:
+            self.add(dockerfile, ARCHIVED_DOCKERFILE)
+
+        self._write(bytes(2 * tarfile.BLOCKSIZE))
+        self._flush()
+
+
+async def stream_context_archive(context_path: str, dockerfile: str = None, chunk_size: int = ARCHIVE_CHUNK_SIZE,
+                                 buffer_size: int = ARCHIVE_BUFFER_SIZE, sendfile_threshold: int = SENDFILE_THRESHOLD):
+    """Stream the tar archive of a build context, as sent to the docker daemon.
+
+    The archive is produced by a worker thread, at most buffer_size bytes ahead of
+    the consumer. Files of at least sendfile_threshold bytes are yielded as
+    FileSegment entries, to be copied straight from the disk, and other chunks
+    as memoryviews.
+    """
+    loop = asyncio.get_event_loop()
+    queue = asyncio.Queue(max(1, buffer_size // chunk_size))
+    stopped = threading.Event()
+    done = object()
+
+    def put(item):
+        if stopped.is_set():
+            raise asyncio.CancelledError()
+        asyncio.run_coroutine_threadsafe(queue.put(item), loop).result()
+
+    def produce():
+        try:
+            _ContextArchiveProducer(put, chunk_size, sendfile_threshold).produce(context_path, dockerfile)
+            put(done)
+        except BaseException as e:
+            if not stopped.is_set():
+                put(e)
+
+    producer = loop.run_in_executor(None, produce)
+    try:
+        item = await queue.get()
+        while item is not done:
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+            item = await queue.get()
+    finally:
+        stopped.set()
+        # Unblock the producer if it waits for room in the queue.
+        while not queue.empty():
+            queue.get_nowait()
+        await producer
@@ -0,0 +1,42 @@
+import asyncio
+from collections import deque
+
+
+class EventBus(object):
+    """Engine-wide dispatcher of job events to the event processors.
+
+    Jobs notify the bus when events are queued, and the bus drains them in
+    notification order. Nothing is done while no event is pending.
+    """
+    _pending: deque
+    _wakeup: asyncio.Event
+
+    def __init__(self):
+        self._pending = deque()
+        self._wakeup = None
+
+    def notify(self, job):
+        "Signal that the job has events to process"
+        self._pending.append(job)
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def run(self, task: asyncio.Future):
+        "Process events as they are queued until the task is done, then flush the remaining ones"
+        wakeup = self._wakeup = asyncio.Event()
+
+        # The task may end after the bus has stopped, while the run is being canceled.
+        def on_task_done(_):
+            wakeup.set()
+
+        task.add_done_callback(on_task_done)
+        try:
+            while not task.done() or any(self._pending):
+                if any(self._pending):
+                    await self._pending.popleft().process_events()
+                else:
+                    wakeup.clear()
+                    await wakeup.wait()
+        finally:
+            task.remove_done_callback(on_task_done)
+            self._wakeup = None
@@ -0,0 +1,89 @@
+import asyncio
+import time
+from collections import deque
+
+DEFAULT_MAX_TEARDOWNS = 4
+
+
+class CleanupQueue(object):
+    """Engine-wide queue of docker-compose projects to tear down in the background.
+
+    Runners enqueue the `down` command of their project instead of waiting for
+    it. Queued projects are drained back to back by at most max_teardowns
+    workers, and close() waits until every one of them has been torn down.
+    wait() lets a runner reusing a project name wait for its pending teardowns.
+
+    Failed teardowns are kept in failures, along with their output, for the
+    engine to report. The monotonic start and end times of every teardown, in
+    nanoseconds, are kept in spans.
+    """
+    _max_teardowns: int
+    _pending: deque
+    _workers: list
+    _teardowns: dict
+    failures: list
+    spans: list
+
+    def __init__(self, max_teardowns: int = DEFAULT_MAX_TEARDOWNS):
+        self._max_teardowns = max_teardowns
+        self._pending = deque()
+        self._workers = []
+        self._teardowns = dict()
+        self.failures = []
+        self.spans = []
+
+    def __len__(self):
+        return len(self._pending)
+
+    def enqueue(self, name: str, args: list):
+        "Queue the teardown command of a project"
+        done = asyncio.get_event_loop().create_future()
+        self._teardowns.setdefault(name, []).append(done)
+        self._pending.append((name, args, done))
+        self._workers = [worker for worker in self._workers if not worker.done()]
+        if len(self._workers) < self._max_teardowns:
+            self._workers.append(asyncio.ensure_future(self._work()))
+
+    async def _work(self):
+        while any(self._pending):
+            name, args, done = self._pending.popleft()
+            try:
+                await self._teardown(name, args)
+            finally:
+                done.set_result(None)
+                self._teardowns[name].remove(done)
+                if not any(self._teardowns[name]):
+                    del self._teardowns[name]
+
+    def is_pending(self, name: str) -> bool:
+        "Tell whether a teardown of the project is queued or running"
+        return name in self._teardowns
+
+    async def wait(self, name: str):
+        "Wait until the queued teardowns of a project are over"
+        teardowns = self._teardowns.get(name, None)
+        if teardowns is not None:
+            await asyncio.wait(list(teardowns))
+
+    async def _teardown(self, name: str, args: list):
+        started = time.monotonic_ns()
+        try:
+            process = await asyncio.create_subprocess_exec(
+                args[0], *args[1:],
+                stdin=asyncio.subprocess.DEVNULL,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.STDOUT)
+            output, _ = await process.communicate()
+            return_code = process.returncode
+        except OSError as e:
+            output, return_code = str(e).encode('utf-8'), None
+
+        self.spans.append((name, started, time.monotonic_ns()))
+        if return_code != 0:
+            self.failures.append((name, output.decode('utf-8', 'replace')))
+
+    async def close(self):
+        "Wait until every queued project has been torn down"
+        while any(self._workers):
+            workers, self._workers = self._workers, []
+            await asyncio.gather(*workers, return_exceptions=True)
@@ -0,0 +1,59 @@
+import hashlib
+import os
+
+from runci.engine.cleanup import CleanupQueue
+
+
+def get_pool_key(files: list) -> str:
+    "Identify a set of compose files by their content, so that only identical definitions share projects"
+    digest = hashlib.sha1()
+    for file in files:
+        digest.update(os.path.abspath(file).encode('utf-8') + b'\0')
+        try:
+            with open(file, 'rb') as datastream:
+                digest.update(hashlib.sha1(datastream.read()).digest())
+        except OSError:
+            digest.update(b'\0')
+
+    return digest.hexdigest()
+
+
+class ComposePool(object):
+    """Engine-wide pool of warm docker-compose projects.
+
+    Released projects keep their long-lived services running and are handed
+    to the next step using the same compose files. Every project is queued for
+    teardown when the pool is closed at the end of the run.
+    """
+    _idle: dict
+    _projects: dict
+
+    def __init__(self):
+        self._idle = dict()
+        self._projects = dict()
+
+    def __len__(self):
+        return len(self._projects)
+
+    def acquire(self, key: str):
+        "Return the name of an idle project for this key, or None when a new one is needed"
+        idle = self._idle.get(key, None)
+        if not idle:
+            return None
+        return idle.pop()
+
+    def release(self, key: str, name: str, down_args: list):
+        "Put a project back in the pool, with the command tearing it down"
+        self._projects[name] = down_args
+        self._idle.setdefault(key, []).append(name)
+
+    def evict(self, name: str):
+        "Forget an acquired project, returning the command tearing it down"
+        return self._projects.pop(name, None)
+
+    def close(self, cleanup: CleanupQueue):
+        "Queue the teardown of every pooled project"
+        for name, down_args in sorted(self._projects.items()):
+            cleanup.enqueue(name, down_args)
+        self._projects.clear()
+        self._idle.clear()
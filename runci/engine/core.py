@@ -1,12 +1,21 @@
 import asyncio
-from collections import namedtuple
+import hashlib
+import heapq
 import importlib
 import inspect
+import json
 import sys
 
-from runci.entities.config import Target
+from runci.dal import history
+from runci.dal.hashindex import HashIndex
+from runci.dal.imagecache import ImageCache
+from runci.entities.config import Project, Target, Step
+from runci.entities import event
 from runci.entities.context import Context
+from runci.engine.bus import EventBus
+from runci.engine.dispatch import DispatchTable
 from runci.engine.job import Job, JobStatus
+from runci.engine.registry import RunnerRegistry, builtin_listeners, builtin_runners, get_listener_paths, load_object
 from runci.engine.runner.base import RunnerBase
 from runci.engine.listener.base import ListenerBase
 
@@ -23,45 +32,83 @@ class AmbiguousTargetException(RunCIEngineException):
     pass
 
 
-class DependencyNode(namedtuple("dependency_node", "job dependencies")):
-    "runci depencency tree node"
-    async def _run_dependencies(self, noparallel):
-        if noparallel:
-            jobs = [job
-                    for node in self.dependencies
-                    for job in await node.start(noparallel)]
-        else:
-            tasks = [node.start(noparallel) for node in self.dependencies]
-            jobs = [job
-                    for task in tasks
-                    for job in await task]
+class CircularDependencyException(RunCIEngineException):
+    pass
 
-        return jobs
 
-    async def _run(self, noparallel=False):
-        jobs = list(await self._run_dependencies(noparallel))
-        if any([job for job in jobs if job.status in [JobStatus.FAILED, JobStatus.CANCELED]]):
-            self.job.fail()
-        else:
-            jobs.append(self.job)
-            await self.job.start()
+class DependencyNode(object):
+    "runci dependency graph node"
+    job: Job
+    dependencies: list
+    dependents: list
+    index: int
+    rank: float
 
-        return jobs
+    def __init__(self, job: Job):
+        self.job = job
+        self.dependencies = []
+        self.dependents = []
+        self.index = None
+        self.rank = 0
 
-    def start(self, noparallel=False):
-        return asyncio.create_task(self._run(noparallel))
+    def add_dependency(self, node):
+        if node not in self.dependencies:
+            self.dependencies.append(node)
+            node.dependents.append(self)
 
-    def run(self, noparallel=False):
-        return asyncio.run(self._run(noparallel))
+    @property
+    def is_failed(self):
+        return self.job.status in [JobStatus.FAILED, JobStatus.CANCELED]
 
     @property
     def status(self):
         return self.job.status
 
 
+class JobSlots(object):
+    """Weighted budget of concurrently running jobs.
+
+    A job takes as many slots as its target weight. A job heavier than the whole
+    budget is still started, alone, once every other job has released its slots.
+    """
+    _capacity: int
+    _used: int
+
+    def __init__(self, capacity=None):
+        self._capacity = capacity
+        self._used = 0
+
+    def get_weight(self, node: DependencyNode) -> int:
+        weight = node.job.target.weight
+        if self._capacity is not None:
+            weight = min(weight, self._capacity)
+        return weight
+
+    def can_acquire(self, node: DependencyNode) -> bool:
+        return self._capacity is None \
+            or self._used + self.get_weight(node) <= self._capacity
+
+    def acquire(self, node: DependencyNode):
+        self._used += self.get_weight(node)
+
+    def release(self, node: DependencyNode):
+        self._used -= self.get_weight(node)
+
+
 class DependencyTree():
+    """Compiled dependency graph of the targets to run.
+
+    Each target is represented by a single node, however many targets depend on it.
+    Nodes are sorted topologically once, then started as soon as all their
+    dependencies have completed and enough job slots are available.
+    Ready nodes are started by decreasing rank, the recorded duration of the
+    longest path from the node to the root, so that the critical path goes first.
+    """
     _context: Context
     _root_node: DependencyNode
+    _nodes: dict
+    _order: list
+    _history: dict
 
     @property
     def context(self):
@@ -73,56 +120,190 @@ class DependencyTree():
 
     def __init__(self, context):
         self._context = context
+        self._nodes = dict()
 
-        if len(self._context.parameters.targets) == 1:
-            self._root_node = self._get_dependency_subtree(self._context.parameters.targets[0])
+        target_names = self._context.parameters.targets
+        self._compile(target_names)
+
+        if len(target_names) == 1:
+            self._root_node = self._nodes[target_names[0]]
         else:
-            dependent_subtree = list([self._get_dependency_subtree(target)
-                                      for target in self._context.parameters.targets])
             root_job = Job(self._context, Target("root", [], []))
-            self._root_node = DependencyNode(root_job, dependent_subtree)
-
-    def _get_dependency_subtree(self, target_name: str) -> DependencyNode:
-        target = get_target(self._context, target_name)
-        job = get_job(self._context, target)
-        dependent_subtree = list([self._get_dependency_subtree(dependency)
-                                  for dependency in target.dependencies])
-        return DependencyNode(job, dependent_subtree)
+            self._root_node = DependencyNode(root_job)
+            for target_name in target_names:
+                self._root_node.add_dependency(self._nodes[target_name])
+
+        self._order = self._sort(self._root_node)
+        for index, node in enumerate(self._order):
+            node.index = index
+
+        self._history = self._load_history()
+        self._rank()
+
+    def _compile(self, target_names):
+        pending = list(reversed(target_names))
+        while pending:
+            target_name = pending.pop()
+            if target_name not in self._nodes:
+                target = get_target(self._context, target_name)
+                self._nodes[target_name] = DependencyNode(get_job(self._context, target))
+                pending.extend(reversed(target.dependencies))
+
+        for node in self._nodes.values():
+            for dependency in node.job.target.dependencies:
+                node.add_dependency(self._nodes[dependency])
+
+    @staticmethod
+    def _sort(root: DependencyNode) -> list:
+        "Depth-first post-order: every node comes after all its dependencies"
+        order = []
+        sorted_nodes = set()
+        path = [root]
+        stack = [iter(root.dependencies)]
+        while stack:
+            dependency = next(stack[-1], None)
+            if dependency is None:
+                node = path.pop()
+                stack.pop()
+                order.append(node)
+                sorted_nodes.add(node)
+            elif dependency in path:
+                cycle = path[path.index(dependency):] + [dependency]
+                raise CircularDependencyException("Circular dependency: " +
+                                                  " -> ".join(n.job.target.name for n in cycle))
+            elif dependency not in sorted_nodes:
+                path.append(dependency)
+                stack.append(iter(dependency.dependencies))
+
+        return order
+
+    def _load_history(self):
+        if self._context.parameters.statedir is None:
+            return dict()
+        return history.load_history(self._context.parameters.statedir)
+
+    def _save_history(self):
+        if self._context.parameters.statedir is not None:
+            history.save_history(self._context.parameters.statedir, self._history)
+
+    def _rank(self):
+        # Dependents always come after their dependencies in the sorted order.
+        for node in reversed(self._order):
+            target = node.job.target
+            duration = sum([self._history.get(get_step_key(target, step), 0) for step in target.steps])
+            node.rank = duration + max([dependent.rank for dependent in node.dependents], default=0)
+
+    def _record(self, node: DependencyNode):
+        for step, duration in node.job.step_durations:
+            self._history[get_step_key(node.job.target, step)] = duration
 
     def get_nodes(self, root=None):
         if root is None:
-            root = self.root_node
-        nodes = [root]
-        nodes.extend([dependency
-                      for node in root.dependencies
-                      for dependency in self.get_nodes(node)])
-        return nodes
+            return list(self._order)
+        return self._sort(root)
+
+    async def _run_node(self, node: DependencyNode):
+        if any([dependency for dependency in node.dependencies if dependency.is_failed]):
+            node.job.fail()
+        else:
+            await node.job.start()
+
+    def _start_node(self, node: DependencyNode, running: dict, completed: asyncio.Queue):
+        task = asyncio.ensure_future(self._run_node(node))
+        running[task] = node
+        task.add_done_callback(completed.put_nowait)
+
+    def _get_slots(self, noparallel):
+        if noparallel:
+            return JobSlots(1)
+        return JobSlots(self._context.parameters.jobs)
+
+    async def _run(self, noparallel=False):
+        slots = self._get_slots(noparallel)
+        completed = asyncio.Queue()
+        running = dict()
+        waiting = dict([(node, len(node.dependencies)) for node in self._order])
+        ready = [(-node.rank, node.index) for node in self._order if waiting[node] == 0]
+        heapq.heapify(ready)
+        for _, index in ready:
+            self._order[index].job.ready()
+
+        try:
+            while ready or running:
+                while ready and slots.can_acquire(self._order[ready[0][1]]):
+                    node = self._order[heapq.heappop(ready)[1]]
+                    slots.acquire(node)
+                    self._start_node(node, running, completed)
+
+                task = await completed.get()
+                node = running.pop(task)
+                slots.release(node)
+                task.result()
+                self._record(node)
+
+                for dependent in node.dependents:
+                    waiting[dependent] -= 1
+                    if waiting[dependent] == 0:
+                        dependent.job.ready()
+                        heapq.heappush(ready, (-dependent.rank, dependent.index))
+        except asyncio.CancelledError:
+            for node in self._order:
+                node.job.cancel()
+            if self._context.pulls is not None:
+                self._context.pulls.cancel_background()
+            raise
+        finally:
+            if any(running):
+                # A job raised: the others are stopped before the exception goes further.
+                for task, node in running.items():
+                    node.job.cancel()
+                    task.cancel()
+                await asyncio.gather(*running.keys(), return_exceptions=True)
+            self._save_history()
+            if self._context.hashindex is not None:
+                self._context.hashindex.save()
+            if self._context.pulls is not None:
+                await self._context.pulls.wait_background()
+            if self._context.images is not None:
+                # Saved after the background pulls, which refresh the cache.
+                self._context.images.save()
+            if self._context.cleanup is not None:
+                if self._context.composepool is not None:
+                    self._context.composepool.close(self._context.cleanup)
+                # Projects are torn down even when the run fails or is canceled.
+                await asyncio.shield(self._context.cleanup.close())
+            if self._context.docker is not None:
+                await self._context.docker.close()
+
+        return [node.job for node in self._order]
 
     def start(self, noparallel=False):
-        return self._root_node.start(noparallel)
+        return asyncio.create_task(self._run(noparallel))
 
     def run(self, noparallel=False):
-        return self._root_node.run(noparallel)
+        return asyncio.run(self._run(noparallel))
 
     @property
     def status(self):
         return self.root_node.status
 
 
-default_modules = [
-    "runci.engine.runner.compose_build",
-    "runci.engine.runner.compose_run",
-    "runci.engine.runner.docker_build",
-    "runci.engine.runner.docker_pull",
-    "runci.engine.runner.target_run",
-    "runci.engine.listener.terminal",
-]
+# Modules providing the built-in runners and listeners, imported on demand
+default_modules = [path.split(':')[0] for path in list(builtin_runners.values()) + builtin_listeners]
+
 
+def _register_listener(listener: ListenerBase, listeners: DispatchTable, processors: DispatchTable):
+    for event_type, event_listener in listener.event_listeners.items():
+        listeners[event_type] = listeners.get(event_type, []) + [event_listener]
 
-def create_context(project, parameters, modules=default_modules):
-    runners = {}
-    listeners = {}
-    processors = {}
+    for event_type, processor in listener.event_processors.items():
+        processors[event_type] = processors.get(event_type, []) + [processor]
+
+
+def _scan_modules(modules: list):
+    "Import modules and collect the runners and listeners they define"
+    runners = RunnerRegistry(entry_points=None)
+    listener_classes = []
 
     for module_name in modules:
         importlib.import_module(module_name)
@@ -130,25 +311,133 @@ def create_context(project, parameters, modules=default_modules):
             if issubclass(obj, RunnerBase):
                 runners[obj.get_selector()] = obj
 
-            if issubclass(obj, ListenerBase):
-                for event_type, listener in obj.event_listeners.items():
-                    listeners[event_type] = listeners.get(event_type, []) + [listener]
+            if issubclass(obj, ListenerBase) and obj not in listener_classes:
+                listener_classes.append(obj)
+
+    return runners, listener_classes
+
+
+def create_context(project, parameters, modules: list = None):
+    """Create the engine context of a run.
+
+    Runners and listeners come from the plugin registry, runners being imported
+    the first time their step type is used. The scan of the installed plugins is
+    cached in the state directory. When modules are given, they are
+    imported and scanned for runners and listeners instead.
+    """
+    # Imported on first use rather than with the module, which is loaded before the project is validated.
+    from runci.engine.cleanup import CleanupQueue
+    from runci.engine.composepool import ComposePool
+    from runci.engine.memo import TaskMemo
+    from runci.engine.pull import DEFAULT_MAX_PULLS, PullCoordinator
+
+    listeners = DispatchTable()
+    processors = DispatchTable()
+    event.set_clock_anchor()
+
+    statedir = parameters.statedir if parameters is not None else None
+    if modules is None:
+        runners = RunnerRegistry(builtin_runners, statedir=statedir)
+        listener_classes = list(dict.fromkeys([load_object(path) for path in get_listener_paths(statedir)]))
+    else:
+        runners, listener_classes = _scan_modules(modules)
+
+    docker = None
+    if parameters is not None and parameters.backend == 'api':
+        from runci.engine.dockerapi import DockerClient
+        docker = DockerClient()
+    max_pulls = (parameters.pulls if parameters is not None else None) or DEFAULT_MAX_PULLS
+    pull_ttl = parameters.pullttl if parameters is not None else None
+    context = Context(project, parameters, runners, listeners, processors,
+                      hashindex=HashIndex(statedir), bus=EventBus(), docker=docker,
+                      pulls=PullCoordinator(max_pulls), images=ImageCache(statedir, pull_ttl) if pull_ttl else None,
+                      cleanup=CleanupQueue(), composepool=ComposePool(), builds=TaskMemo(), observers=[])
+
+    for listener_class in listener_classes:
+        listener = listener_class(context)
+        context.observers.append(listener)
+        _register_listener(listener, listeners, processors)
+
+    listeners.freeze()
+    processors.freeze()
+    return context
 
-                for event_type, processor in obj.event_processors.items():
-                    processors[event_type] = processors.get(event_type, []) + [processor]
 
-    context = Context(project, parameters, runners, listeners, processors)
-    return context
+def close_context(context):
+    """Close the listeners of a context, once every event of the run has been processed.
+
+    A listener failing to close is reported without preventing the others from closing.
+    """
+    for listener in context.observers or []:
+        try:
+            listener.close()
+        except Exception as e:
+            print("Listener %s failed to close: %s" % (type(listener).__name__, e), file=sys.stderr)
+
+
+def get_step_key(target: Target, step: Step) -> str:
+    spec = json.dumps([step.type, step.spec], sort_keys=True, default=str)
+    return "%s:%s" % (target.name, hashlib.sha1(spec.encode('utf-8')).hexdigest())
 
 
 def get_target(context, target_name: str) -> Target:
-    matching_targets = [t for t in context.project.targets if t.name == target_name]
-    if len(matching_targets) == 0:
-        raise UnknownTargetException("Can't find target " + target_name)
-    elif len(matching_targets) == 0:
+    project = context.project
+    if target_name in project.duplicates:
         raise AmbiguousTargetException("Ambiguous target: " + target_name)
 
-    return matching_targets[0]
+    target = project.get_target(target_name)
+    if target is None:
+        raise UnknownTargetException("Can't find target " + target_name)
+
+    return target
+
+
+def _get_referenced_targets(target: Target) -> list:
+    "Names of the targets a target depends on or runs through target-run steps"
+    names = list(target.dependencies)
+    for step in target.steps:
+        if step.type == 'target-run':
+            names.extend(str(step.spec.get('target', step.spec.get('_', ''))).split())
+    return names
+
+
+def _find_cycle(project: Project):
+    "Return the path of a circular dependency of the project, or None"
+    sorted_names = set()
+    for root in project.targets:
+        path = [root.name]
+        on_path = set(path)
+        stack = [iter(root.dependencies)]
+        while stack:
+            dependency = next(stack[-1], None)
+            if dependency is None:
+                sorted_names.add(path[-1])
+                on_path.discard(path.pop())
+                stack.pop()
+            elif dependency in on_path:
+                return path[path.index(dependency):] + [dependency]
+            elif dependency not in sorted_names:
+                path.append(dependency)
+                on_path.add(dependency)
+                stack.append(iter(project.get_target(dependency).dependencies))
+
+    return None
+
+
+def validate_project(project: Project):
+    "Check the whole project at once for duplicated targets, unknown targets and circular dependencies"
+    if any(project.duplicates):
+        raise AmbiguousTargetException("Ambiguous targets: " + " ".join(sorted(project.duplicates)))
+
+    for target in project.targets:
+        unknown_targets = [name for name in _get_referenced_targets(target) if name not in project.index]
+        if any(unknown_targets):
+            raise UnknownTargetException("Target %s refers to unknown target(s): %s"
+                                         % (target.name, " ".join(unknown_targets)))
+
+    cycle = _find_cycle(project)
+    if cycle is not None:
+        raise CircularDependencyException("Circular dependency: " + " -> ".join(cycle))
 
 
 def get_job(context, target: Target) -> Job:
@@ -0,0 +1,77 @@
+from collections.abc import MutableMapping
+
+
+class DispatchTable(MutableMapping):
+    """Handlers of the job events, by event type.
+
+    Handlers registered for an event type also receive the events of its
+    subclasses. The handlers of a concrete event type are resolved once over
+    its MRO and kept as a tuple, so that dispatching an event is a single dict
+    lookup. freeze() resolves every subclass of the registered types upfront;
+    registering handlers afterwards drops the resolved handlers.
+    """
+    _handlers: dict
+    _resolved: dict
+
+    def __init__(self, handlers=None):
+        self._handlers = dict()
+        self._resolved = dict()
+        for event_type, event_handlers in (handlers or dict()).items():
+            self._handlers[event_type] = list(event_handlers)
+
+    def __getitem__(self, event_type):
+        return self._handlers[event_type]
+
+    def __setitem__(self, event_type, event_handlers):
+        self._handlers[event_type] = list(event_handlers)
+        self._resolved.clear()
+
+    def __delitem__(self, event_type):
+        del self._handlers[event_type]
+        self._resolved.clear()
+
+    def __iter__(self):
+        return iter(self._handlers)
+
+    def __len__(self):
+        return len(self._handlers)
+
+    def _resolve(self, event_type) -> tuple:
+        resolved = []
+        # Handlers of the base classes come first.
+        for cls in reversed(event_type.__mro__):
+            for handler in self._handlers.get(cls, []):
+                # A handler registered for a class and one of its subclasses is called once.
+                if handler not in resolved:
+                    resolved.append(handler)
+
+        resolved = self._resolved[event_type] = tuple(resolved)
+        return resolved
+
+    def get_handlers(self, event_type) -> tuple:
+        "Return the handlers of a concrete event type"
+        handlers = self._resolved.get(event_type, None)
+        if handlers is None:
+            handlers = self._resolve(event_type)
+        return handlers
+
+    def freeze(self):
+        "Resolve the handlers of every subclass of the registered event types"
+        pending = list(self._handlers.keys())
+        while any(pending):
+            event_type = pending.pop()
+            if event_type not in self._resolved:
+                self._resolve(event_type)
+                pending.extend(event_type.__subclasses__())
+
+
+def merge_tables(table, handlers: dict) -> DispatchTable:
+    "Return a table dispatching events to the handlers of the table, then to the given ones"
+    if isinstance(table, DispatchTable) and not any(handlers):
+        return table
+
+    merged = DispatchTable(table)
+    for event_type, event_handlers in handlers.items():
+        merged[event_type] = merged.get(event_type, []) + list(event_handlers)
+    merged.freeze()
+    return merged
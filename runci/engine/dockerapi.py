@@ -0,0 +1,303 @@
+"""Asynchronous Docker Engine API client over the daemon unix socket"""
+import asyncio
+import json
+import os
+from collections import namedtuple
+from urllib.parse import quote, urlencode
+
+DEFAULT_DOCKER_HOST = "unix:///var/run/docker.sock"
+DEFAULT_MAX_CONNECTIONS = 8
+CHUNK_SIZE = 64 * 1024
+
+
+# Part of a request body sent straight from a file, with sendfile where the platform supports it
+FileSegment = namedtuple('FileSegment', 'path offset count')
+
+
+class DockerAPIException(Exception):
+    def __init__(self, status, message):
+        super().__init__("Docker API error %d: %s" % (status, message))
+        self.status = status
+
+
+def split_image_reference(image: str):
+    "Split an image reference into its repository and its tag or digest"
+    if '@' in image:
+        return image.split('@', 1)[0], None
+    repository, separator, tag = image.rpartition(':')
+    if separator == '' or '/' in tag:
+        return image, 'latest'
+    return repository, tag
+
+
+class DockerResponse(object):
+    """HTTP response of the Docker API.
+
+    The body must be read, or the response closed, to release its connection.
+    """
+    status: int
+    headers: dict
+
+    def __init__(self, client, connection, status, headers, has_body=True):
+        self._client = client
+        self._connection = connection
+        self.status = status
+        self.headers = headers
+        self._has_body = has_body
+
+    async def _read_chunked(self, reader):
+        while True:
+            size = int((await reader.readline()).split(b';', 1)[0], 16)
+            if size == 0:
+                while (await reader.readline()) not in [b'\r\n', b'\n', b'']:
+                    pass
+                return
+            yield await reader.readexactly(size)
+            await reader.readexactly(2)
+
+    async def _read_length(self, reader, length):
+        while length > 0:
+            chunk = await reader.read(min(length, CHUNK_SIZE))
+            if chunk == b'':
+                raise asyncio.IncompleteReadError(b'', length)
+            length -= len(chunk)
+            yield chunk
+
+    async def _read_until_eof(self, reader):
+        chunk = await reader.read(CHUNK_SIZE)
+        while chunk != b'':
+            yield chunk
+            chunk = await reader.read(CHUNK_SIZE)
+
+    async def iter_chunks(self):
+        "Iterate over the body chunks as they are received"
+        if self._connection is None:
+            return
+
+        reader = self._connection[0]
+        reusable = self.headers.get('connection', '').lower() != 'close'
+        if not self._has_body:
+            chunks = None
+        elif self.headers.get('transfer-encoding', '').lower() == 'chunked':
+            chunks = self._read_chunked(reader)
+        elif 'content-length' in self.headers:
+            chunks = self._read_length(reader, int(self.headers['content-length']))
+        else:
+            chunks = self._read_until_eof(reader)
+            reusable = False
+
+        try:
+            if chunks is not None:
+                async for chunk in chunks:
+                    yield chunk
+        except BaseException:
+            reusable = False
+            raise
+        finally:
+            self._release(reusable)
+
+    async def read(self) -> bytes:
+        return b''.join([chunk async for chunk in self.iter_chunks()])
+
+    async def json(self):
+        return json.loads(await self.read())
+
+    async def iter_json(self):
+        "Iterate over the JSON messages of a streamed body, one per line"
+        pending = b''
+        async for chunk in self.iter_chunks():
+            lines = (pending + chunk).split(b'\n')
+            pending = lines.pop()
+            for line in lines:
+                if line.strip() != b'':
+                    yield json.loads(line)
+
+        if pending.strip() != b'':
+            yield json.loads(pending)
+
+    def _release(self, reusable):
+        if self._connection is not None:
+            self._client._release(self._connection, reusable)
+            self._connection = None
+
+    def close(self):
+        self._release(False)
+
+
+class DockerClient(object):
+    """Docker Engine API client keeping a pool of connections to the daemon.
+
+    At most max_connections requests are in flight at once. Connections are
+    kept open between requests and reused.
+    """
+    _path: str
+    _max_connections: int
+    _slots: asyncio.Semaphore
+    _idle: list
+
+    def __init__(self, host: str = None, max_connections: int = DEFAULT_MAX_CONNECTIONS):
+        host = host or os.environ.get('DOCKER_HOST', DEFAULT_DOCKER_HOST)
+        if not host.startswith('unix://'):
+            raise ValueError("Only unix sockets are supported by the docker API backend: %s" % host)
+
+        self._path = host[len('unix://'):]
+        self._max_connections = max_connections
+        self._slots = None
+        self._idle = []
+
+    async def _connect(self):
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self._max_connections)
+
+        await self._slots.acquire()
+        while any(self._idle):
+            connection = self._idle.pop()
+            if not connection[0].at_eof() and not connection[1].is_closing():
+                return connection, True
+            connection[1].close()
+
+        try:
+            return await asyncio.open_unix_connection(self._path), False
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def _release(self, connection, reusable):
+        if reusable:
+            self._idle.append(connection)
+        else:
+            connection[1].close()
+        self._slots.release()
+
+    @staticmethod
+    async def _send_file_segment(writer, segment: FileSegment):
+        writer.write(b"%x\r\n" % segment.count)
+        await writer.drain()
+        with open(segment.path, 'rb') as f:
+            sent = await asyncio.get_event_loop().sendfile(writer.transport, f, segment.offset, segment.count)
+        if sent < segment.count:
+            # The file shrank since the segment was planned: pad it to the announced size.
+            writer.write(bytes(segment.count - sent))
+        writer.write(b"\r\n")
+
+    @staticmethod
+    async def _send(writer, method, target, body, headers):
+        lines = ["%s %s HTTP/1.1" % (method, target), "Host: docker"]
+        lines.extend(["%s: %s" % item for item in headers.items()])
+        if isinstance(body, bytes):
+            lines.append("Content-Length: %d" % len(body))
+        elif body is not None:
+            lines.append("Transfer-Encoding: chunked")
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode('latin-1'))
+
+        if isinstance(body, bytes):
+            writer.write(body)
+        elif body is not None:
+            async for chunk in body:
+                if isinstance(chunk, FileSegment):
+                    await DockerClient._send_file_segment(writer, chunk)
+                elif len(chunk) > 0:
+                    writer.write(b"%x\r\n" % len(chunk))
+                    writer.write(chunk)
+                    writer.write(b"\r\n")
+                    await writer.drain()
+            writer.write(b"0\r\n\r\n")
+        await writer.drain()
+
+    @staticmethod
+    async def _receive_headers(reader):
+        status_line = await reader.readline()
+        if status_line == b'':
+            raise ConnectionResetError("Connection closed by the docker daemon")
+
+        status = int(status_line.split(b' ', 2)[1])
+        headers = dict()
+        line = await reader.readline()
+        while line not in [b'\r\n', b'\n', b'']:
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+            line = await reader.readline()
+
+        return status, headers
+
+    async def request(self, method: str, path: str, query: dict = None, body=None, headers: dict = None) -> DockerResponse:
+        """Send a request and return its response once its headers are received.
+
+        The body may be bytes or an asynchronous iterator of bytes-like objects
+        and FileSegment entries, sent chunked.
+        """
+        target = quote(path, safe="/:@") + ('?' + urlencode(query, doseq=True) if query else '')
+        headers = headers or dict()
+
+        connection, reused = await self._connect()
+        try:
+            await self._send(connection[1], method, target, body, headers)
+            status, response_headers = await self._receive_headers(connection[0])
+        except (ConnectionError, asyncio.IncompleteReadError):
+            self._release(connection, False)
+            if reused and (body is None or isinstance(body, bytes)):
+                # The daemon may have closed an idle connection: retry once on a new one.
+                return await self.request(method, path, query, body, headers)
+            raise
+        except BaseException:
+            self._release(connection, False)
+            raise
+
+        has_body = method != 'HEAD' and status not in [204, 304]
+        return DockerResponse(self, connection, status, response_headers, has_body)
+
+    async def _check(self, response: DockerResponse) -> DockerResponse:
+        if response.status >= 400:
+            body = await response.read()
+            try:
+                message = json.loads(body).get('message', body)
+            except ValueError:
+                message = body.decode('utf-8', 'replace')
+            raise DockerAPIException(response.status, message)
+        return response
+
+    async def ping(self) -> bool:
+        response = await self._check(await self.request('GET', '/_ping'))
+        return await response.read() == b'OK'
+
+    async def inspect_image(self, image: str):
+        "Return the image details, or None when the image is not available locally"
+        response = await self.request('GET', '/images/%s/json' % image)
+        if response.status == 404:
+            await response.read()
+            return None
+        return await (await self._check(response)).json()
+
+    async def list_images(self, filters: dict = None) -> list:
+        query = {'filters': json.dumps(filters)} if filters else None
+        response = await self._check(await self.request('GET', '/images/json', query))
+        return await response.json()
+
+    async def pull_image(self, image: str):
+        "Pull an image, yielding the progress messages of the daemon"
+        repository, tag = split_image_reference(image)
+        query = {'fromImage': image} if tag is None else {'fromImage': repository, 'tag': tag}
+
+        response = await self._check(await self.request('POST', '/images/create', query))
+        async for message in response.iter_json():
+            yield message
+
+    async def build_image(self, context, tags: list = None, dockerfile: str = None, labels: dict = None):
+        "Build an image from a tar archive of its context, yielding the messages of the daemon"
+        query = {'t': tags or [], 'rm': '1'}
+        if dockerfile is not None:
+            query['dockerfile'] = dockerfile
+        if labels:
+            query['labels'] = json.dumps(labels)
+
+        headers = {'Content-Type': 'application/x-tar'}
+        response = await self._check(await self.request('POST', '/build', query, context, headers))
+        async for message in response.iter_json():
+            yield message
+
+    async def close(self):
+        "Close the idle connections"
+        while any(self._idle):
+            writer = self._idle.pop()[1]
+            writer.close()
+            await writer.wait_closed()
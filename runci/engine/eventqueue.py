@@ -0,0 +1,246 @@
+from array import array
+import asyncio
+from collections import deque, namedtuple
+import tempfile
+
+from runci.entities import event
+
+OVERFLOW_PAUSE = 'pause'
+OVERFLOW_SPILL = 'spill'
+
+
+class SpilledMessage(namedtuple("SpilledMessage", "target stream time_ns offset length is_text")):
+    """Represent a queued message event whose payload has been written to the spill file"""
+
+
+class MessageColumns(object):
+    """Message events stored column by column rather than one object each.
+
+    Targets and streams are referenced by index in a small table, times and
+    payload boundaries are kept in typed arrays, and payloads are stored back
+    to back in a single bytearray. Events are rebuilt, in order, when read.
+    """
+    _sources: list
+    _source_indexes: dict
+    _keys: array
+    _times: array
+    _ends: array
+    _data: bytearray
+    _head: int
+
+    # Number of events read after which the space they use is reclaimed
+    RECLAIM_THRESHOLD = 1024
+
+    def __init__(self):
+        self._sources = []
+        self._source_indexes = dict()
+        self.clear()
+
+    @staticmethod
+    def accepts(job_event) -> bool:
+        return type(job_event) is event.JobMessageEvent and isinstance(job_event.data, (bytes, str))
+
+    def __len__(self):
+        return len(self._times) - self._head
+
+    def clear(self):
+        self._keys = array('I')
+        self._times = array('q')
+        self._ends = array('Q')
+        self._data = bytearray()
+        self._head = 0
+
+    def append(self, job_event: event.JobMessageEvent):
+        data = job_event.data
+        is_text = isinstance(data, str)
+        source = (id(job_event.target), id(job_event.stream), is_text)
+        key = self._source_indexes.get(source, None)
+        if key is None:
+            key = self._source_indexes[source] = len(self._sources)
+            self._sources.append((job_event.target, job_event.stream, is_text))
+
+        self._data += data.encode('utf-8') if is_text else data
+        self._keys.append(key)
+        self._times.append(job_event.time_ns)
+        self._ends.append(len(self._data))
+
+    def popleft(self) -> event.JobMessageEvent:
+        index = self._head
+        begin = self._ends[index - 1] if index > 0 else 0
+        data = bytes(self._data[begin:self._ends[index]])
+        target, stream, is_text = self._sources[self._keys[index]]
+        time_ns = self._times[index]
+
+        self._head += 1
+        if self._head == len(self._times):
+            self.clear()
+        elif self._head >= self.RECLAIM_THRESHOLD and self._head * 2 >= len(self._times):
+            self._reclaim()
+
+        return event.JobMessageEvent(target, stream, data.decode('utf-8') if is_text else data, time_ns=time_ns)
+
+    def _reclaim(self):
+        head = self._head
+        begin = self._ends[head - 1]
+        del self._data[:begin]
+        del self._keys[:head]
+        del self._times[:head]
+        self._ends = array('Q', [end - begin for end in self._ends[head:]])
+        self._head = 0
+
+
+class JobEventQueue(object):
+    """FIFO of the events of a job waiting to be processed.
+
+    The size of queued message payloads is accounted for. When it exceeds maxsize
+    bytes, either the registered producers are paused until the queue is drained
+    to half of it, or the newest payloads are spilled to a temporary file and read
+    back when their event is dequeued. No limit is enforced when maxsize is None.
+
+    When compact is set, consecutive message events are held in MessageColumns
+    rather than as event objects, trading some CPU for memory. Compact storage
+    only applies when producers are paused on overflow.
+    """
+    _entries: deque
+    _count: int
+    _size: int
+    _maxsize: int
+    _overflow: str
+    _producers: list
+    _paused: bool
+    _spill_file: object
+    _spilled: int
+    _getter: asyncio.Future
+    _compact: bool
+
+    def __init__(self, maxsize=None, overflow=OVERFLOW_PAUSE, compact=False):
+        if overflow not in [OVERFLOW_PAUSE, OVERFLOW_SPILL]:
+            raise ValueError("Unknown overflow mode: %s" % overflow)
+
+        self._entries = deque()
+        self._count = 0
+        self._size = 0
+        self._maxsize = maxsize
+        self._overflow = overflow
+        self._producers = []
+        self._paused = False
+        self._spill_file = None
+        self._spilled = 0
+        self._getter = None
+        self._compact = compact and overflow == OVERFLOW_PAUSE
+
+    @staticmethod
+    def _get_payload_size(job_event) -> int:
+        if type(job_event) is event.JobMessageEvent and job_event.data is not None:
+            return len(job_event.data)
+        return 0
+
+    def qsize(self) -> int:
+        return self._count
+
+    def empty(self) -> bool:
+        return self._count == 0
+
+    @property
+    def size(self) -> int:
+        "Size in bytes of the message payloads held in memory"
+        return self._size
+
+    def put_nowait(self, job_event):
+        if self._overflow == OVERFLOW_SPILL:
+            # The previous event is spilled rather than this one, which listeners are yet to see.
+            self._spill_last()
+
+        if self._compact and MessageColumns.accepts(job_event):
+            if self.empty() or not isinstance(self._entries[-1], MessageColumns):
+                self._entries.append(MessageColumns())
+            self._entries[-1].append(job_event)
+        else:
+            self._entries.append(job_event)
+        self._count += 1
+        self._size += self._get_payload_size(job_event)
+
+        if self._overflow == OVERFLOW_PAUSE and self._is_full():
+            self._pause_producers()
+
+        if self._getter is not None and not self._getter.done():
+            self._getter.set_result(None)
+
+    def get_nowait(self):
+        entry = self._entries[0]
+        if isinstance(entry, MessageColumns):
+            job_event = entry.popleft()
+            if len(entry) == 0:
+                self._entries.popleft()
+            self._size -= self._get_payload_size(job_event)
+        elif isinstance(entry, SpilledMessage):
+            job_event = self._read_spilled(self._entries.popleft())
+        else:
+            job_event = self._entries.popleft()
+            self._size -= self._get_payload_size(job_event)
+        self._count -= 1
+
+        if self._paused and self._size <= self._maxsize // 2:
+            self._resume_producers()
+
+        return job_event
+
+    async def get(self):
+        while self.empty():
+            self._getter = asyncio.get_event_loop().create_future()
+            await self._getter
+
+        return self.get_nowait()
+
+    def add_producer(self, producer):
+        "Register an object with pause_reading() and resume_reading() methods"
+        self._producers.append(producer)
+        if self._paused:
+            producer.pause_reading()
+
+    def remove_producer(self, producer):
+        if producer in self._producers:
+            self._producers.remove(producer)
+
+    def _is_full(self) -> bool:
+        return self._maxsize is not None and self._size > self._maxsize
+
+    def _pause_producers(self):
+        if not self._paused:
+            self._paused = True
+            for producer in self._producers:
+                producer.pause_reading()
+
+    def _resume_producers(self):
+        self._paused = False
+        for producer in self._producers:
+            producer.resume_reading()
+
+    def _spill_last(self):
+        if not self._is_full() or self.empty() or self._get_payload_size(self._entries[-1]) == 0:
+            return
+
+        job_event = self._entries[-1]
+        stream, message = job_event.stream, job_event.data
+        is_text = isinstance(message, str)
+        data = message.encode('utf-8') if is_text else message
+
+        if self._spill_file is None:
+            self._spill_file = tempfile.TemporaryFile()
+
+        offset = self._spill_file.seek(0, 2)
+        self._spill_file.write(data)
+        self._entries[-1] = SpilledMessage(job_event.target, stream, job_event.time_ns, offset, len(data), is_text)
+        self._size -= len(message)
+        self._spilled += 1
+
+    def _read_spilled(self, entry: SpilledMessage):
+        self._spill_file.seek(entry.offset)
+        data = self._spill_file.read(entry.length)
+
+        self._spilled -= 1
+        if self._spilled == 0:
+            self._spill_file.truncate(0)
+
+        message = data.decode('utf-8') if entry.is_text else data
+        return event.JobMessageEvent(entry.target, entry.stream, message, time_ns=entry.time_ns)
@@ -1,6 +1,9 @@
 import asyncio
 from enum import Enum
+import time
 
+from runci.engine.dispatch import DispatchTable, merge_tables
+from runci.engine.eventqueue import JobEventQueue
 from runci.entities import event
 from runci.entities.context import Context
 from runci.entities.config import Target
@@ -22,24 +25,41 @@ class Job(object):
     _context: Context
     _target: Target
     _status: JobStatus
-    _events: asyncio.Queue
+    _events: JobEventQueue
+    _task: asyncio.Task
+    _step_durations: list
     _job_event_listeners: dict
     _job_event_processors: dict
+    _listeners: DispatchTable
+    _processors: DispatchTable
 
     def __init__(self, context: Context, target: Target):
         self._context = context
         self._target = target
         self._status = JobStatus.CREATED
         self._events = None
+        self._task = None
+        self._step_durations = []
         self._job_event_listeners = {
             event.JobStepPauseEvent: [self.pause],
             event.JobStepResumeEvent: [self.resume],
         }
         self._job_event_processors = {}
+        self._listeners = merge_tables(context.listeners, self._job_event_listeners)
+        self._processors = merge_tables(context.processors, self._job_event_processors)
 
     def _ensure_event_queue_is_created(self):
         if self._events is None:
-            self._events = asyncio.Queue()
+            parameters = self._context.parameters
+            if parameters is None:
+                self._events = JobEventQueue()
+            else:
+                self._events = JobEventQueue(parameters.buffersize, parameters.overflow, parameters.compact)
+
+    @property
+    def pending_events(self) -> int:
+        "Number of events logged by the job and not processed yet"
+        return self._events.qsize() if self._events is not None else 0
 
     def _log_event(self, job_event):
         if not isinstance(job_event, event.JobEvent):
@@ -47,11 +67,10 @@ class Job(object):
         else:
             self._ensure_event_queue_is_created()
             self._events.put_nowait(job_event)
+            if self._context.bus is not None and self._events.qsize() == 1:
+                self._context.bus.notify(self)
 
-            listeners = self._context.listeners.get(type(job_event), []) + \
-                self._job_event_listeners.get(type(job_event), [])
-
-            for listener in listeners:
+            for listener in self._listeners.get_handlers(type(job_event)):
                 listener(job_event)
 
     async def _start(self):
@@ -62,9 +81,13 @@ class Job(object):
             for step in self._target.steps:
                 step_runner_cls = self._context.runners.get(step.type, None)
                 if step_runner_cls is not None:
-                    step_runner = step_runner_cls(self._target, step, self._log_event)
+                    self._ensure_event_queue_is_created()
+                    step_runner = step_runner_cls(self._target, step, self._log_event, self._events)
+                    self._log_event(event.JobStepStartEvent(self._target, step))
+                    started = time.monotonic()
                     await step_runner.run(self._context)
                     if step_runner.is_succeeded:
+                        self._step_durations.append((step, time.monotonic() - started))
                         self._log_event(event.JobStepSuccessEvent(self._target, step))
                     else:
                         self._log_event(event.JobStepFailureEvent(self._target, step))
@@ -79,12 +102,18 @@ class Job(object):
                 self.success()
 
     def start(self):
-        self._task = asyncio.create_task(self._start())
+        # Every caller awaits the same task, so a job shared between dependents only runs once.
+        if self._task is None:
+            self._task = asyncio.create_task(self._start())
         return self._task
 
     def run(self):
         return asyncio.run(self._start())
 
+    def ready(self, job_event=None):
+        if self._status == JobStatus.CREATED:
+            self._log_event(event.JobReadyEvent(self._target))
+
     def pause(self, job_event=None):
         if self._status in [JobStatus.STARTED]:
             self._status = JobStatus.PAUSED
@@ -113,6 +142,14 @@ class Job(object):
             self._log_event(event.JobCanceledEvent(self._target))
             self._status = JobStatus.CANCELED
 
+    @property
+    def target(self) -> Target:
+        return self._target
+
+    @property
+    def step_durations(self) -> list:
+        return self._step_durations
+
     @property
     def status(self) -> JobStatus:
         return self._status
@@ -127,6 +164,5 @@ class Job(object):
         while ((not no_wait and self._status == JobStatus.STARTED) or
                not self._events.empty()):
             job_event = await self._events.get()
-            processors = self._context.processors.get(type(job_event), [])
-            for processor in processors:
+            for processor in self._processors.get_handlers(type(job_event)):
                 processor(job_event)
@@ -1,9 +1,21 @@
 from abc import ABC
 
+from runci.entities.context import Context
+
 
 class ListenerBase(ABC):
+    """Base class of the event listeners.
+
+    A listener is instantiated once per context. Its event_listeners are called
+    as soon as an event is logged, while its event_processors are called when
+    the engine processes the queued events.
+    """
     event_listeners = {}
     event_processors = {}
 
-    def __init__(self):
+    def __init__(self, context: Context = None):
+        self._context = context
+
+    def close(self):
+        "Called once the run is over and every event has been processed"
         pass
@@ -0,0 +1,39 @@
+from runci.dal.logstore import LogWriter
+from runci.entities import event
+from runci.entities.context import Context
+from .base import ListenerBase
+
+
+class LogStoreListener(ListenerBase):
+    """Persist the output of every job in the log store of the state directory.
+
+    See runci.viewer to read the stored logs.
+    """
+    _writers: dict
+
+    def __init__(self, context: Context = None):
+        super().__init__(context)
+        self._writers = dict()
+
+        if context is not None and context.parameters is not None and context.parameters.statedir is not None:
+            self.event_processors = {
+                event.JobMessageEvent: self.message_event_logger,
+                event.JobEndEvent: self.end_event_logger,
+            }
+
+    def message_event_logger(self, job_event: event.JobMessageEvent):
+        message = job_event.data
+        if isinstance(message, str):
+            message = message.encode('utf-8')
+
+        writer = self._writers.get(job_event.target.name, None)
+        if writer is None:
+            writer = LogWriter(self._context.parameters.statedir, job_event.target.name)
+            self._writers[job_event.target.name] = writer
+
+        writer.write(message)
+
+    def end_event_logger(self, job_event: event.JobEndEvent):
+        writer = self._writers.pop(job_event.target.name, None)
+        if writer is not None:
+            writer.close()
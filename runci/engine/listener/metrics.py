@@ -0,0 +1,179 @@
+"""Run metrics, exported in the Prometheus text format.
+
+The file is meant to be collected by the textfile collector of node_exporter.
+"""
+import asyncio
+import os
+
+from runci.entities import event
+from runci.entities.context import Context
+from .base import ListenerBase
+
+METRICS_INTERVAL = 15
+STEP_DURATION_BUCKETS = [0.1, 0.5, 1, 5, 10, 30, 60, 300, 900, 3600]
+QUEUE_DEPTH_BUCKETS = [1, 4, 16, 64, 256, 1024, 4096]
+SPAWN_LATENCY_BUCKETS = [0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1]
+
+
+def _format_labels(labels: tuple) -> str:
+    if not any(labels):
+        return ""
+    values = ['%s="%s"' % (name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+              for name, value in labels]
+    return "{%s}" % ",".join(values)
+
+
+def _format_value(value) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter(object):
+    "Counter metric, by label values"
+
+    def __init__(self, name: str, description: str):
+        self.name = name
+        self.description = description
+        self._values = dict()
+
+    def inc(self, labels: tuple = (), value=1):
+        self._values[labels] = self._values.get(labels, 0) + value
+
+    def get(self, labels: tuple = ()):
+        return self._values.get(labels, 0)
+
+    def format(self) -> list:
+        lines = ["# HELP %s %s" % (self.name, self.description), "# TYPE %s counter" % self.name]
+        for labels, value in sorted(self._values.items()):
+            lines.append("%s%s %s" % (self.name, _format_labels(labels), _format_value(value)))
+        return lines
+
+
+class Histogram(object):
+    "Histogram metric, by label values"
+
+    def __init__(self, name: str, description: str, buckets: list):
+        self.name = name
+        self.description = description
+        self._buckets = buckets
+        self._values = dict()
+
+    def observe(self, value, labels: tuple = ()):
+        counts = self._values.get(labels, None)
+        if counts is None:
+            # One count per bucket, then the total count and the sum
+            counts = self._values[labels] = [0] * (len(self._buckets) + 2)
+        for index, bound in enumerate(self._buckets):
+            if value <= bound:
+                counts[index] += 1
+        counts[-2] += 1
+        counts[-1] += value
+
+    def get_count(self, labels: tuple = ()) -> int:
+        counts = self._values.get(labels, None)
+        return counts[-2] if counts is not None else 0
+
+    def format(self) -> list:
+        lines = ["# HELP %s %s" % (self.name, self.description), "# TYPE %s histogram" % self.name]
+        for labels, counts in sorted(self._values.items()):
+            bounds = [_format_value(float(bound)) for bound in self._buckets] + ["+Inf"]
+            for bound, count in zip(bounds, counts[:-2] + counts[-2:-1]):
+                lines.append("%s_bucket%s %d" % (self.name, _format_labels(labels + (("le", bound),)), count))
+            lines.append("%s_sum%s %s" % (self.name, _format_labels(labels), _format_value(counts[-1])))
+            lines.append("%s_count%s %d" % (self.name, _format_labels(labels), counts[-2]))
+        return lines
+
+
+class MetricsListener(ListenerBase):
+    """Keep metrics of the run and write them to the metrics file of the parameters.
+
+    The file is replaced atomically every METRICS_INTERVAL seconds while the
+    run goes on, and a last time when the listener is closed.
+    """
+    _steps: dict
+    _timer: asyncio.TimerHandle
+
+    def __init__(self, context: Context = None):
+        super().__init__(context)
+        self._steps = dict()
+        self._timer = None
+
+        self.step_duration = Histogram("runci_step_duration_seconds", "Duration of the steps, by runner.",
+                                       STEP_DURATION_BUCKETS)
+        self.jobs = Counter("runci_jobs_total", "Jobs ended, by outcome.")
+        self.output_bytes = Counter("runci_job_output_bytes_total", "Bytes of output of the jobs, by target.")
+        self.queue_depth = Histogram("runci_event_queue_depth", "Events left in the queue of a job when processing one.",
+                                     QUEUE_DEPTH_BUCKETS)
+        self.spawn_latency = Histogram("runci_process_spawn_seconds", "Time taken to spawn a process, by runner.",
+                                       SPAWN_LATENCY_BUCKETS)
+
+        if context is not None and context.parameters is not None and context.parameters.metrics is not None:
+            self.event_processors = {
+                event.JobMessageEvent: self.message_processor,
+                event.JobStepStartEvent: self.step_start_processor,
+                event.JobStepEndEvent: self.step_end_processor,
+                event.JobProcessStartEvent: self.process_start_processor,
+                event.JobEndEvent: self.job_end_processor,
+            }
+
+    @property
+    def path(self):
+        return self._context.parameters.metrics
+
+    def _schedule(self):
+        if self._timer is None:
+            self._timer = asyncio.get_event_loop().call_later(METRICS_INTERVAL, self._tick)
+
+    def _tick(self):
+        self._timer = None
+        self.write()
+        self._schedule()
+
+    def message_processor(self, job_event: event.JobMessageEvent):
+        message = job_event.data
+        size = len(message) if isinstance(message, bytes) else len(message.encode('utf-8'))
+        self.output_bytes.inc((("target", job_event.target.name),), size)
+
+        job = self._context.jobs.get(job_event.target.name, None)
+        if job is not None:
+            self.queue_depth.observe(job.pending_events)
+
+    def step_start_processor(self, job_event: event.JobStepStartEvent):
+        self._steps[job_event.target.name] = job_event.time_ns
+        self._schedule()
+
+    def step_end_processor(self, job_event: event.JobStepEndEvent):
+        started = self._steps.pop(job_event.target.name, None)
+        if started is not None:
+            duration = (job_event.time_ns - started) / 1e9
+            self.step_duration.observe(duration, (("runner", job_event.step.type),))
+
+    def process_start_processor(self, job_event: event.JobProcessStartEvent):
+        self.spawn_latency.observe(job_event.latency, (("runner", job_event.step.type),))
+
+    def job_end_processor(self, job_event: event.JobEndEvent):
+        outcome = type(job_event).__name__[len('Job'):-len('Event')].lower()
+        self.jobs.inc((("outcome", outcome),))
+
+    def format(self) -> str:
+        lines = []
+        for metric in [self.step_duration, self.jobs, self.output_bytes, self.queue_depth, self.spawn_latency]:
+            lines.extend(metric.format())
+        return "\n".join(lines) + "\n"
+
+    def write(self):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        # The temporary file has an extension the textfile collector ignores.
+        temp_path = self.path + ".tmp"
+        with open(temp_path, 'w') as datastream:
+            datastream.write(self.format())
+        os.replace(temp_path, self.path)
+
+    def close(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        if self._context is not None and self._context.parameters is not None \
+                and self._context.parameters.metrics is not None:
+            self.write()
@@ -1,26 +1,61 @@
+import codecs
 import sys
 
 from runci.entities import event
+from runci.entities.context import Context
 from .base import ListenerBase
 
 
 class TerminalListener(ListenerBase):
-    @staticmethod
-    def message_event_logger(job_event: event.JobMessageEvent):
-        valid_streams = [sys.stdout, sys.stderr]
-        job_message = job_event.message
-        message = job_message.message
-        stream = job_message.stream
+    """Write the output of the jobs to the terminal.
 
-        if isinstance(message, bytes):
-            message = message.decode(stream.encoding)
+    Bytes are written straight to the binary buffer of the streams, which is
+    flushed after every write so that they keep their order with the text
+    printed elsewhere. Streams without binary buffer get text decoded per job,
+    and the decoders of a job are flushed when it ends.
+    """
+    # Incremental decoders of streams without binary buffer, by target and stream
+    _decoders: dict
 
-        if stream in valid_streams:
-            stream.write(message)
+    def __init__(self, context: Context = None):
+        super().__init__(context)
+        self._decoders = dict()
+        self.event_processors = {
+            event.JobMessageEvent: self.message_event_logger,
+            event.JobEndEvent: self.end_event_logger,
+        }
+
+    def _write_bytes(self, stream, job_event: event.JobMessageEvent, message: bytes):
+        buffer = getattr(stream, 'buffer', None)
+        if buffer is None:
+            # Decode per job, so that characters split across chunks are kept whole.
+            key = (job_event.target.name, stream)
+            decoder = self._decoders.get(key, None)
+            if decoder is None:
+                decoder = codecs.getincrementaldecoder(stream.encoding or 'utf-8')('replace')
+                self._decoders[key] = decoder
+            stream.write(decoder.decode(message))
+            return
+
+        # Text printed to the stream since the last write goes first.
+        stream.flush()
+        buffer.write(message)
+        buffer.flush()
+
+    def message_event_logger(self, job_event: event.JobMessageEvent):
+        valid_streams = [sys.stdout, sys.stderr]
+        message = job_event.data
+        stream = job_event.stream
+
+        if stream not in valid_streams:
+            print("Unknown stream: " + str(stream), file=sys.stderr)
+            print("Message: " + str(message), file=sys.stderr)
+        elif isinstance(message, bytes):
+            self._write_bytes(stream, job_event, message)
         else:
-            print("Unknown stream: " + stream, file=sys.stderr)
-            print("Message: " + message, file=sys.stderr)
+            stream.write(message)
 
-    event_processors = {
-        event.JobMessageEvent: message_event_logger.__func__
-    }
+    def end_event_logger(self, job_event: event.JobEndEvent):
+        "Write what is left in the decoders of the job, such as a truncated character"
+        for key in [key for key in self._decoders.keys() if key[0] == job_event.target.name]:
+            key[1].write(self._decoders.pop(key).decode(b'', final=True))
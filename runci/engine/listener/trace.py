@@ -0,0 +1,247 @@
+"""Timeline of a run, exported in the Chrome trace-event format.
+
+The file can be opened with chrome://tracing or https://ui.perfetto.dev.
+"""
+import json
+import os
+import tempfile
+import time
+
+from runci.entities import event
+from runci.entities.context import Context
+from .base import ListenerBase
+
+TRACE_FILE = "trace.json"
+TRACE_PID = 1
+CRITICAL_PATH_TID = 0
+
+
+class _JobTimeline(object):
+    "Times recorded for a job, as offsets in microseconds from the start of the run"
+
+    def __init__(self, name):
+        self.name = name
+        self.ready = None
+        self.start = None
+        self.end = None
+        self.status = None
+        self.steps = []
+        self.pauses = []
+        self.instants = []
+        self._step = None
+        self._pause = None
+
+    def on_ready(self, step, offset, event_type):
+        self.ready = offset
+
+    def on_start(self, step, offset, event_type):
+        self.start = offset
+
+    def on_end(self, step, offset, event_type):
+        self.end = offset
+        self.status = event_type.__name__[len('Job'):-len('Event')].lower()
+
+    def on_step_start(self, step, offset, event_type):
+        self._step = (step, offset)
+
+    def on_step_end(self, step, offset, event_type):
+        if self._step is None:
+            # Steps ending without having started, such as those of an unknown type
+            self.on_instant(step, offset, event_type)
+            return
+
+        outcome = 'success' if event_type is event.JobStepSuccessEvent else 'failure'
+        self.steps.append((self._step[0], self._step[1], offset, outcome))
+        self._step = None
+
+    def on_step_pause(self, step, offset, event_type):
+        self._pause = offset
+
+    def on_step_resume(self, step, offset, event_type):
+        if self._pause is not None:
+            self.pauses.append((self._pause, offset))
+            self._pause = None
+
+    def on_instant(self, step, offset, event_type):
+        self.instants.append((step, offset, event_type.__name__))
+
+    def finish(self, offset):
+        "Close whatever was left open by a run that was interrupted"
+        if self._step is not None:
+            self.steps.append((self._step[0], self._step[1], offset, 'interrupted'))
+            self._step = None
+        self.on_step_resume(None, offset, None)
+        if self.start is not None and self.end is None:
+            self.end = offset
+
+
+_handlers = {
+    event.JobReadyEvent: _JobTimeline.on_ready,
+    event.JobStartEvent: _JobTimeline.on_start,
+    event.JobSuccessEvent: _JobTimeline.on_end,
+    event.JobFailureEvent: _JobTimeline.on_end,
+    event.JobCanceledEvent: _JobTimeline.on_end,
+    event.JobStepStartEvent: _JobTimeline.on_step_start,
+    event.JobStepSuccessEvent: _JobTimeline.on_step_end,
+    event.JobStepFailureEvent: _JobTimeline.on_step_end,
+    event.JobStepUnknownTypeEvent: _JobTimeline.on_step_end,
+    event.JobStepPauseEvent: _JobTimeline.on_step_pause,
+    event.JobStepResumeEvent: _JobTimeline.on_step_resume,
+    event.JobStepCachedEvent: _JobTimeline.on_instant,
+    event.JobImageCachedEvent: _JobTimeline.on_instant,
+}
+
+
+def _get_handler(event_type):
+    for cls in event_type.__mro__:
+        if cls in _handlers:
+            return _handlers[cls]
+
+
+# Event types recorded, their subclasses included
+_traced_events = [
+    event.JobReadyEvent,
+    event.JobStartEvent,
+    event.JobEndEvent,
+    event.JobStepStartEvent,
+    event.JobStepEndEvent,
+    event.JobStepPauseEvent,
+    event.JobStepResumeEvent,
+    event.JobStepCachedEvent,
+    event.JobImageCachedEvent,
+]
+
+
+def _span(name, category, tid, start, end, args=None):
+    span = {"name": name, "cat": category, "ph": "X", "pid": TRACE_PID, "tid": tid,
+            "ts": start, "dur": max(end - start, 0)}
+    if args:
+        span["args"] = args
+    return span
+
+
+def _thread_name(tid, name):
+    return {"name": "thread_name", "ph": "M", "pid": TRACE_PID, "tid": tid, "args": {"name": name}}
+
+
+class TraceListener(ListenerBase):
+    """Record the timeline of the run and write it to the state directory.
+
+    Events are only appended to a list while the run goes on: the trace is
+    built and written when the listener is closed. Every job has its own track,
+    showing the time spent waiting for its dependencies, waiting for a job slot,
+    and running each of its steps. The critical path and the background
+    teardowns have their own tracks.
+    """
+    _started: int
+    _records: list
+
+    def __init__(self, context: Context = None):
+        super().__init__(context)
+        self._started = time.monotonic_ns()
+        self._records = []
+
+        if context is not None and context.parameters is not None and context.parameters.statedir is not None:
+            self.event_processors = dict([(event_type, self.record) for event_type in _traced_events])
+
+    @property
+    def path(self):
+        return os.path.join(self._context.parameters.statedir, TRACE_FILE)
+
+    def record(self, job_event: event.JobEvent):
+        step = getattr(job_event, 'step', None)
+        self._records.append((type(job_event), job_event.target.name,
+                              step.name if step is not None else None, job_event.time_ns))
+
+    def _get_time(self, time_ns: int) -> int:
+        return (time_ns - self._started) // 1000
+
+    def get_timelines(self) -> dict:
+        "Replay the recorded events into the timeline of every job, by target name"
+        timelines = dict()
+        last = 0
+        for event_type, target_name, step_name, time_ns in self._records:
+            timeline = timelines.get(target_name, None)
+            if timeline is None:
+                timeline = timelines[target_name] = _JobTimeline(target_name)
+            last = self._get_time(time_ns)
+            _get_handler(event_type)(timeline, step_name, last, event_type)
+
+        for timeline in timelines.values():
+            timeline.finish(last)
+        return timelines
+
+    def _get_dependencies(self, name: str) -> list:
+        target = self._context.project.get_target(name)
+        if target is None:
+            # The root job is not part of the project: it depends on the requested targets.
+            return list(self._context.parameters.targets or [])
+        return list(target.dependencies)
+
+    def get_critical_path(self, timelines: dict) -> list:
+        "Chain of jobs, from the last one to end, through the dependency each of them waited for the longest"
+        ended = [timeline for timeline in timelines.values() if timeline.end is not None]
+        if not any(ended):
+            return []
+
+        path = [max(ended, key=lambda timeline: timeline.end)]
+        while True:
+            dependencies = [timelines[name] for name in self._get_dependencies(path[-1].name)
+                            if name in timelines and timelines[name].end is not None]
+            if not any(dependencies):
+                return path
+            path.append(max(dependencies, key=lambda timeline: timeline.end))
+
+    def _get_job_events(self, tid: int, timeline: _JobTimeline) -> list:
+        events = [_thread_name(tid, timeline.name)]
+        if timeline.ready is not None and timeline.ready > 0:
+            events.append(_span("waiting for dependencies", "wait", tid, 0, timeline.ready))
+        if timeline.ready is not None and timeline.start is not None:
+            events.append(_span("waiting for a job slot", "wait", tid, timeline.ready, timeline.start))
+        if timeline.start is not None:
+            events.append(_span(timeline.name, "job", tid, timeline.start, timeline.end,
+                                {"status": timeline.status or "unknown"}))
+        for step_name, start, end, outcome in timeline.steps:
+            events.append(_span(step_name, "step", tid, start, end, {"outcome": outcome}))
+        for start, end in timeline.pauses:
+            events.append(_span("waiting for targets", "wait", tid, start, end))
+        for step_name, offset, name in timeline.instants:
+            events.append({"name": name, "cat": "step", "ph": "i", "s": "t", "pid": TRACE_PID, "tid": tid,
+                           "ts": offset, "args": {"step": step_name}})
+        return events
+
+    def get_trace_events(self) -> list:
+        timelines = self.get_timelines()
+        ordered = sorted(timelines.values(), key=lambda timeline: (timeline.start is None, timeline.start or 0))
+
+        events = [_thread_name(CRITICAL_PATH_TID, "critical path")]
+        for timeline in reversed(self.get_critical_path(timelines)):
+            if timeline.start is not None:
+                events.append(_span(timeline.name, "critical", CRITICAL_PATH_TID, timeline.start, timeline.end))
+
+        for tid, timeline in enumerate(ordered, 1):
+            events.extend(self._get_job_events(tid, timeline))
+
+        cleanup = self._context.cleanup
+        if cleanup is not None and any(cleanup.spans):
+            tid = len(ordered) + 1
+            events.append(_thread_name(tid, "teardown"))
+            for name, start, end in cleanup.spans:
+                events.append(_span(name, "teardown", tid, self._get_time(start), self._get_time(end)))
+
+        return events
+
+    def close(self):
+        if not any(self._records):
+            return
+
+        statedir = self._context.parameters.statedir
+        os.makedirs(statedir, exist_ok=True)
+        descriptor, temp_path = tempfile.mkstemp(prefix=TRACE_FILE + ".", suffix=".tmp", dir=statedir)
+        try:
+            with os.fdopen(descriptor, 'w') as datastream:
+                json.dump({"traceEvents": self.get_trace_events(), "displayTimeUnit": "ms"}, datastream)
+            os.replace(temp_path, self.path)
+        except BaseException:
+            os.remove(temp_path)
+            raise
@@ -0,0 +1,42 @@
+import asyncio
+from typing import Awaitable, Callable, Hashable
+
+
+class TaskMemo(object):
+    """Run a coroutine once per key for the rest of a run.
+
+    Concurrent requests for the same key share a single run, and keys whose run
+    succeeded are not run again. A failed run is retried by the next request.
+    """
+    _tasks: dict
+
+    def __init__(self):
+        self._tasks = dict()
+
+    def is_running(self, key: Hashable) -> bool:
+        future = self._tasks.get(key, None)
+        return future is not None and not future.done()
+
+    def is_done(self, key: Hashable) -> bool:
+        future = self._tasks.get(key, None)
+        return future is not None and future.done() and not future.cancelled() \
+            and future.exception() is None and future.result()
+
+    def _forget_failure(self, key: Hashable, future: asyncio.Future):
+        if future.cancelled() or future.exception() is not None or not future.result():
+            if self._tasks.get(key, None) is future:
+                del self._tasks[key]
+
+    async def run(self, key: Hashable, function: Callable[[], Awaitable[bool]]) -> bool:
+        """Run function for this key, unless it already succeeded or is running.
+
+        function is a coroutine function returning whether it succeeded.
+        """
+        future = self._tasks.get(key, None)
+        if future is None:
+            future = asyncio.ensure_future(function())
+            future.add_done_callback(lambda f: self._forget_failure(key, f))
+            self._tasks[key] = future
+
+        # A canceled job must not cancel a run other jobs are waiting for.
+        return await asyncio.shield(future)
@@ -0,0 +1,66 @@
+import asyncio
+from typing import Awaitable, Callable
+
+from runci.engine.dockerapi import split_image_reference
+from runci.engine.memo import TaskMemo
+
+DEFAULT_MAX_PULLS = 4
+
+
+def get_image_key(image: str) -> str:
+    "Normalize an image reference, so that busybox and busybox:latest are pulled once"
+    repository, tag = split_image_reference(image)
+    return image if tag is None else "%s:%s" % (repository, tag)
+
+
+class PullCoordinator(TaskMemo):
+    """Engine-wide coordinator of the docker pulls of a run.
+
+    Jobs pulling the same image share a single pull, at most max_pulls pulls
+    run at once, and images pulled successfully are not pulled again for the
+    rest of the run. Failed pulls are retried by the next job asking for them.
+    """
+    _max_pulls: int
+    _slots: asyncio.Semaphore
+    _background: set
+
+    def __init__(self, max_pulls: int = DEFAULT_MAX_PULLS):
+        super().__init__()
+        self._max_pulls = max_pulls
+        self._slots = None
+        self._background = set()
+
+    def is_pulling(self, image: str) -> bool:
+        return self.is_running(get_image_key(image))
+
+    def is_pulled(self, image: str) -> bool:
+        return self.is_done(get_image_key(image))
+
+    async def _pull(self, image: str, puller: Callable[[str], Awaitable[bool]]) -> bool:
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self._max_pulls)
+
+        async with self._slots:
+            return await puller(image)
+
+    async def pull(self, image: str, puller: Callable[[str], Awaitable[bool]]) -> bool:
+        """Pull an image with puller, unless it is already pulled or being pulled.
+
+        puller is a coroutine function returning whether the pull succeeded.
+        """
+        return await self.run(get_image_key(image), lambda: self._pull(image, puller))
+
+    def pull_in_background(self, image: str, puller: Callable[[str], Awaitable[bool]]):
+        "Start a pull nobody waits for, such as the revalidation of a cached image"
+        task = asyncio.ensure_future(self.pull(image, puller))
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    def cancel_background(self):
+        for task in self._background:
+            task.cancel()
+
+    async def wait_background(self):
+        "Wait for the background pulls, so that none of them outlives the run"
+        if any(self._background):
+            await asyncio.gather(*self._background, return_exceptions=True)
@@ -0,0 +1,155 @@
+"""Plugin registry: runners and listeners are declared by name and imported on first use"""
+import functools
+import importlib
+import os
+import sys
+from collections.abc import MutableMapping
+
+from runci.dal import projectcache
+
+RUNNER_ENTRY_POINTS = "runci.runners"
+LISTENER_ENTRY_POINTS = "runci.listeners"
+
+# Built-in runners, by step type
+builtin_runners = {
+    "compose-build": "runci.engine.runner.compose_build:ComposeBuildRunner",
+    "compose-run": "runci.engine.runner.compose_run:ComposeRunRunner",
+    "docker-build": "runci.engine.runner.docker_build:DockerBuildRunner",
+    "docker-pull": "runci.engine.runner.docker_pull:DockerPullRunner",
+    "exec": "runci.engine.runner.local:ExecRunner",
+    "shell": "runci.engine.runner.local:ShellRunner",
+    "target-run": "runci.engine.runner.target_run:TargetRunRunner",
+}
+
+# Built-in listeners, all of them being active in every context
+builtin_listeners = [
+    "runci.engine.listener.terminal:TerminalListener",
+    "runci.engine.listener.logstore:LogStoreListener",
+    "runci.engine.listener.trace:TraceListener",
+    "runci.engine.listener.metrics:MetricsListener",
+]
+
+
+def load_object(path: str):
+    "Import the object designated by a module:attribute path"
+    module_name, _, attribute = path.partition(':')
+    module = importlib.import_module(module_name)
+    return getattr(module, attribute) if attribute else module
+
+
+def _scan_entry_points() -> dict:
+    "Return the module:attribute path of the installed plugins, by group and name"
+    try:
+        from importlib import metadata
+    except ImportError:
+        return dict()
+
+    entry_points = metadata.entry_points()
+    groups = dict()
+    for group in [RUNNER_ENTRY_POINTS, LISTENER_ENTRY_POINTS]:
+        if hasattr(entry_points, 'select'):
+            selected = entry_points.select(group=group)
+        else:
+            selected = entry_points.get(group, [])
+        groups[group] = dict([(entry_point.name, entry_point.value) for entry_point in selected])
+    return groups
+
+
+def get_environment_key() -> list:
+    "Modification time of the directories of the import path, which changes when a distribution is (un)installed"
+    key = []
+    for path in sys.path:
+        try:
+            key.append((path, os.stat(path or os.curdir).st_mtime_ns))
+        except OSError:
+            key.append((path, None))
+    return key
+
+
+@functools.lru_cache(maxsize=None)
+def _get_installed_entry_points(statedir) -> dict:
+    if statedir is None:
+        return _scan_entry_points()
+
+    # Scanning the installed distributions is slow: the result is kept in the state
+    # directory until the import path changes.
+    key = get_environment_key()
+    groups = projectcache.load_cached_entry_points(statedir, key)
+    if groups is None:
+        groups = _scan_entry_points()
+        try:
+            projectcache.save_cached_entry_points(statedir, key, groups)
+        except OSError:
+            pass
+    return groups
+
+
+def get_entry_points(group: str, statedir: str = None) -> dict:
+    "Return the module:attribute path of the plugins installed for a group, by name"
+    return _get_installed_entry_points(statedir).get(group, dict())
+
+
+def get_listener_paths(statedir: str = None) -> list:
+    paths = list(builtin_listeners)
+    paths.extend([path for path in get_entry_points(LISTENER_ENTRY_POINTS, statedir).values() if path not in paths])
+    return paths
+
+
+class RunnerRegistry(MutableMapping):
+    """Runner classes by step type, imported the first time they are looked up.
+
+    Runners are declared by a manifest of step types to module:class paths.
+    Installed runci.runners entry points are only looked at for step types
+    missing from the manifest, their scan being cached in the state directory
+    when one is given.
+    """
+    _manifest: dict
+    _runners: dict
+    _entry_points: str
+    _statedir: str
+
+    def __init__(self, manifest: dict = None, entry_points: str = RUNNER_ENTRY_POINTS, statedir: str = None):
+        self._manifest = dict(manifest) if manifest is not None else dict()
+        self._runners = dict()
+        self._entry_points = entry_points
+        self._statedir = statedir
+
+    def _get_path(self, selector: str):
+        path = self._manifest.get(selector, None)
+        if path is None and self._entry_points is not None:
+            path = get_entry_points(self._entry_points, self._statedir).get(selector, None)
+        return path
+
+    def __getitem__(self, selector: str):
+        runner = self._runners.get(selector, None)
+        if runner is None:
+            path = self._get_path(selector)
+            if path is None:
+                raise KeyError(selector)
+            runner = self._runners[selector] = load_object(path)
+        return runner
+
+    def __setitem__(self, selector: str, runner):
+        self._runners[selector] = runner
+
+    def __delitem__(self, selector: str):
+        declared = self._manifest.pop(selector, None) is not None
+        if self._runners.pop(selector, None) is None and not declared:
+            raise KeyError(selector)
+
+    def __contains__(self, selector):
+        # Unlike the default implementation, this does not import the runner.
+        return selector in self._runners or self._get_path(selector) is not None
+
+    def __iter__(self):
+        selectors = list(self._manifest.keys())
+        if self._entry_points is not None:
+            selectors.extend(get_entry_points(self._entry_points, self._statedir).keys())
+        selectors.extend(self._runners.keys())
+        return iter(dict.fromkeys(selectors))
+
+    def __len__(self):
+        return len(list(iter(self)))
+
+    def is_loaded(self, selector: str) -> bool:
+        return selector in self._runners
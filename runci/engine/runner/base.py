@@ -2,6 +2,7 @@ from abc import abstractmethod
 import asyncio
 import os
 import sys
+import time
 import traceback
 from typing import Callable
 
@@ -16,16 +17,37 @@ if sys.platform == "win32":
 
 
 class RunnerSubprocessProtocol(asyncio.SubprocessProtocol):
-    _streams = [sys.stdout, sys.stderr]
-
-    def __init__(self, message_logger, exit_future):
+    def __init__(self, message_logger, exit_future, flow_control=None):
         self._message_logger = message_logger
         self._exit_future = exit_future
+        self._flow_control = flow_control
+        self._transport = None
+
+    def connection_made(self, transport):
+        self._transport = transport
+        if self._flow_control is not None:
+            self._flow_control.add_producer(self)
 
     def pipe_data_received(self, fd, data):
-        self._message_logger(self._streams[fd-1], data)
+        # Raw bytes are passed through: they are only decoded by listeners needing text.
+        self._message_logger(sys.stdout if fd == 1 else sys.stderr, data)
+
+    def _get_pipes(self):
+        pipes = [self._transport.get_pipe_transport(fd) for fd in [1, 2]]
+        return [pipe for pipe in pipes if pipe is not None and not pipe.is_closing()]
+
+    def pause_reading(self):
+        for pipe in self._get_pipes():
+            pipe.pause_reading()
+
+    def resume_reading(self):
+        for pipe in self._get_pipes():
+            pipe.resume_reading()
 
-    def process_exited(self):
+    def connection_lost(self, exc):
+        # Called once the process has exited and all its output has been read.
+        if self._flow_control is not None:
+            self._flow_control.remove_producer(self)
         self._exit_future.set_result(True)
 
 
@@ -34,13 +56,15 @@ class RunnerBase():
     _step: Step
     _status: RunnerStatus
     _event_logger: Callable
+    _flow_control: object
     _selector = None
 
-    def __init__(self, target: Target, step: Step, event_logger: Callable):
+    def __init__(self, target: Target, step: Step, event_logger: Callable, flow_control=None):
         self._target = target
         self._step = step
         self._status = RunnerStatus.CREATED
         self._event_logger = event_logger
+        self._flow_control = flow_control
 
     @classmethod
     def get_selector(cls):
@@ -80,17 +104,31 @@ class RunnerBase():
         if self._status == RunnerStatus.STARTED:
             self._status = RunnerStatus.SUCCEEDED
 
-    async def _run_process(self, args):
+    async def _run_process(self, args, env: dict = None, cwd: str = None):
         self._log_runner_message(sys.stdout, "Running command: %s" % str.join(" ", args))
         loop = asyncio.get_event_loop()
         exit_future = asyncio.Future(loop=loop)
 
+        started = time.monotonic()
         transport, protocol = await loop.subprocess_exec(
-            lambda: RunnerSubprocessProtocol(self._log_message, exit_future),
+            lambda: RunnerSubprocessProtocol(self._log_message, exit_future, self._flow_control),
             args[0], *args[1:],
-            stdin=None)
+            stdin=None, env=env, cwd=cwd)
+        self._log_event(event.JobProcessStartEvent(self._target, self._step, time.monotonic() - started))
+
+        try:
+            await asyncio.shield(exit_future)
+        except asyncio.CancelledError:
+            # Kill the process rather than leaving it running, and wait until its output is read.
+            if transport.get_returncode() is None:
+                try:
+                    transport.kill()
+                except ProcessLookupError:
+                    pass
+            await exit_future
+            transport.close()
+            raise
 
-        await exit_future
         return_code = transport.get_returncode()
         transport.close()
 
@@ -99,6 +137,33 @@ class RunnerBase():
 
         return return_code
 
+    async def _log_api_messages(self, messages):
+        "Log the JSON messages streamed by the docker API, failing on error messages"
+        succeeded = True
+        async for message in messages:
+            if 'error' in message:
+                self._log_runner_message(sys.stderr, message['error'])
+                self._status = RunnerStatus.FAILED
+                succeeded = False
+            elif 'stream' in message:
+                self._log_message(sys.stdout, message['stream'])
+            elif 'status' in message and 'progress' not in message:
+                status = message['status'] if 'id' not in message else "%s: %s" % (message['id'], message['status'])
+                self._log_runner_message(sys.stdout, status)
+
+        return succeeded
+
+    async def _get_process_output(self, args):
+        "Run a command quietly and return its exit code and standard output"
+        process = await asyncio.create_subprocess_exec(
+            args[0], *args[1:],
+            stdin=asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.DEVNULL)
+
+        output, _ = await process.communicate()
+        return process.returncode, output
+
     @property
     def is_succeeded(self):
         return self._status == RunnerStatus.SUCCEEDED
@@ -1,7 +1,83 @@
+import asyncio
+import json
+import os
+import sys
+import tempfile
+
+import yaml
+
+from . import RunnerStatus
 from .base import RunnerBase
+from runci.dal.yaml import load_compose_files
+from runci.engine.buildcontext import FINGERPRINT_LABEL, compute_fingerprint
+from runci.entities import event
 from runci.entities.context import Context
 
 
+def _get_build_definitions(files: list, service_list: str) -> tuple:
+    "Return the resolved build definition of the services built by docker-compose, by service name"
+    compose = load_compose_files(files)
+    project_directory = os.path.dirname(os.path.abspath(files[0]))
+    services = compose['services']
+    names = service_list.split(' ') if service_list is not None else services.keys()
+
+    definitions = []
+    for name in sorted(set(names)):
+        spec = services.get(name, None)
+        build = spec.get('build', None) if isinstance(spec, dict) else None
+        if build is None:
+            if service_list is not None:
+                # Keep services listed by the step apart, even when there is nothing to resolve.
+                definitions.append((name, None, None))
+            continue
+        elif isinstance(build, str):
+            build = {'context': build}
+
+        build = dict(build, context=os.path.normpath(os.path.join(project_directory, build.get('context', '.'))))
+        definitions.append((name, spec.get('image', None), json.dumps(build, sort_keys=True, default=str)))
+    return tuple(definitions)
+
+
+def get_build_key(files: list, project_name: str, service_list: str):
+    """Identify the images built by docker-compose, for the build memo of the run.
+
+    Images are identified by the resolved build definitions of the services, so
+    that steps listing different compose files share their builds. project_name
+    is the one set by the step, if any, as it names the images of the services
+    without an explicit image.
+    """
+    try:
+        builds = _get_build_definitions(files, service_list)
+    except (OSError, yaml.YAMLError):
+        services = tuple(sorted(service_list.split(' '))) if service_list is not None else None
+        builds = tuple([os.path.abspath(file) for file in files]), services
+    return project_name, builds
+
+
+async def run_memoized_build(runner: RunnerBase, context: Context, files: list, project_name: str, service_list: str,
+                             builder) -> bool:
+    """Build compose services with builder, unless they have already been built during this run.
+
+    builder is a coroutine function returning whether the build succeeded.
+    """
+    key = get_build_key(files, project_name, service_list)
+    if context.builds.is_done(get_build_key(files, project_name, None)) or context.builds.is_done(key):
+        runner._log_runner_message(sys.stdout, "Services have already been built during this run. Skipping build.")
+        runner._log_event(event.JobStepCachedEvent(runner._target, runner._step))
+        return True
+    elif context.builds.is_running(key):
+        runner._log_runner_message(sys.stdout, "Waiting for the build of the same services started by another job")
+
+    return await context.builds.run(key, builder)
+
+
+async def wait_for_teardown(runner: RunnerBase, context: Context, project_name: str):
+    "Wait until a project being torn down in the background is gone, before using its name again"
+    if project_name is not None and context.cleanup is not None and context.cleanup.is_pending(project_name):
+        runner._log_runner_message(sys.stdout, "Waiting for the teardown of project %s" % project_name)
+        await context.cleanup.wait(project_name)
+
+
 class ComposeBuildRunner(RunnerBase):
     _selector = 'compose-build'
 
@@ -9,11 +85,33 @@ class ComposeBuildRunner(RunnerBase):
         files = self._step.spec.get('file', context.parameters.dataconnection).split(' ')
         service_list = self._step.spec.get('services', None)
         project_name = self._step.spec.get('projectName', None)
+        await wait_for_teardown(self, context, project_name)
+
+        if context.builds is None:
+            await self._build(context, files, project_name, service_list)
+        elif not await run_memoized_build(self, context, files, project_name, service_list,
+                                          lambda: self._build(context, files, project_name, service_list)):
+            self._status = RunnerStatus.FAILED
+
+    async def _build(self, context: Context, files: list, project_name: str, service_list: str) -> bool:
+        override_file = None
 
         args = ['docker-compose']
         for file in files:
             args.extend(['-f', file])
 
+        if self._step.spec.get('fingerprint', False):
+            compose = load_compose_files(files)
+            fingerprints = await self._get_stale_fingerprints(context, files, compose, project_name, service_list)
+            if len(fingerprints) == 0:
+                self._log_runner_message(sys.stdout, "Images are up to date. Skipping build.")
+                self._log_event(event.JobStepCachedEvent(self._target, self._step))
+                return True
+
+            override_file = self._write_override_file(compose, fingerprints)
+            args.extend(['-f', override_file])
+            service_list = str.join(' ', fingerprints.keys())
+
         if project_name is not None:
             args.extend(['-p', project_name])
 
@@ -22,4 +120,60 @@ class ComposeBuildRunner(RunnerBase):
         if service_list is not None:
             args.extend(service_list.split(' '))
 
-        await self._run_process(args)
+        try:
+            await self._run_process(args)
+            return self._status != RunnerStatus.FAILED
+        finally:
+            if override_file is not None:
+                os.remove(override_file)
+
+    async def _get_stale_fingerprints(self, context, files, compose, project_name, service_list):
+        "Fingerprint the services built by this step and return those without a matching local image"
+        project_directory = os.path.dirname(os.path.abspath(files[0]))
+        services = compose['services']
+        if service_list is not None:
+            services = dict([(name, services.get(name, dict())) for name in service_list.split(' ')])
+
+        builds = dict()
+        for name, spec in services.items():
+            build = spec.get('build', None)
+            if build is None:
+                continue
+            elif isinstance(build, str):
+                build = {'context': build}
+
+            build_context = os.path.join(project_directory, build.get('context', '.'))
+            dockerfile = build.get('dockerfile', None)
+            if dockerfile is not None:
+                dockerfile = os.path.join(build_context, dockerfile)
+
+            builds[name] = compute_fingerprint(build_context, dockerfile, [project_name, name, spec], context.hashindex)
+
+        fingerprints = dict(zip(builds.keys(), await asyncio.gather(*builds.values())))
+        cached = await asyncio.gather(*[self._has_image(fingerprint) for fingerprint in fingerprints.values()])
+        return dict([(name, fingerprint)
+                     for (name, fingerprint), is_cached in zip(fingerprints.items(), cached)
+                     if not is_cached])
+
+    async def _has_image(self, fingerprint):
+        args = ['docker', 'images', '-q', '--filter', 'label=%s=%s' % (FINGERPRINT_LABEL, fingerprint)]
+        try:
+            return_code, output = await self._get_process_output(args)
+        except OSError:
+            return False
+
+        return return_code == 0 and output.strip() != b''
+
+    @staticmethod
+    def _write_override_file(compose, fingerprints):
+        "Write a compose override file labelling each built image with its fingerprint"
+        override = dict()
+        if compose['version'] is not None:
+            override['version'] = compose['version']
+        override['services'] = dict([(name, {'build': {'labels': {FINGERPRINT_LABEL: fingerprint}}})
+                                     for name, fingerprint in fingerprints.items()])
+
+        with tempfile.NamedTemporaryFile('w', prefix='runci-', suffix='.yml', delete=False) as datastream:
+            yaml.safe_dump(override, datastream)
+
+        return datastream.name
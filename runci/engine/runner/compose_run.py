@@ -2,7 +2,10 @@ import random
 import string
 import sys
 
+from . import RunnerStatus
 from .base import RunnerBase
+from .compose_build import run_memoized_build, wait_for_teardown
+from runci.engine.composepool import get_pool_key
 from runci.entities.context import Context
 
 
@@ -15,15 +18,18 @@ class ComposeRunRunner(RunnerBase):
         project_name = self._step.spec.get('projectName', None)
         build = self._step.spec.get('build', True)
 
+        pool_key = None
+        if project_name is None and self._step.spec.get('pool', False) and context.composepool is not None:
+            pool_key = get_pool_key(files)
+            project_name = await self._acquire_pooled_project(context, pool_key, files)
+
         if (project_name is None):
             # Generate a random string
             project_name = ''.join(random.choice(string.ascii_lowercase) for i in range(8))
+        elif pool_key is None:
+            await wait_for_teardown(self, context, project_name)
 
-        dc_args = ['docker-compose']
-        for file in files:
-            dc_args.extend(['-f', file])
-
-        dc_args.extend(['-p', project_name])
+        dc_args = self._get_compose_args(files, project_name)
 
         if build:
             self._log_runner_message(sys.stdout, "Ensuring images are built")
@@ -31,7 +37,12 @@ class ComposeRunRunner(RunnerBase):
             build_args = list(dc_args)
             build_args.extend(['build', '-q'])
 
-            await self._run_process(build_args)
+            if context.builds is None:
+                await self._run_process(build_args)
+            # Generated project names don't change what is built: the memo only knows the one set by the step.
+            elif not await run_memoized_build(self, context, files, self._step.spec.get('projectName', None), None,
+                                              lambda: self._build(build_args)):
+                self._status = RunnerStatus.FAILED
 
         run_args = list(dc_args)
         run_args.extend(['run', '--rm'])
@@ -39,9 +50,64 @@ class ComposeRunRunner(RunnerBase):
         if service_list is not None:
             run_args.extend(service_list.split(' '))
 
-        await self._run_process(run_args)
-
         down_args = list(dc_args)
         down_args.extend(['down'])
 
-        await self._run_process(down_args)
+        try:
+            await self._run_process(run_args)
+        finally:
+            if pool_key is not None:
+                # Services are kept running for the next step using the same files.
+                context.composepool.release(pool_key, project_name, down_args)
+            else:
+                await self._tear_down(context, project_name, down_args)
+
+    async def _build(self, build_args: list) -> bool:
+        await self._run_process(build_args)
+        return self._status != RunnerStatus.FAILED
+
+    @staticmethod
+    def _get_compose_args(files, project_name):
+        dc_args = ['docker-compose']
+        for file in files:
+            dc_args.extend(['-f', file])
+
+        dc_args.extend(['-p', project_name])
+        return dc_args
+
+    async def _acquire_pooled_project(self, context: Context, pool_key: str, files: list):
+        "Return a warm project whose services have been reset, or None when there is none"
+        project_name = context.composepool.acquire(pool_key)
+        while project_name is not None:
+            if await self._reset(self._get_compose_args(files, project_name)):
+                self._log_runner_message(sys.stdout, "Reusing warm project %s" % project_name)
+                return project_name
+
+            self._log_runner_message(sys.stderr, "Reset of project %s failed, evicting it" % project_name)
+            down_args = context.composepool.evict(project_name)
+            if down_args is not None:
+                await self._tear_down(context, project_name, down_args)
+            project_name = context.composepool.acquire(pool_key)
+
+        return None
+
+    async def _reset(self, dc_args: list) -> bool:
+        "Run the reset hook of the step on each of its services"
+        for service, command in self._step.spec.get('reset', dict()).items():
+            self._log_runner_message(sys.stdout, "Resetting %s: %s" % (service, command))
+            try:
+                return_code, _ = await self._get_process_output(dc_args + ['exec', '-T', service, 'sh', '-c', command])
+            except OSError:
+                return False
+            if return_code != 0:
+                return False
+
+        return True
+
+    async def _tear_down(self, context: Context, project_name: str, down_args: list):
+        if context.cleanup is None:
+            await self._run_process(down_args)
+        else:
+            # Teardown is left to the engine, off the critical path of the pipeline.
+            self._log_runner_message(sys.stdout, "Project %s queued for teardown" % project_name)
+            context.cleanup.enqueue(project_name, down_args)
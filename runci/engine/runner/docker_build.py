@@ -1,4 +1,10 @@
+import os
+import sys
+
 from .base import RunnerBase
+from runci.engine.buildcontext import FINGERPRINT_LABEL, compute_fingerprint, \
+    get_archived_dockerfile, stream_context_archive
+from runci.entities import event
 from runci.entities.context import Context
 
 
@@ -7,8 +13,20 @@ class DockerBuildRunner(RunnerBase):
 
     async def run_internal(self, context: Context):
         dockerfile = self._step.spec.get('dockerfile', None)
-        context = self._step.spec.get('context', '.')
+        build_context = self._step.spec.get('context', '.')
         tags = self._step.spec.get('tags', None)
+        fingerprint = None
+
+        if self._step.spec.get('fingerprint', True) and os.path.isdir(build_context):
+            fingerprint = await compute_fingerprint(build_context, dockerfile, self._step.spec, context.hashindex)
+            if await self._is_cached(context, fingerprint, tags):
+                self._log_runner_message(sys.stdout, "Image is up to date (fingerprint %s). Skipping build." % fingerprint)
+                self._log_event(event.JobStepCachedEvent(self._target, self._step))
+                return
+
+        if context.docker is not None:
+            await self._build_with_api(context.docker, build_context, dockerfile, tags, fingerprint)
+            return
 
         args = ['docker', 'build']
         if dockerfile is not None:
@@ -18,6 +36,60 @@ class DockerBuildRunner(RunnerBase):
             for tag in tags.split(' '):
                 args.extend(['-t', tag])
 
-        args.append(context)
+        if fingerprint is not None:
+            args.extend(['--label', '%s=%s' % (FINGERPRINT_LABEL, fingerprint)])
+
+        args.append(build_context)
 
         await self._run_process(args)
+
+    async def _build_with_api(self, client, build_context, dockerfile, tags, fingerprint):
+        tags = tags.split(' ') if tags is not None else []
+        labels = {FINGERPRINT_LABEL: fingerprint} if fingerprint is not None else None
+        self._log_runner_message(sys.stdout, "Building %s through the docker API" % build_context)
+
+        archive = stream_context_archive(build_context, dockerfile)
+        try:
+            messages = client.build_image(archive, tags, get_archived_dockerfile(build_context, dockerfile), labels)
+            await self._log_api_messages(messages)
+        finally:
+            await archive.aclose()
+
+    async def _is_cached(self, context, fingerprint, tags):
+        "Tell whether the local images already carry this fingerprint"
+        if context.docker is not None:
+            return await self._is_cached_with_api(context.docker, fingerprint, tags)
+
+        if tags is None:
+            args = ['docker', 'images', '-q', '--filter', 'label=%s=%s' % (FINGERPRINT_LABEL, fingerprint)]
+        else:
+            args = ['docker', 'image', 'inspect', '-f', '{{ index .Config.Labels "%s" }}' % FINGERPRINT_LABEL]
+            args.extend(tags.split(' '))
+
+        try:
+            return_code, output = await self._get_process_output(args)
+        except OSError:
+            return False
+
+        lines = [line.strip() for line in output.decode('utf-8', 'replace').splitlines()]
+        if return_code != 0:
+            return False
+        elif tags is None:
+            return any(lines)
+
+        return len(lines) == len(tags.split(' ')) \
+            and all([line == fingerprint for line in lines])
+
+    @staticmethod
+    async def _is_cached_with_api(client, fingerprint, tags):
+        if tags is None:
+            images = await client.list_images({'label': ['%s=%s' % (FINGERPRINT_LABEL, fingerprint)]})
+            return any(images)
+
+        for tag in tags.split(' '):
+            image = await client.inspect_image(tag)
+            labels = ((image or dict()).get('Config', None) or dict()).get('Labels', None) or dict()
+            if labels.get(FINGERPRINT_LABEL, None) != fingerprint:
+                return False
+
+        return True
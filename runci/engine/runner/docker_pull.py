@@ -1,6 +1,10 @@
 import asyncio
+import sys
 
+from . import RunnerStatus
 from .base import RunnerBase
+from runci.engine.dockerapi import DockerAPIException
+from runci.entities import event
 from runci.entities.context import Context
 
 
@@ -14,12 +18,93 @@ class DockerPullRunner(RunnerBase):
         if images is None:
             raise Exception("Image name should be specified for docker-pull step")
 
-        base_args = ['docker', 'pull']
+        tasks = [asyncio.create_task(self._pull(context, image)) for image in images.split(' ')]
 
-        tasks = []
-        for image in images.split(' '):
-            args = list(base_args)
-            args.append(image)
-            tasks.append(asyncio.create_task(self._run_process(args)))
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+        for image, result in zip(images.split(' '), results):
+            if isinstance(result, Exception):
+                self._log_runner_message(sys.stderr, "Pull of %s failed: %s" % (image, result))
+                self._status = RunnerStatus.FAILED
 
-        await asyncio.wait(tasks)
+    async def _pull(self, context: Context, image: str):
+        if context.images is not None and await self._is_cached(context, image):
+            return
+
+        if context.pulls is None:
+            succeeded = await self._pull_image(context, image)
+        else:
+            if context.pulls.is_pulled(image):
+                self._log_runner_message(sys.stdout, "Image %s has already been pulled during this run" % image)
+            elif context.pulls.is_pulling(image):
+                self._log_runner_message(sys.stdout, "Waiting for the pull of %s started by another job" % image)
+            succeeded = await context.pulls.pull(image, lambda image: self._pull_image(context, image))
+
+        if not succeeded:
+            self._log_runner_message(sys.stderr, "Pull of %s failed" % image)
+            self._status = RunnerStatus.FAILED
+
+    async def _pull_image(self, context: Context, image: str) -> bool:
+        if context.docker is not None:
+            self._log_runner_message(sys.stdout, "Pulling %s through the docker API" % image)
+            try:
+                succeeded = await self._log_api_messages(context.docker.pull_image(image))
+            except DockerAPIException as e:
+                self._log_runner_message(sys.stderr, str(e))
+                succeeded = False
+        else:
+            succeeded = await self._run_process(['docker', 'pull', image]) == 0
+
+        if succeeded:
+            await self._record_image_id(context, image)
+        return succeeded
+
+    async def _revalidate_image(self, context: Context, image: str) -> bool:
+        "Pull an image quietly, refreshing its cached Id"
+        if context.docker is not None:
+            succeeded = True
+            async for message in context.docker.pull_image(image):
+                succeeded = succeeded and 'error' not in message
+        else:
+            return_code, _ = await self._get_process_output(['docker', 'pull', image])
+            succeeded = return_code == 0
+
+        if succeeded:
+            await self._record_image_id(context, image)
+        return succeeded
+
+    async def _get_image_id(self, context: Context, image: str):
+        "Return the identifier of the local image, or None when it is not available"
+        if context.docker is not None:
+            details = await context.docker.inspect_image(image)
+            return details.get('Id', None) if details is not None else None
+
+        try:
+            return_code, output = await self._get_process_output(['docker', 'image', 'inspect', '-f', '{{.Id}}', image])
+        except OSError:
+            return None
+        if return_code != 0:
+            return None
+        return output.decode('utf-8', 'replace').strip() or None
+
+    async def _record_image_id(self, context: Context, image: str):
+        if context.images is not None:
+            image_id = await self._get_image_id(context, image)
+            if image_id is not None:
+                context.images.set(image, image_id)
+
+    async def _is_cached(self, context: Context, image: str) -> bool:
+        "Tell whether the image has been pulled within the TTL and is still available locally"
+        cached = context.images.get(image)
+        if cached is None:
+            return False
+
+        image_id, age = cached
+        if await self._get_image_id(context, image) != image_id:
+            return False
+
+        self._log_runner_message(sys.stdout, "Image %s has been pulled %d seconds ago (%s). Skipping pull."
+                                 % (image, age, image_id))
+        self._log_event(event.JobImageCachedEvent(self._target, self._step, image, image_id))
+        if self._step.spec.get('revalidate', False) and context.pulls is not None:
+            context.pulls.pull_in_background(image, lambda image: self._revalidate_image(context, image))
+        return True
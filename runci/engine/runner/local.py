@@ -0,0 +1,80 @@
+import asyncio
+import os
+import shlex
+import sys
+
+from .base import RunnerBase
+from . import RunnerStatus
+from runci.entities.context import Context
+
+
+class ExecRunner(RunnerBase):
+    """Run commands directly on the agent, without any container.
+
+    The spec gives a command, or a list of commands, along with optional env
+    variables and working directory. Several commands run concurrently unless
+    parallel is false, in which case they stop at the first failure.
+    """
+    _selector = 'exec'
+
+    def _get_args(self, command) -> list:
+        if isinstance(command, list):
+            return [str(arg) for arg in command]
+        return shlex.split(str(command), posix=sys.platform != "win32")
+
+    def _get_commands(self) -> list:
+        "Each command is a command line, or a list of arguments"
+        if 'commands' in self._step.spec:
+            commands = self._step.spec['commands']
+            return commands if isinstance(commands, list) else [commands]
+
+        command = self._step.spec.get('command', self._step.spec.get('_', None))
+        if command is None:
+            raise Exception("Command should be specified for %s step" % self._selector)
+        return [command]
+
+    def _get_env(self):
+        env = self._step.spec.get('env', None)
+        if env is None:
+            return None
+        return dict(os.environ, **dict([(str(name), str(value)) for name, value in env.items()]))
+
+    async def run_internal(self, context: Context):
+        commands = [self._get_args(command) for command in self._get_commands()]
+        env = self._get_env()
+        cwd = self._step.spec.get('workdir', None)
+
+        if self._step.spec.get('parallel', True):
+            await self._run_concurrently([self._run_process(args, env, cwd) for args in commands])
+        else:
+            for args in commands:
+                await self._run_process(args, env, cwd)
+                if self._status == RunnerStatus.FAILED:
+                    break
+
+    @staticmethod
+    async def _run_concurrently(coroutines: list):
+        "Run coroutines concurrently, cancelling the others, and killing their process, as soon as one raises"
+        tasks = [asyncio.ensure_future(coroutine) for coroutine in coroutines]
+        try:
+            done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+        for task in tasks:
+            if task in done and not task.cancelled() and task.exception() is not None:
+                raise task.exception()
+
+
+class ShellRunner(ExecRunner):
+    "Run shell command lines directly on the agent, without any container"
+    _selector = 'shell'
+
+    def _get_args(self, command) -> list:
+        if isinstance(command, list):
+            command = " ".join([str(arg) for arg in command])
+        if sys.platform == "win32":
+            return ['cmd', '/c', str(command)]
+        return ['/bin/sh', '-c', str(command)]
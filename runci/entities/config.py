@@ -1,15 +1,45 @@
+import functools
 from collections import namedtuple
 
 
 class Project(namedtuple('config', 'services targets')):
-    """Represent the runci configuration entity."""
+    """Represent the runci configuration entity.
+
+    Targets are indexed by name the first time they are looked up. The index is
+    derived from the targets only, so copies and projects made by _replace()
+    build their own.
+    """
+
+    @functools.cached_property
+    def _indexed_targets(self) -> tuple:
+        index = dict()
+        duplicates = set()
+        for target in self.targets:
+            if target.name in index:
+                duplicates.add(target.name)
+            else:
+                index[target.name] = target
+        return index, duplicates
+
+    @property
+    def index(self) -> dict:
+        "Targets by name. The first of duplicated targets is indexed."
+        return self._indexed_targets[0]
+
+    @property
+    def duplicates(self) -> set:
+        "Names shared by several targets"
+        return self._indexed_targets[1]
+
+    def get_target(self, name: str):
+        return self.index.get(name, None)
 
 
 class Service(namedtuple('service', 'name spec')):
     """Represent the docker-compose service entity."""
 
 
-class Target(namedtuple('target', 'name dependencies steps')):
+class Target(namedtuple('target', 'name dependencies steps weight', defaults=[1])):
     """Represent the runci target entity."""
 
 
@@ -1,9 +1,14 @@
 from collections import namedtuple
 
 
-class Context(namedtuple('context', 'project parameters runners listeners processors jobs')):
+class Context(namedtuple('context', 'project parameters runners listeners processors jobs '
+                                    'hashindex bus docker pulls images cleanup composepool builds observers')):
     """Represent the runci context entity."""
 
-    def __new__(cls, project, parameters, runners, listeners, processors):
+    def __new__(cls, project, parameters, runners, listeners, processors, hashindex=None, bus=None, docker=None,
+                pulls=None, images=None, cleanup=None, composepool=None,
+                builds=None, observers=None):
         jobs = dict()
-        return super(Context, cls).__new__(cls, project, parameters, runners, listeners, processors, jobs)
+        return super(Context, cls).__new__(cls, project, parameters, runners, listeners, processors, jobs,
+                                           hashindex, bus, docker, pulls, images, cleanup, composepool, builds,
+                                           observers)
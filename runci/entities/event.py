@@ -1,36 +1,71 @@
 from abc import ABC
 from collections import namedtuple
-from datetime import datetime
+from datetime import datetime, timedelta
+import time
 
 from runci.entities.config import Target, Step
 
+# Wall-clock time of a monotonic instant, which event timestamps are relative to
+_anchor = (time.monotonic_ns(), datetime.now())
+
+
+def set_clock_anchor():
+    "Anchor the monotonic time of the events to the wall clock, once per run"
+    global _anchor
+    _anchor = (time.monotonic_ns(), datetime.now())
+
+
+def to_datetime(time_ns: int) -> datetime:
+    return _anchor[1] + timedelta(microseconds=(time_ns - _anchor[0]) // 1000)
+
+
+def to_time_ns(timestamp: datetime) -> int:
+    return _anchor[0] + (timestamp - _anchor[1]) // timedelta(microseconds=1) * 1000
+
 
 class JobEvent(ABC):
-    _timestamp: datetime
+    """Base class of the job events.
+
+    Events are created for every chunk of output, so they have no instance
+    dictionary and only read the monotonic clock. Their wall-clock timestamp
+    is computed on access.
+    """
+    __slots__ = ('_target', '_time_ns')
     _target: Target
+    _time_ns: int
 
-    def __init__(self, target: Target):
-        self._timestamp = datetime.now()
+    def __init__(self, target: Target, timestamp: datetime = None, time_ns: int = None):
+        if time_ns is None:
+            time_ns = time.monotonic_ns() if timestamp is None else to_time_ns(timestamp)
+        self._time_ns = time_ns
         self._target = target
 
     @property
-    def timestamp(self):
-        return self._timestamp
+    def time_ns(self) -> int:
+        "Monotonic time of the event, in nanoseconds"
+        return self._time_ns
+
+    @property
+    def timestamp(self) -> datetime:
+        return to_datetime(self._time_ns)
 
     @property
     def target(self):
         return self._target
 
-    pass
-
 
 class JobStepEvent(JobEvent):
+    __slots__ = ('_step',)
     _step: Step
 
     def __init__(self, target: Target, step: Step):
         self._step = step
         super().__init__(target)
 
+    @property
+    def step(self):
+        return self._step
+
 
 class JobMessage(namedtuple("JobMessage", "stream message")):
     """Represent a RunCI runner output line to stdout or stderr"""
@@ -40,68 +75,123 @@ class JobMessage(namedtuple("JobMessage", "stream message")):
 
 class JobMessageEvent(JobEvent):
     """Represent a RunCI runner output line to stdout or stderr event"""
-    _message: JobMessage
+    __slots__ = ('_stream', '_data')
 
-    def __init__(self, target: Target, stream, message):
-        self._message = JobMessage(stream, message)
-        super().__init__(target)
+    def __init__(self, target: Target, stream, message, timestamp: datetime = None, time_ns: int = None):
+        self._stream = stream
+        self._data = message
+        super().__init__(target, timestamp, time_ns)
+
+    @property
+    def stream(self):
+        return self._stream
+
+    @property
+    def data(self):
+        "Payload of the message, as bytes or text"
+        return self._data
 
     @property
     def message(self):
-        return self._message
+        return JobMessage(self._stream, self._data)
+
+
+class JobReadyEvent(JobEvent):
+    """Represent a job whose dependencies have completed, waiting for job slots"""
+    __slots__ = ()
 
 
 class JobStartEvent(JobEvent):
-    pass
+    __slots__ = ()
 
 
 class JobStepStartEvent(JobStepEvent):
-    pass
+    __slots__ = ()
 
 
 class JobStepPauseEvent(JobStepEvent):
-    pass
+    __slots__ = ()
 
 
 class JobStepResumeEvent(JobStepEvent):
-    pass
+    __slots__ = ()
 
 
 class JobStepEndEvent(JobStepEvent):
-    pass
+    __slots__ = ()
 
 
 class JobStepSuccessEvent(JobStepEndEvent):
-    pass
+    __slots__ = ()
 
 
 class JobStepFailureEvent(JobStepEndEvent):
-    pass
+    __slots__ = ()
 
 
 class JobStepUnknownTypeEvent(JobStepFailureEvent):
-    pass
+    __slots__ = ()
+
+
+class JobStepCachedEvent(JobStepEvent):
+    """Represent a step whose outcome is already available and has been skipped"""
+    __slots__ = ()
+
+
+class JobImageCachedEvent(JobStepEvent):
+    """Represent an image pull skipped because the image has been pulled recently"""
+    __slots__ = ('_image', '_image_id')
+    _image: str
+    _image_id: str
+
+    def __init__(self, target: Target, step: Step, image: str, image_id: str):
+        self._image = image
+        self._image_id = image_id
+        super().__init__(target, step)
+
+    @property
+    def image(self):
+        return self._image
+
+    @property
+    def image_id(self):
+        "Id of the local image, which is not the registry digest of the image"
+        return self._image_id
+
+
+class JobProcessStartEvent(JobStepEvent):
+    """Represent a process spawned by a step, with the seconds it took to spawn it"""
+    __slots__ = ('_latency',)
+    _latency: float
+
+    def __init__(self, target: Target, step: Step, latency: float):
+        self._latency = latency
+        super().__init__(target, step)
+
+    @property
+    def latency(self):
+        return self._latency
 
 
 class JobPauseEvent(JobEvent):
-    pass
+    __slots__ = ()
 
 
 class JobResumeEvent(JobEvent):
-    pass
+    __slots__ = ()
 
 
 class JobEndEvent(JobEvent):
-    pass
+    __slots__ = ()
 
 
 class JobSuccessEvent(JobEndEvent):
-    pass
+    __slots__ = ()
 
 
 class JobFailureEvent(JobEndEvent):
-    pass
+    __slots__ = ()
 
 
 class JobCanceledEvent(JobFailureEvent):
-    pass
+    __slots__ = ()
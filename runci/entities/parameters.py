@@ -1,5 +1,8 @@
 from collections import namedtuple
 
 
-class Parameters(namedtuple("parameters", "dataconnection targets verbosity")):
+class Parameters(namedtuple("parameters",
+                            "dataconnection targets verbosity jobs statedir buffersize overflow backend pulls pullttl "
+                            "metrics compact",
+                            defaults=[None, None, None, 'pause', 'cli', None, None, None, False])):
     """runci invocation parameters"""
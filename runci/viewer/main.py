@@ -0,0 +1,51 @@
+import click
+import os
+import sys
+
+from runci.cli.main import DEFAULT_CONFIG_FILE, STATE_DIRECTORY
+from runci.dal.logstore import LogReader
+
+
+def write_lines(lines, numbered):
+    output = click.get_binary_stream('stdout')
+    for number, line in lines:
+        if numbered:
+            output.write(b"%d: " % (number + 1))
+        output.write(line)
+        if not line.endswith(b'\n'):
+            output.write(b'\n')
+
+
+@click.command()
+@click.option('-f', '--file', 'file', type=click.Path(dir_okay=False), default=DEFAULT_CONFIG_FILE,
+              help="Configuration file of the project whose logs are read.")
+@click.option('-l', '--line', 'line', type=click.IntRange(min=1), default=None,
+              help="Show the log from this line on.")
+@click.option('-c', '--count', 'count', type=click.IntRange(min=1), default=None,
+              help="Maximum number of lines to show.")
+@click.option('-t', '--tail', 'tail', type=click.IntRange(min=1), default=None,
+              help="Show the last lines of the log.")
+@click.option('-g', '--grep', 'pattern', default=None,
+              help="Show the lines matching this regular expression.")
+@click.option('-n', '--line-numbers', 'numbered', is_flag=True,
+              help="Prefix each line with its number.")
+@click.argument('target')
+def main(target, file, line, count, tail, pattern, numbered):
+    statedir = os.path.join(os.path.dirname(os.path.abspath(file)), STATE_DIRECTORY)
+
+    try:
+        reader = LogReader(statedir, target)
+    except FileNotFoundError:
+        print("No log found for target %s" % target, file=sys.stderr)
+        sys.exit(1)
+
+    with reader:
+        if pattern is not None:
+            lines = reader.grep(pattern.encode('utf-8'))
+        elif tail is not None:
+            lines = reader.tail(tail)
+        else:
+            start = line - 1 if line is not None else 0
+            lines = reader.get_lines(start, start + count if count is not None else None)
+
+        write_lines(lines, numbered)
@@ -17,6 +17,7 @@ setup(
         'pyyaml'
     ],
     entry_points={
-        'console_scripts': ['runci=runci.cli.main:main'],
+        'console_scripts': ['runci=runci.cli.main:main',
+                            'runci-viewer=runci.viewer.main:main'],
     },
 )
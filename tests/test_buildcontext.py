@@ -0,0 +1,109 @@
+import asyncio
+import io
+import os
+import tarfile
+import tempfile
+import unittest
+
+from runci.engine.buildcontext import DockerIgnore, walk_context, get_fingerprint, stream_context_archive
+from runci.engine.dockerapi import FileSegment
+
+
+class test_dockerignore(unittest.TestCase):
+    def test_patterns(self):
+        dockerignore = DockerIgnore(["# comment", "", "*.log", "build", "docs/**/*.md", "!docs/README.md", "/tmp?"])
+
+        self.assertTrue(dockerignore.is_excluded("output.log"))
+        self.assertFalse(dockerignore.is_excluded("logs/output.log"))
+        self.assertTrue(dockerignore.is_excluded("build"))
+        self.assertTrue(dockerignore.is_excluded("build/lib/module.py"))
+        self.assertTrue(dockerignore.is_excluded("docs/api/index.md"))
+        self.assertTrue(dockerignore.is_excluded("docs/index.md"))
+        self.assertFalse(dockerignore.is_excluded("docs/README.md"))
+        self.assertTrue(dockerignore.is_excluded("tmp1"))
+        self.assertFalse(dockerignore.is_excluded("tmp12"))
+        self.assertFalse(dockerignore.is_excluded("src/main.py"))
+
+
+class test_build_context(unittest.TestCase):
+    def setUp(self):
+        self._directory = tempfile.TemporaryDirectory()
+        self.path = self._directory.name
+        self.write("Dockerfile", "FROM scratch\n")
+        self.write(".dockerignore", "*.log\nbuild\n")
+        self.write("src/main.py", "print('hello')\n")
+        self.write("build/output.bin", "binary")
+        self.write("debug.log", "log")
+
+    def tearDown(self):
+        self._directory.cleanup()
+
+    def write(self, path, content):
+        path = os.path.join(self.path, path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            f.write(content)
+
+    def test_walk_context(self):
+        self.assertListEqual(list(walk_context(self.path)), [".dockerignore", "Dockerfile", "src/main.py"])
+
+    def test_fingerprint(self):
+        fingerprint = get_fingerprint(self.path, None, {})
+        self.assertEqual(get_fingerprint(self.path, None, {}), fingerprint)
+        self.assertNotEqual(get_fingerprint(self.path, None, {"tags": "image"}), fingerprint)
+
+        self.write("debug.log", "more log")
+        self.assertEqual(get_fingerprint(self.path, None, {}), fingerprint)
+
+        self.write("src/main.py", "print('world')\n")
+        self.assertNotEqual(get_fingerprint(self.path, None, {}), fingerprint)
+
+    def read_archive(self, dockerfile=None, **kwargs):
+        async def read():
+            data = bytearray()
+            async for chunk in stream_context_archive(self.path, dockerfile, **kwargs):
+                if isinstance(chunk, FileSegment):
+                    with open(chunk.path, 'rb') as f:
+                        f.seek(chunk.offset)
+                        chunk = f.read(chunk.count)
+                data.extend(chunk)
+            return bytes(data)
+
+        return tarfile.open(fileobj=io.BytesIO(asyncio.run(read())))
+
+    def test_walk_context_directories(self):
+        self.assertListEqual(list(walk_context(self.path, directories=True)),
+                             [".dockerignore", "Dockerfile", "src", "src/main.py"])
+
+    def test_stream_context_archive(self):
+        self.write("src/large.bin", "x" * 5000)
+        for kwargs in [dict(), dict(chunk_size=512, buffer_size=1024, sendfile_threshold=1024)]:
+            with self.read_archive(**kwargs) as archive:
+                self.assertListEqual(archive.getnames(), list(walk_context(self.path, directories=True)))
+                self.assertTrue(archive.getmember("src").isdir())
+                self.assertEqual(archive.extractfile("src/main.py").read(), b"print('hello')\n")
+                self.assertEqual(archive.extractfile("src/large.bin").read(), b"x" * 5000)
+
+    def test_stream_external_dockerfile(self):
+        with tempfile.TemporaryDirectory() as directory:
+            dockerfile = os.path.join(directory, "Dockerfile.build")
+            with open(dockerfile, 'w') as f:
+                f.write("FROM busybox\n")
+
+            with self.read_archive(dockerfile) as archive:
+                self.assertEqual(archive.extractfile(".dockerfile.runci").read(), b"FROM busybox\n")
+
+    def test_stream_closed_early(self):
+        self.write("src/large.bin", "x" * 5000)
+
+        async def read_first_chunk():
+            archive = stream_context_archive(self.path, chunk_size=512, buffer_size=512)
+            chunk = await archive.__anext__()
+            await archive.aclose()
+            return chunk
+
+        self.assertEqual(len(asyncio.run(asyncio.wait_for(read_first_chunk(), 5))), 512)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+import asyncio
+import sys
+import unittest
+
+from runci.engine import core
+from runci.engine.bus import EventBus
+from runci.engine.runner.base import RunnerBase
+from runci.entities import event
+from runci.entities.config import Project, Target, Step
+from runci.entities.context import Context
+from runci.entities.parameters import Parameters
+
+
+class test_event_bus(unittest.TestCase):
+    def test_interleaved_output(self):
+        messages = []
+
+        class TestRunner(RunnerBase):
+            async def run_internal(self, context: Context):
+                for index in range(3):
+                    self._log_message(sys.stdout, "%s-%d" % (self._target.name, index))
+                    await asyncio.sleep(0.01)
+
+        project = Project([], [Target("job1", [], [Step("test", "mock", {})]),
+                               Target("job2", [], [Step("test", "mock", {})])])
+        context = core.create_context(project, Parameters("runci.yml", ["job1", "job2"], 0), modules=[])
+        context.runners["mock"] = TestRunner
+        context.processors[event.JobMessageEvent] = [lambda e: messages.append(e.message.message)]
+
+        async def run():
+            tree = core.DependencyTree(context)
+            task = tree.start()
+            await context.bus.run(task)
+            return task.result()
+
+        asyncio.run(run())
+        output = [message for message in messages if message.startswith("job")]
+        self.assertListEqual(output, ["job1-0", "job2-0", "job1-1", "job2-1", "job1-2", "job2-2"])
+        self.assertFalse(any([job.has_new_events() for job in core.get_jobs(context)]))
+
+    def test_task_done_after_bus(self):
+        errors = []
+
+        async def run():
+            asyncio.get_running_loop().set_exception_handler(lambda loop, context: errors.append(context))
+            bus = EventBus()
+            task = asyncio.get_running_loop().create_future()
+            runner = asyncio.ensure_future(bus.run(task))
+            await asyncio.sleep(0)
+            runner.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await runner
+
+            task.set_result(None)
+            await asyncio.sleep(0)
+
+        asyncio.run(run())
+        self.assertListEqual(errors, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+import asyncio
+import sys
+import unittest
+from unittest.mock import patch
+
+from runci.engine.cleanup import CleanupQueue
+
+
+class test_cleanup_queue(unittest.TestCase):
+    def test_max_teardowns(self):
+        running = []
+        peak = []
+        torn_down = []
+
+        async def teardown(name, args):
+            running.append(name)
+            peak.append(len(running))
+            await asyncio.sleep(0.01)
+            running.remove(name)
+            torn_down.append(name)
+
+        async def run():
+            queue = CleanupQueue(2)
+            for i in range(5):
+                queue.enqueue("project%d" % i, [])
+            await queue.close()
+
+        with patch.object(CleanupQueue, '_teardown', side_effect=teardown):
+            asyncio.run(run())
+
+        self.assertEqual(max(peak), 2)
+        self.assertListEqual(sorted(torn_down), ["project%d" % i for i in range(5)])
+
+    def test_failures(self):
+        async def run():
+            queue = CleanupQueue()
+            queue.enqueue("succeeded", [sys.executable, "-c", "pass"])
+            queue.enqueue("failed", [sys.executable, "-c", "raise SystemExit(1)"])
+            queue.enqueue("missing", ["/non/existent/command"])
+            await queue.close()
+            return queue.failures
+
+        failures = dict(asyncio.run(run()))
+        self.assertListEqual(sorted(failures.keys()), ["failed", "missing"])
+        self.assertIn("/non/existent/command", failures["missing"])
+
+    def test_wait(self):
+        torn_down = []
+
+        async def teardown(name, args):
+            await asyncio.sleep(0.01)
+            torn_down.append(name)
+
+        async def run():
+            queue = CleanupQueue()
+            queue.enqueue("test", [])
+            queue.enqueue("other", [])
+            self.assertTrue(queue.is_pending("test"))
+            await queue.wait("test")
+            self.assertIn("test", torn_down)
+            self.assertFalse(queue.is_pending("test"))
+            await queue.wait("unknown")
+            await queue.close()
+
+        with patch.object(CleanupQueue, '_teardown', side_effect=teardown):
+            asyncio.run(run())
+
+
+if __name__ == '__main__':
+    unittest.main()
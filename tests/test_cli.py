@@ -77,6 +77,16 @@ class test_cli(unittest.TestCase):
 
             self.assertEqual(result.exit_code, 1)
 
+    def test_invalid_configuration(self):
+        runner = CliRunner()
+        with runner.isolated_filesystem():
+            with open("runci.yml", 'w') as f:
+                f.write(test_project_yaml + "    cyclic:\n        dependencies: cyclic\n")
+
+            result = runner.invoke(main, ['build_succeed'])
+
+            self.assertEqual(result.exit_code, 1)
+
 
 if __name__ == '__main__':
     unittest.main()
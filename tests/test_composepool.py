@@ -0,0 +1,46 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import MagicMock
+
+from runci.engine.composepool import ComposePool, get_pool_key
+
+
+class test_compose_pool(unittest.TestCase):
+    def test_pool_key(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "docker-compose.yml")
+            with open(path, 'w') as f:
+                f.write("services:\n  db:\n    image: postgres\n")
+            key = get_pool_key([path])
+            self.assertEqual(get_pool_key([path]), key)
+
+            with open(path, 'w') as f:
+                f.write("services:\n  db:\n    image: postgres:15\n")
+            self.assertNotEqual(get_pool_key([path]), key)
+
+    def test_acquire_release(self):
+        pool = ComposePool()
+        self.assertIsNone(pool.acquire("key"))
+        pool.release("key", "project", ["down"])
+        self.assertIsNone(pool.acquire("other"))
+        self.assertEqual(pool.acquire("key"), "project")
+        self.assertIsNone(pool.acquire("key"))
+        self.assertEqual(pool.evict("project"), ["down"])
+        self.assertEqual(len(pool), 0)
+
+    def test_close(self):
+        pool = ComposePool()
+        pool.release("key", "project1", ["down1"])
+        pool.release("key", "project2", ["down2"])
+        cleanup = MagicMock()
+        pool.close(cleanup)
+
+        cleanup.enqueue.assert_any_call("project1", ["down1"])
+        cleanup.enqueue.assert_any_call("project2", ["down2"])
+        self.assertEqual(len(pool), 0)
+        self.assertIsNone(pool.acquire("key"))
+
+
+if __name__ == '__main__':
+    unittest.main()
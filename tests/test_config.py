@@ -1,7 +1,14 @@
+import copy
 import unittest
 import os
+import pickle
+import shutil
+import tempfile
+from unittest.mock import Mock, patch
 
 from runci.dal.yaml import load_project
+from runci.entities.config import Project, Target
+from runci.entities.parameters import Parameters
 
 
 script_path = os.path.dirname(__file__)
@@ -21,6 +28,13 @@ class test_config(unittest.TestCase):
         self.assertListEqual(dependencies_list, ['build', 'utests', 'itests', 'etests', 'stests'])
         self.assertListEqual(dependencies_string, ['utest-a', 'utest-b'])
 
+    def test_weight(self):
+        config = load_project(sample_config_path)
+        weights = dict([(t.name, t.weight) for t in config.targets])
+
+        self.assertEqual(weights['build'], 2)
+        self.assertEqual(weights['utests'], 1)
+
     def test_steps(self):
         config = load_project(sample_config_path)
         steps = [t.steps for t in config.targets if t.name == 'utest-a'][0]
@@ -37,6 +51,96 @@ class test_config(unittest.TestCase):
 
         self.assertNotIn(None, steps_spec)
 
+    def test_index(self):
+        config = load_project(sample_config_path)
+        self.assertIs(config.get_target('build'), config.targets[1])
+        self.assertIsNone(config.get_target('unknown'))
+        self.assertEqual(len(config.duplicates), 0)
+
+    def test_duplicated_targets(self):
+        first, second = Target("build", [], []), Target("build", ["test"], [])
+        project = Project([], [first, Target("test", [], []), second])
+
+        self.assertIs(project.index["build"], first)
+        self.assertSetEqual(project.duplicates, {"build"})
+        self.assertEqual(project, Project([], list(project.targets)))
+
+    def test_copied_project(self):
+        project = load_project(sample_config_path)
+        self.assertIsNotNone(project.get_target('build'))
+
+        for copied in [pickle.loads(pickle.dumps(project)), copy.deepcopy(project), copy.copy(project)]:
+            self.assertEqual(copied, project)
+            self.assertEqual(copied.get_target('build'), project.get_target('build'))
+            self.assertIs(copied.get_target('build'), copied.targets[1])
+
+    def test_replaced_targets(self):
+        project = Project([], [Target("build", [], [])])
+        self.assertSetEqual(project.duplicates, set())
+
+        replaced = project._replace(targets=[Target("test", [], []), Target("test", [], [])])
+        self.assertIsNone(replaced.get_target("build"))
+        self.assertIsNotNone(replaced.get_target("test"))
+        self.assertSetEqual(replaced.duplicates, {"test"})
+
+
+class test_project_cache(unittest.TestCase):
+    def setUp(self):
+        self._directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self._directory.name, "runci.yml")
+        shutil.copyfile(sample_config_path, self.path)
+        self.parameters = Parameters(self.path, [], 0, statedir=os.path.join(self._directory.name, ".runci"))
+
+    def tearDown(self):
+        self._directory.cleanup()
+
+    def test_cached_project(self):
+        project = load_project(self.parameters)
+        with patch('runci.dal.yaml._parse_project') as mock:
+            self.assertEqual(load_project(self.parameters), project)
+            mock.assert_not_called()
+        self.assertEqual(project, load_project(sample_config_path))
+
+    def test_validated_project(self):
+        validate = Mock()
+        project = load_project(self.parameters, validate=validate)
+        validate.assert_called_once_with(project)
+
+        validate.reset_mock()
+        self.assertEqual(load_project(self.parameters, validate=validate), project)
+        validate.assert_not_called()
+
+    def test_invalid_project(self):
+        validate = Mock(side_effect=ValueError("invalid"))
+        with self.assertRaises(ValueError):
+            load_project(self.parameters, validate=validate)
+        self.assertFalse(os.path.exists(os.path.join(self.parameters.statedir, "project.cache")))
+
+        with self.assertRaises(ValueError):
+            load_project(self.parameters, validate=validate)
+        self.assertEqual(validate.call_count, 2)
+
+    def test_changed_config(self):
+        load_project(self.parameters)
+        with open(self.path, 'a') as f:
+            f.write("\n  added:\n    dependencies: build\n")
+
+        self.assertIn("added", [t.name for t in load_project(self.parameters).targets])
+
+    def test_corrupted_cache(self):
+        project = load_project(self.parameters)
+        with open(os.path.join(self.parameters.statedir, "project.cache"), 'wb') as f:
+            f.write(b"corrupted")
+
+        self.assertEqual(load_project(self.parameters), project)
+
+    def test_uncachable_spec(self):
+        with open(self.path, 'w') as f:
+            f.write("targets:\n  release:\n    steps:\n      - docker-pull:\n          date: 2020-01-01\n")
+
+        self.assertEqual(len(load_project(self.parameters).targets), 1)
+        self.assertFalse(os.path.exists(os.path.join(self.parameters.statedir, "project.cache")))
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -1,10 +1,15 @@
 from parameterized import parameterized
+import asyncio
+import os
+import tempfile
 import unittest
 from unittest.mock import patch, call
 
+from runci.dal import history
 from runci.entities.config import Project, Target, Step
+from runci.entities.context import Context
 from runci.entities.parameters import Parameters
-from runci.engine.core import UnknownTargetException
+from runci.engine.core import UnknownTargetException, AmbiguousTargetException, CircularDependencyException
 from runci.engine import core, job, runner
 
 param_inexistent_target = [
@@ -73,10 +78,46 @@ param_parallel_dependent_targets_single_step = [
      call("docker-compose -f runci.yml build s3".split(" ")),
      call("docker-compose -f runci.yml build s1".split(" "))]]
 
+param_diamond_dependent_targets_single_step = [
+    Project(services=[],
+            targets=[Target(name="target1",
+                            dependencies=["target2", "target3"],
+                            steps=[Step("test", "compose-build", {"services": "s1"})]),
+                     Target(name="target2",
+                            dependencies=["target4"],
+                            steps=[Step("test", "compose-build", {"services": "s2"})]),
+                     Target(name="target3",
+                            dependencies=["target4"],
+                            steps=[Step("test", "compose-build", {"services": "s3"})]),
+                     Target(name="target4",
+                            dependencies=[],
+                            steps=[Step("test", "compose-build", {"services": "s4"})])]),
+    Parameters(dataconnection="runci.yml",
+               targets=["target1", "target3"],
+               verbosity=0),
+    [call("docker-compose -f runci.yml build s4".split(" ")),
+     call("docker-compose -f runci.yml build s2".split(" ")),
+     call("docker-compose -f runci.yml build s3".split(" ")),
+     call("docker-compose -f runci.yml build s1".split(" "))]]
+
+param_circular_dependency = [
+    Project(services=[],
+            targets=[Target(name="target1",
+                            dependencies=["target2"],
+                            steps=[]),
+                     Target(name="target2",
+                            dependencies=["target1"],
+                            steps=[])]),
+    Parameters(dataconnection="runci.yml",
+               targets=["target1"],
+               verbosity=0)
+    ]
+
 allparams = [param_simple_target_single_step,
              param_dependent_targets_single_step,
              param_parallel_targets_single_step,
-             param_parallel_dependent_targets_single_step]
+             param_parallel_dependent_targets_single_step,
+             param_diamond_dependent_targets_single_step]
 
 allparams_paralellization = ([param + [True] for param in allparams] +
                              [param + [False] for param in allparams])
@@ -89,6 +130,45 @@ class test_target(unittest.TestCase):
             context = core.create_context(project, parameters)
             core.DependencyTree(context).run()
 
+    @parameterized.expand([param_circular_dependency])
+    def test_circular_dependency(self, project, parameters):
+        context = core.create_context(project, parameters)
+        with self.assertRaisesRegex(CircularDependencyException, "target1 -> target2 -> target1"):
+            core.DependencyTree(context)
+
+    def test_ambiguous(self):
+        project = Project([], [Target("target", [], []), Target("target", [], [])])
+        with self.assertRaises(AmbiguousTargetException):
+            core.get_target(Context(project, None, {}, {}, {}), "target")
+
+    @parameterized.expand([
+        ([Target("a", [], []), Target("a", [], [])], AmbiguousTargetException, "Ambiguous targets: a"),
+        ([Target("a", ["b"], [])], UnknownTargetException, "Target a refers to unknown target\\(s\\): b"),
+        ([Target("a", [], [Step("run", "target-run", {"_": "b c"})]), Target("b", [], [])],
+         UnknownTargetException, "Target a refers to unknown target\\(s\\): c"),
+        ([Target("a", ["b"], []), Target("b", ["c"], []), Target("c", ["d", "b"], []), Target("d", [], [])],
+         CircularDependencyException, "Circular dependency: b -> c -> b$"),
+        ([Target("a", ["a"], [])], CircularDependencyException, "Circular dependency: a -> a$"),
+    ])
+    def test_invalid_project(self, targets, exception, message):
+        with self.assertRaisesRegex(exception, message):
+            core.validate_project(Project([], targets))
+
+    def test_valid_project(self):
+        targets = [Target("a", ["b", "c"], []), Target("b", ["d"], []), Target("c", ["d"], []), Target("d", [], [])]
+        core.validate_project(Project([], targets))
+
+
+class test_dependency_tree(unittest.TestCase):
+    @parameterized.expand([param_diamond_dependent_targets_single_step])
+    def test_shared_dependency_node(self, project, parameters, calls):
+        context = core.create_context(project, parameters)
+        tree = core.DependencyTree(context)
+        nodes = tree.get_nodes()
+        self.assertListEqual([node.job.target.name for node in nodes],
+                             ["target4", "target2", "target3", "target1", "root"])
+        self.assertEqual(len(nodes[0].dependents), 2)
+
 
 @patch("runci.engine.runner.base.RunnerBase.run")
 class test_run(unittest.TestCase):
@@ -106,6 +186,7 @@ class test_run_process(unittest.TestCase):
         context = core.create_context(project, parameters)
         core.DependencyTree(context).run(noparallel)
         mock.assert_has_calls(calls)
+        self.assertEqual(mock.call_count, len(calls))
 
 
 @patch("runci.engine.runner.base.RunnerBase.run", autospec=True)
@@ -133,5 +214,125 @@ class test_build_result(unittest.TestCase):
         self.assertEqual(tree.status, job.JobStatus.FAILED)
 
 
+@patch("runci.engine.runner.base.RunnerBase.run", autospec=True)
+class test_job_exception(unittest.TestCase):
+    def test_siblings_canceled(self, mock):
+        project = Project([], [Target("raising", [], [Step("test", "compose-build", {})]),
+                               Target("sleeping", [], [Step("test", "compose-build", {})])])
+        canceled = []
+
+        async def side_effect(self, context):
+            if self._target.name == "raising":
+                await asyncio.sleep(0.01)
+                raise RuntimeError("runner error")
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                canceled.append(self._target.name)
+                raise
+        mock.side_effect = side_effect
+
+        async def run():
+            with self.assertRaises(RuntimeError):
+                await core.DependencyTree(context).start()
+            return [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+
+        context = core.create_context(project, Parameters("runci.yml", ["raising", "sleeping"], 0))
+        self.assertListEqual(asyncio.run(run()), [])
+        self.assertListEqual(canceled, ["sleeping"])
+        self.assertEqual(context.jobs["sleeping"].status, job.JobStatus.CANCELED)
+
+
+@patch("runci.engine.runner.base.RunnerBase.run", autospec=True)
+class test_job_slots(unittest.TestCase):
+    project = Project(services=[],
+                      targets=[Target("light1", [], [Step("test", "compose-build", {})]),
+                               Target("light2", [], [Step("test", "compose-build", {})]),
+                               Target("light3", [], [Step("test", "compose-build", {})]),
+                               Target("heavy", [], [Step("test", "compose-build", {})], 3)])
+
+    def run_tree(self, mock, jobs):
+        running = []
+        peaks = []
+
+        async def side_effect(self, context):
+            running.append(self._target.weight)
+            peaks.append(sum(running))
+            await asyncio.sleep(0.01)
+            running.remove(self._target.weight)
+            self._status = runner.RunnerStatus.SUCCEEDED
+        mock.side_effect = side_effect
+
+        parameters = Parameters("runci.yml", ["light1", "heavy", "light2", "light3"], 0, jobs)
+        context = core.create_context(self.project, parameters)
+        tree = core.DependencyTree(context)
+        tree.run()
+        self.assertEqual(tree.status, job.JobStatus.SUCCEEDED)
+        return max(peaks)
+
+    def test_unbounded(self, mock):
+        self.assertEqual(self.run_tree(mock, None), 6)
+
+    def test_bounded(self, mock):
+        self.assertEqual(self.run_tree(mock, 3), 3)
+
+    def test_heavier_than_budget(self, mock):
+        # The heavy job is run alone
+        self.assertEqual(self.run_tree(mock, 2), 3)
+
+
+@patch("runci.engine.runner.base.RunnerBase.run", autospec=True)
+class test_critical_path(unittest.TestCase):
+    project = Project(services=[],
+                      targets=[Target("short", [], [Step("test", "compose-build", {"services": "short"})]),
+                               Target("long", ["long-dependency"], [Step("test", "compose-build", {"services": "long"})]),
+                               Target("long-dependency", [], [Step("test", "compose-build", {"services": "dep"})])])
+
+    def run_tree(self, mock, statedir):
+        started = []
+
+        async def side_effect(self, context):
+            started.append(self._target.name)
+            self._status = runner.RunnerStatus.SUCCEEDED
+        mock.side_effect = side_effect
+
+        parameters = Parameters("runci.yml", ["short", "long"], 0, 1, statedir)
+        context = core.create_context(self.project, parameters)
+        core.DependencyTree(context).run()
+        return started
+
+    def test_declaration_order_without_history(self, mock):
+        with tempfile.TemporaryDirectory() as statedir:
+            self.assertListEqual(self.run_tree(mock, statedir), ["short", "long-dependency", "long"])
+
+    def test_longest_path_first(self, mock):
+        with tempfile.TemporaryDirectory() as statedir:
+            targets = dict([(t.name, t) for t in self.project.targets])
+            history.save_history(statedir, {
+                core.get_step_key(targets["short"], targets["short"].steps[0]): 10,
+                core.get_step_key(targets["long"], targets["long"].steps[0]): 8,
+                core.get_step_key(targets["long-dependency"], targets["long-dependency"].steps[0]): 8,
+            })
+            self.assertListEqual(self.run_tree(mock, statedir), ["long-dependency", "short", "long"])
+
+    def test_durations_are_recorded(self, mock):
+        with tempfile.TemporaryDirectory() as statedir:
+            self.run_tree(mock, statedir)
+            target = self.project.targets[0]
+            self.assertIn(core.get_step_key(target, target.steps[0]), history.load_history(statedir))
+            self.assertFalse([name for name in os.listdir(statedir) if name.endswith(".tmp")])
+
+    def test_invalid_durations_ignored(self, mock):
+        with tempfile.TemporaryDirectory() as statedir:
+            targets = dict([(t.name, t) for t in self.project.targets])
+            history.save_history(statedir, {
+                core.get_step_key(targets["short"], targets["short"].steps[0]): "10",
+                core.get_step_key(targets["long"], targets["long"].steps[0]): None,
+                core.get_step_key(targets["long-dependency"], targets["long-dependency"].steps[0]): 8.5,
+            })
+            self.assertEqual(len(history.load_history(statedir)), 1)
+            self.assertListEqual(self.run_tree(mock, statedir), ["long-dependency", "short", "long"])
+
+
 if __name__ == '__main__':
     unittest.main()
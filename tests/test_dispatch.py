@@ -0,0 +1,70 @@
+import asyncio
+import unittest
+
+from runci.engine import core
+from runci.engine.dispatch import DispatchTable, merge_tables
+from runci.entities import event
+from runci.entities.config import Project, Target
+from runci.entities.parameters import Parameters
+
+
+def a(job_event):
+    pass
+
+
+def b(job_event):
+    pass
+
+
+class test_dispatch_table(unittest.TestCase):
+    def test_hierarchy(self):
+        table = DispatchTable({event.JobEndEvent: [a], event.JobFailureEvent: [b]})
+        self.assertTupleEqual(table.get_handlers(event.JobSuccessEvent), (a,))
+        self.assertTupleEqual(table.get_handlers(event.JobCanceledEvent), (a, b))
+        self.assertTupleEqual(table.get_handlers(event.JobStartEvent), ())
+
+    def test_handler_called_once(self):
+        table = DispatchTable({event.JobFailureEvent: [a], event.JobCanceledEvent: [a, b]})
+        self.assertTupleEqual(table.get_handlers(event.JobCanceledEvent), (a, b))
+
+    def test_freeze(self):
+        table = DispatchTable({event.JobStepEndEvent: [a]})
+        table.freeze()
+        self.assertIn(event.JobStepUnknownTypeEvent, table._resolved)
+        self.assertIs(table.get_handlers(event.JobStepSuccessEvent), table.get_handlers(event.JobStepSuccessEvent))
+
+    def test_register_after_freeze(self):
+        table = DispatchTable({event.JobEndEvent: [a]})
+        table.freeze()
+        table[event.JobSuccessEvent] = table.get(event.JobSuccessEvent, []) + [b]
+        self.assertTupleEqual(table.get_handlers(event.JobSuccessEvent), (a, b))
+
+    def test_merge(self):
+        table = DispatchTable({event.JobEndEvent: [a]})
+        self.assertIs(merge_tables(table, dict()), table)
+
+        merged = merge_tables(table, {event.JobSuccessEvent: [b]})
+        self.assertTupleEqual(merged.get_handlers(event.JobSuccessEvent), (a, b))
+        self.assertTupleEqual(table.get_handlers(event.JobSuccessEvent), (a,))
+        self.assertTupleEqual(merge_tables(None, dict()).get_handlers(event.JobSuccessEvent), ())
+
+    def test_base_class_listener(self):
+        project = Project([], [Target("test", [], [])])
+        context = core.create_context(project, Parameters("runci.yml", ["test"], 0), modules=[])
+        ended = []
+        context.listeners[event.JobEndEvent] = [ended.append]
+        processed = []
+        context.processors[event.JobEvent] = [processed.append]
+
+        async def run():
+            task = core.DependencyTree(context).start()
+            await context.bus.run(task)
+
+        asyncio.run(run())
+        self.assertListEqual([type(e) for e in ended], [event.JobSuccessEvent])
+        self.assertIn(event.JobStartEvent, [type(e) for e in processed])
+        self.assertIn(event.JobSuccessEvent, [type(e) for e in processed])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,225 @@
+import asyncio
+import io
+import json
+import os
+import sys
+import tarfile
+import tempfile
+import unittest
+from unittest.mock import patch
+from urllib.parse import urlparse, parse_qs
+
+from runci.engine.buildcontext import stream_context_archive
+from runci.engine.core import create_context
+from runci.engine.dockerapi import DockerClient, DockerAPIException, split_image_reference
+from runci.engine.runner.docker_build import DockerBuildRunner
+from runci.engine.runner.docker_pull import DockerPullRunner
+from runci.entities.config import Project, Target, Step
+from runci.entities.parameters import Parameters
+
+
+class MockDockerDaemon(object):
+    "Minimal stand-in for the docker daemon HTTP API"
+
+    def __init__(self, path):
+        self.path = path
+        self.connections = 0
+        self.requests = []
+        self.images = {"busybox:latest": {"Id": "sha256:1", "Config": {"Labels": {}}}}
+
+    async def start(self):
+        self._server = await asyncio.start_unix_server(self._handle, self.path)
+
+    async def stop(self):
+        self._server.close()
+        await self._server.wait_closed()
+
+    async def _read_body(self, reader, headers):
+        if headers.get('transfer-encoding') == 'chunked':
+            body = b''
+            size = int(await reader.readline(), 16)
+            while size > 0:
+                body += await reader.readexactly(size)
+                await reader.readexactly(2)
+                size = int(await reader.readline(), 16)
+            await reader.readline()
+            return body
+        return await reader.readexactly(int(headers.get('content-length', 0)))
+
+    async def _handle(self, reader, writer):
+        self.connections += 1
+        request_line = await reader.readline()
+        while request_line != b'':
+            method, target, _ = request_line.decode().split(' ')
+            headers = dict()
+            line = await reader.readline()
+            while line != b'\r\n':
+                name, _, value = line.decode().partition(':')
+                headers[name.strip().lower()] = value.strip()
+                line = await reader.readline()
+
+            body = await self._read_body(reader, headers)
+            url = urlparse(target)
+            self.requests.append((method, url.path, parse_qs(url.query), body))
+            status, messages = self.route(method, url.path, parse_qs(url.query), body)
+            await self._respond(writer, status, messages)
+            request_line = await reader.readline()
+        writer.close()
+
+    async def _respond(self, writer, status, messages):
+        if isinstance(messages, list):
+            writer.write(b"HTTP/1.1 %d OK\r\nContent-Type: application/json\r\nTransfer-Encoding: chunked\r\n\r\n" % status)
+            for message in messages:
+                data = json.dumps(message).encode() + b"\r\n"
+                writer.write(b"%x\r\n%s\r\n" % (len(data), data))
+                await writer.drain()
+            writer.write(b"0\r\n\r\n")
+        else:
+            data = messages if isinstance(messages, bytes) else json.dumps(messages).encode()
+            writer.write(b"HTTP/1.1 %d OK\r\nContent-Length: %d\r\n\r\n%s" % (status, len(data), data))
+        await writer.drain()
+
+    def route(self, method, path, query, body):
+        if path == '/_ping':
+            return 200, b'OK'
+        elif path.startswith('/images/') and path.endswith('/json'):
+            image = self.images.get(path[len('/images/'):-len('/json')], None)
+            return (200, image) if image is not None else (404, {"message": "No such image"})
+        elif path == '/images/create':
+            if query['fromImage'][0] == 'unknown':
+                return 200, [{"status": "Pulling"}, {"error": "pull access denied"}]
+            return 200, [{"status": "Pulling from library/busybox", "id": "latest"},
+                         {"status": "Downloading", "progress": "[==>   ]", "id": "abc"},
+                         {"status": "Status: Downloaded newer image"}]
+        elif path == '/build':
+            self.archive = tarfile.open(fileobj=io.BytesIO(body))
+            names = self.archive.getnames()
+            return 200, [{"stream": "Step 1/1 : FROM scratch\n"}, {"stream": "context: %s\n" % " ".join(sorted(names))}]
+        return 404, {"message": "page not found"}
+
+
+@unittest.skipIf(sys.platform == "win32", "The docker API backend requires unix sockets")
+class test_docker_api(unittest.TestCase):
+    def setUp(self):
+        self._directory = tempfile.TemporaryDirectory()
+        self.daemon = MockDockerDaemon(os.path.join(self._directory.name, "docker.sock"))
+
+    def tearDown(self):
+        self._directory.cleanup()
+
+    def run_with_daemon(self, coroutine_function):
+        async def run():
+            await self.daemon.start()
+            client = DockerClient("unix://" + self.daemon.path, max_connections=2)
+            try:
+                return await coroutine_function(client)
+            finally:
+                await client.close()
+                await self.daemon.stop()
+
+        return asyncio.run(run())
+
+    def test_split_image_reference(self):
+        self.assertEqual(split_image_reference("busybox"), ("busybox", "latest"))
+        self.assertEqual(split_image_reference("localhost:5000/app:1.0"), ("localhost:5000/app", "1.0"))
+        self.assertEqual(split_image_reference("localhost:5000/app"), ("localhost:5000/app", "latest"))
+        self.assertEqual(split_image_reference("app@sha256:abc"), ("app", None))
+
+    def test_connection_reuse(self):
+        async def run(client):
+            return [await client.ping() for _ in range(5)]
+
+        self.assertListEqual(self.run_with_daemon(run), [True] * 5)
+        self.assertEqual(self.daemon.connections, 1)
+
+    def test_connection_limit(self):
+        async def run(client):
+            return await asyncio.gather(*[client.inspect_image("busybox:latest") for _ in range(10)])
+
+        self.assertEqual(len(self.run_with_daemon(run)), 10)
+        self.assertEqual(self.daemon.connections, 2)
+
+    def test_inspect_image(self):
+        async def run(client):
+            return await client.inspect_image("busybox:latest"), await client.inspect_image("missing:latest")
+
+        self.assertEqual(self.run_with_daemon(run), ({"Id": "sha256:1", "Config": {"Labels": {}}}, None))
+
+    def test_error(self):
+        async def run(client):
+            with self.assertRaises(DockerAPIException):
+                await client.list_images()
+            return await client.ping()
+
+        self.assertTrue(self.run_with_daemon(run))
+
+    def test_pull_runner(self):
+        events = []
+
+        async def run(client):
+            step = Step("test", "docker-pull", {"image": "busybox"})
+            runner = DockerPullRunner(None, step, events.append)
+            context = create_context(Project([], []), Parameters("runci.yml", [], 0))._replace(docker=client)
+            await runner.run(context)
+            return runner
+
+        runner = self.run_with_daemon(run)
+        self.assertTrue(runner.is_succeeded)
+        self.assertEqual(self.daemon.requests[0][2], {"fromImage": ["busybox"], "tag": ["latest"]})
+        messages = [e.message.message for e in events]
+        self.assertIn("latest: Pulling from library/busybox" + os.linesep, messages)
+        self.assertFalse(any(["Downloading" in message for message in messages]))
+
+    def test_failed_pull_runner(self):
+        async def run(client):
+            step = Step("test", "docker-pull", {"image": "unknown"})
+            runner = DockerPullRunner(None, step, lambda e: None)
+            context = create_context(Project([], []), Parameters("runci.yml", [], 0))._replace(docker=client)
+            await runner.run(context)
+            return runner
+
+        self.assertFalse(self.run_with_daemon(run).is_succeeded)
+
+    def test_build_runner(self):
+        events = []
+        build_context = os.path.join(self._directory.name, "context")
+        os.makedirs(build_context)
+        for name in ["Dockerfile", "app.py"]:
+            with open(os.path.join(build_context, name), 'w') as f:
+                f.write(name)
+
+        async def run(client):
+            step = Step("test", "docker-build", {"context": build_context, "tags": "app:1 app:2"})
+            runner = DockerBuildRunner(Target("test", [], [step]), step, events.append)
+            context = create_context(Project([], []), Parameters("runci.yml", [], 0))._replace(docker=client)
+            await runner.run(context)
+            return runner
+
+        with patch('runci.engine.runner.docker_build.compute_fingerprint', return_value="abc"):
+            runner = self.run_with_daemon(run)
+
+        self.assertTrue(runner.is_succeeded)
+        method, path, query, body = self.daemon.requests[-1]
+        self.assertEqual(path, "/build")
+        self.assertEqual(query["t"], ["app:1", "app:2"])
+        self.assertEqual(json.loads(query["labels"][0]), {"runci.fingerprint": "abc"})
+        self.assertIn("context: Dockerfile app.py\n", [e.message.message for e in events])
+
+    def test_build_file_segments(self):
+        build_context = os.path.join(self._directory.name, "context")
+        os.makedirs(build_context)
+        content = os.urandom(100000)
+        with open(os.path.join(build_context, "data.bin"), 'wb') as f:
+            f.write(content)
+
+        async def run(client):
+            archive = stream_context_archive(build_context, chunk_size=4096, sendfile_threshold=8192)
+            return [message async for message in client.build_image(archive, ["app"])]
+
+        messages = self.run_with_daemon(run)
+        self.assertEqual(messages[-1], {"stream": "context: data.bin\n"})
+        self.assertEqual(self.daemon.archive.extractfile("data.bin").read(), content)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,46 @@
+import sys
+import unittest
+from datetime import datetime, timedelta
+
+from runci.entities import event
+from runci.entities.config import Target, Step
+
+
+class test_event(unittest.TestCase):
+    target = Target("test", [], [])
+
+    def test_slots(self):
+        events = [event.JobStartEvent(self.target),
+                  event.JobStepSuccessEvent(self.target, Step("test", "test", {})),
+                  event.JobMessageEvent(self.target, sys.stdout, b"output"),
+                  event.JobCanceledEvent(self.target)]
+        for job_event in events:
+            self.assertFalse(hasattr(job_event, '__dict__'), type(job_event).__name__)
+
+    def test_message(self):
+        job_event = event.JobMessageEvent(self.target, sys.stderr, b"output")
+        self.assertEqual(job_event.message, event.JobMessage(sys.stderr, b"output"))
+        self.assertIs(job_event.stream, sys.stderr)
+        self.assertEqual(job_event.data, b"output")
+        self.assertIs(job_event.target, self.target)
+
+    def test_timestamp(self):
+        event.set_clock_anchor()
+        before = datetime.now()
+        first = event.JobStartEvent(self.target)
+        second = event.JobEndEvent(self.target)
+        after = datetime.now()
+
+        self.assertLessEqual(first.time_ns, second.time_ns)
+        tolerance = timedelta(milliseconds=50)
+        self.assertTrue(before - tolerance <= first.timestamp <= after + tolerance)
+
+    def test_explicit_timestamp(self):
+        timestamp = datetime.now() + timedelta(seconds=10)
+        job_event = event.JobStartEvent(self.target, timestamp)
+        self.assertEqual(job_event.timestamp, timestamp)
+        self.assertEqual(event.JobStartEvent(self.target, time_ns=job_event.time_ns).timestamp, timestamp)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,125 @@
+import asyncio
+import sys
+import unittest
+
+from runci.engine import core
+from runci.engine.eventqueue import JobEventQueue, MessageColumns
+from runci.engine.runner.base import RunnerBase
+from runci.entities import event
+from runci.entities.config import Project, Target, Step
+from runci.entities.context import Context
+from runci.entities.parameters import Parameters
+
+
+class MockProducer(object):
+    def __init__(self):
+        self.paused = False
+
+    def pause_reading(self):
+        self.paused = True
+
+    def resume_reading(self):
+        self.paused = False
+
+
+class test_event_queue(unittest.TestCase):
+    target = Target("test", [], [])
+
+    def message(self, data):
+        return event.JobMessageEvent(self.target, sys.stdout, data)
+
+    def test_pause(self):
+        producer = MockProducer()
+        queue = JobEventQueue(100, 'pause')
+        queue.add_producer(producer)
+
+        for _ in range(10):
+            queue.put_nowait(self.message(b'x' * 20))
+        self.assertTrue(producer.paused)
+
+        while queue.size > 50:
+            queue.get_nowait()
+        self.assertFalse(producer.paused)
+        self.assertEqual(queue.qsize(), 2)
+
+    def test_spill(self):
+        queue = JobEventQueue(100, 'spill')
+        messages = [b'%03d' % index * 10 for index in range(50)] + ['text message']
+        for message in messages:
+            queue.put_nowait(self.message(message))
+            queue.put_nowait(event.JobStepStartEvent(self.target, None))
+            self.assertLessEqual(queue.size, 130)
+
+        output = []
+        while not queue.empty():
+            job_event = queue.get_nowait()
+            if isinstance(job_event, event.JobMessageEvent):
+                output.append(job_event.message.message)
+
+        self.assertListEqual(output, messages)
+        self.assertEqual(queue.size, 0)
+
+    def test_compact(self):
+        producer = MockProducer()
+        queue = JobEventQueue(100, 'pause', compact=True)
+        queue.add_producer(producer)
+        events = [self.message(b'x' * 20), self.message('text \u00e9'), event.JobStepStartEvent(self.target, None),
+                  self.message(b''), self.message(b'y' * 40), self.message(b'z' * 40)]
+        for job_event in events:
+            queue.put_nowait(job_event)
+
+        self.assertEqual(queue.qsize(), 6)
+        self.assertTrue(producer.paused)
+
+        output = []
+        while not queue.empty():
+            output.append(queue.get_nowait())
+
+        self.assertFalse(producer.paused)
+        self.assertEqual(queue.size, 0)
+        self.assertListEqual([type(e) for e in output], [type(e) for e in events])
+        self.assertListEqual([e.data for e in output if isinstance(e, event.JobMessageEvent)],
+                             [b'x' * 20, 'text \u00e9', b'', b'y' * 40, b'z' * 40])
+        self.assertListEqual([e.time_ns for e in output], [e.time_ns for e in events])
+        self.assertIs(output[0].target, self.target)
+        self.assertIs(output[0].stream, sys.stdout)
+
+    def test_message_columns_reclaim(self):
+        columns = MessageColumns()
+        count = MessageColumns.RECLAIM_THRESHOLD * 3
+        output = []
+        for index in range(count):
+            columns.append(self.message(b'%d' % index))
+            if index % 2 == 1:
+                output.append(columns.popleft().data)
+        while len(columns) > 0:
+            output.append(columns.popleft().data)
+
+        self.assertListEqual(output, [b'%d' % index for index in range(count)])
+
+    def test_paused_process_output(self):
+        size = 1 << 20
+        received = []
+
+        class TestRunner(RunnerBase):
+            async def run_internal(self, context: Context):
+                await self._run_process([sys.executable, "-c", "import sys; sys.stdout.write('x' * %d)" % size])
+
+        project = Project([], [Target("test", [], [Step("test", "mock", {})])])
+        parameters = Parameters("runci.yml", ["test"], 0, buffersize=4096, overflow='pause')
+        context = core.create_context(project, parameters, modules=[])
+        context.runners["mock"] = TestRunner
+        context.processors[event.JobMessageEvent] = [lambda e: received.append(e.message.message)]
+
+        async def run():
+            tree = core.DependencyTree(context)
+            task = tree.start()
+            await context.bus.run(task)
+            return tree.status
+
+        asyncio.run(run())
+        self.assertEqual(sum([len(message) for message in received if isinstance(message, bytes)]), size)
+
+
+if __name__ == '__main__':
+    unittest.main()
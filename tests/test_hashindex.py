@@ -0,0 +1,83 @@
+import os
+import tempfile
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+
+from runci.dal.hashindex import HashIndex, get_file_digest
+
+
+class test_hashindex(unittest.TestCase):
+    def setUp(self):
+        self._directory = tempfile.TemporaryDirectory()
+        self.statedir = os.path.join(self._directory.name, ".runci")
+        self.path = os.path.join(self._directory.name, "file.txt")
+        self.write("content")
+
+    def tearDown(self):
+        self._directory.cleanup()
+
+    def write(self, content):
+        with open(self.path, 'w') as f:
+            f.write(content)
+        # Files modified in the last seconds are never indexed
+        os.utime(self.path, (1000000000, 1000000000))
+
+    def test_digest(self):
+        index = HashIndex(self.statedir)
+        self.assertEqual(index.get_digest(self.path), get_file_digest(self.path))
+
+    def test_persisted_digest_is_reused(self):
+        index = HashIndex(self.statedir)
+        digest = index.get_digest(self.path)
+        index.save()
+
+        with patch('runci.dal.hashindex.get_file_digest') as mock:
+            self.assertEqual(HashIndex(self.statedir).get_digest(self.path), digest)
+            mock.assert_not_called()
+
+    def test_changed_file_is_hashed(self):
+        index = HashIndex(self.statedir)
+        digest = index.get_digest(self.path)
+        index.save()
+
+        self.write("new content")
+        new_digest = HashIndex(self.statedir).get_digest(self.path)
+        self.assertNotEqual(new_digest, digest)
+        self.assertEqual(new_digest, get_file_digest(self.path))
+
+    def test_recent_file_is_not_indexed(self):
+        with open(self.path, 'w') as f:
+            f.write("content")
+
+        index = HashIndex(self.statedir)
+        index.get_digest(self.path)
+        index.save()
+        self.assertFalse(os.path.exists(index.path))
+
+    def test_concurrent_saves(self):
+        paths = []
+        for i in range(20):
+            self.path = os.path.join(self._directory.name, "file%d.txt" % i)
+            self.write("content %d" % i)
+            paths.append(self.path)
+
+        index = HashIndex(self.statedir)
+
+        def index_file(path):
+            index.get_digest(path)
+            index.save()
+
+        with ThreadPoolExecutor(8) as executor:
+            list(executor.map(index_file, paths * 5))
+
+        self.assertListEqual(os.listdir(self.statedir), [os.path.basename(index.path)])
+        with patch('runci.dal.hashindex.get_file_digest') as mock:
+            reloaded = HashIndex(self.statedir)
+            for path in paths:
+                reloaded.get_digest(path)
+            mock.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+import os
+import tempfile
+import unittest
+
+from runci.dal.imagecache import ImageCache
+
+
+class test_imagecache(unittest.TestCase):
+    def setUp(self):
+        self._directory = tempfile.TemporaryDirectory()
+        self.statedir = os.path.join(self._directory.name, ".runci")
+
+    def tearDown(self):
+        self._directory.cleanup()
+
+    def test_ttl(self):
+        cache = ImageCache(self.statedir, 60)
+        cache.set("busybox", "sha256:1", now=1000)
+        self.assertEqual(cache.get("busybox", now=1030), ("sha256:1", 30))
+        self.assertIsNone(cache.get("busybox", now=1060))
+        self.assertIsNone(cache.get("busybox", now=999))
+        self.assertIsNone(cache.get("alpine", now=1030))
+
+    def test_persisted(self):
+        cache = ImageCache(self.statedir, 60)
+        cache.set("busybox", "sha256:1", now=1000)
+        self.assertFalse(os.path.exists(cache.path))
+
+        cache.save()
+        self.assertEqual(ImageCache(self.statedir, 60).get("busybox", now=1010), ("sha256:1", 10))
+        self.assertListEqual(os.listdir(self.statedir), ["images.json"])
+
+    def test_saved_once_per_change(self):
+        cache = ImageCache(self.statedir, 60)
+        cache.save()
+        self.assertFalse(os.path.exists(self.statedir))
+
+        cache.set("busybox", "sha256:1", now=1000)
+        cache.save()
+        os.remove(cache.path)
+        cache.save()
+        self.assertFalse(os.path.exists(cache.path))
+
+    def test_corrupted(self):
+        os.makedirs(self.statedir)
+        with open(os.path.join(self.statedir, "images.json"), 'w') as f:
+            f.write("{corrupted")
+        self.assertIsNone(ImageCache(self.statedir, 60).get("busybox"))
+
+    def test_memory_only(self):
+        cache = ImageCache(None, 60)
+        cache.set("busybox", "sha256:1")
+        cache.save()
+        self.assertEqual(cache.get("busybox")[0], "sha256:1")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+import asyncio
+import os
+import sys
+import tempfile
+import unittest
+
+from runci.cli.main import run_project
+from runci.engine import core
+from runci.engine.listener.metrics import Counter, Histogram, MetricsListener
+from runci.engine.runner.base import RunnerBase
+from runci.entities.config import Project, Target, Step
+from runci.entities.context import Context
+from runci.entities.parameters import Parameters
+
+
+class OutputRunner(RunnerBase):
+    async def run_internal(self, context: Context):
+        self._log_message(sys.stdout, b"0123456789")
+        if self._step.spec.get('command', None) is not None:
+            await self._run_process(self._step.spec['command'])
+
+
+class test_metrics(unittest.TestCase):
+    def test_counter(self):
+        counter = Counter("test_total", "Test counter.")
+        counter.inc((("name", 'a "b"'),))
+        counter.inc((("name", 'a "b"'),), 2)
+        self.assertListEqual(counter.format(), [
+            "# HELP test_total Test counter.",
+            "# TYPE test_total counter",
+            'test_total{name="a \\"b\\""} 3',
+        ])
+
+    def test_histogram(self):
+        histogram = Histogram("test_seconds", "Test histogram.", [1, 5])
+        for value in [0.5, 2, 10]:
+            histogram.observe(value)
+        self.assertListEqual(histogram.format(), [
+            "# HELP test_seconds Test histogram.",
+            "# TYPE test_seconds histogram",
+            'test_seconds_bucket{le="1.0"} 1',
+            'test_seconds_bucket{le="5.0"} 2',
+            'test_seconds_bucket{le="+Inf"} 3',
+            "test_seconds_sum 12.5",
+            "test_seconds_count 3",
+        ])
+
+
+class test_listener_metrics(unittest.TestCase):
+    def setUp(self):
+        self._directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self._directory.name, "textfile", "runci.prom")
+
+    def tearDown(self):
+        self._directory.cleanup()
+
+    def run_pipeline(self, project, targets):
+        parameters = Parameters("runci.yml", targets, 0, metrics=self.path)
+        context = core.create_context(project, parameters)
+        context.runners["output"] = OutputRunner
+        asyncio.run(run_project(context))
+        return [listener for listener in context.observers if isinstance(listener, MetricsListener)][0]
+
+    def test_run_metrics(self):
+        project = Project([], [
+            Target("a", [], [Step("a", "output", {"command": [sys.executable, "-c", "pass"]})]),
+            Target("b", [], [Step("b", "unknown", {})]),
+            Target("all", ["a", "b"], [Step("all", "output", {})]),
+        ])
+        listener = self.run_pipeline(project, ["all"])
+
+        self.assertEqual(listener.jobs.get((("outcome", "success"),)), 1)
+        self.assertEqual(listener.jobs.get((("outcome", "failure"),)), 2)
+        self.assertGreaterEqual(listener.output_bytes.get((("target", "a"),)), 10)
+        self.assertEqual(listener.step_duration.get_count((("runner", "output"),)), 1)
+        self.assertEqual(listener.spawn_latency.get_count((("runner", "output"),)), 1)
+        self.assertGreater(listener.queue_depth.get_count(), 0)
+
+        with open(self.path, 'r') as datastream:
+            content = datastream.read()
+        self.assertIn('runci_jobs_total{outcome="success"} 1\n', content)
+        self.assertIn('runci_step_duration_seconds_count{runner="output"} 1\n', content)
+        self.assertFalse(os.path.exists(self.path + ".tmp"))
+
+    def test_disabled(self):
+        project = Project([], [Target("test", [], [])])
+        listener = MetricsListener(core.create_context(project, Parameters("runci.yml", ["test"], 0)))
+
+        self.assertDictEqual(listener.event_processors, dict())
+        listener.close()
+        self.assertFalse(os.path.exists(self.path))
@@ -0,0 +1,58 @@
+import io
+import sys
+import unittest
+from unittest.mock import patch
+
+from runci.engine.listener.terminal import TerminalListener
+from runci.entities.config import Target
+from runci.entities.event import JobMessageEvent, JobSuccessEvent
+
+
+class test_terminal_listener(unittest.TestCase):
+    target = Target("test", [], [])
+    message = "Ünïcödé ✓\n".encode('utf-8')
+
+    def setUp(self):
+        self.listener = TerminalListener()
+
+    def log(self, messages):
+        for message in messages:
+            self.listener.message_event_logger(JobMessageEvent(self.target, sys.stdout, message))
+
+    def test_bytes_are_written_to_buffer(self):
+        stdout = io.TextIOWrapper(io.BytesIO(), encoding='utf-8')
+        with patch('sys.stdout', stdout):
+            self.log(["text\n", self.message[:2], self.message[2:], "more text\n"])
+            stdout.flush()
+
+        self.assertEqual(stdout.buffer.getvalue(), b"text\n" + self.message + b"more text\n")
+
+    def test_split_characters_without_buffer(self):
+        stdout = io.StringIO()
+        with patch('sys.stdout', stdout):
+            self.log([self.message[:2], self.message[2:14], self.message[14:]])
+
+        self.assertEqual(stdout.getvalue(), self.message.decode('utf-8'))
+
+    def test_truncated_character_flushed_at_job_end(self):
+        stdout = io.StringIO()
+        with patch('sys.stdout', stdout):
+            self.log([b"text", "\u00e9".encode('utf-8')[:1]])
+            self.assertEqual(stdout.getvalue(), "text")
+            self.listener.end_event_logger(JobSuccessEvent(self.target))
+
+        self.assertEqual(stdout.getvalue(), "text\ufffd")
+        self.assertDictEqual(self.listener._decoders, dict())
+
+    def test_order_with_other_prints(self):
+        output = io.BytesIO()
+        stdout = io.TextIOWrapper(io.BufferedWriter(output, 1 << 16), encoding='utf-8')
+        with patch('sys.stdout', stdout):
+            self.log([b"job 1\n"])
+            print("engine")
+            self.log([b"job 2\n"])
+            self.assertEqual(output.getvalue(), b"job 1\nengine\njob 2\n")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,137 @@
+import asyncio
+import io
+import json
+import os
+import sys
+import tempfile
+import unittest
+from datetime import datetime
+from unittest.mock import patch
+
+from runci.cli.main import run_project
+from runci.engine import core
+from runci.engine.job import JobStatus
+from runci.engine.listener.metrics import MetricsListener
+from runci.engine.listener.trace import TRACE_FILE, TraceListener
+from runci.engine.runner.base import RunnerBase
+from runci.entities import event
+from runci.entities.config import Project, Target, Step
+from runci.entities.context import Context
+from runci.entities.parameters import Parameters
+
+
+class SleepRunner(RunnerBase):
+    async def run_internal(self, context: Context):
+        await asyncio.sleep(self._step.spec.get('sleep', 0))
+        self._log_message(sys.stdout, b"done\n")
+
+
+class test_listener_trace(unittest.TestCase):
+    def setUp(self):
+        self._directory = tempfile.TemporaryDirectory()
+        self.statedir = self._directory.name
+
+    def tearDown(self):
+        self._directory.cleanup()
+
+    def run_pipeline(self, project, targets, jobs=None):
+        parameters = Parameters("runci.yml", targets, 0, jobs, statedir=self.statedir)
+        context = core.create_context(project, parameters)
+        context.runners["sleep"] = SleepRunner
+        asyncio.run(run_project(context))
+
+        with open(os.path.join(self.statedir, TRACE_FILE), 'r') as datastream:
+            return json.load(datastream)["traceEvents"]
+
+    @staticmethod
+    def get_spans(trace_events, category):
+        return dict([(e["name"], e) for e in trace_events if e["ph"] == "X" and e["cat"] == category])
+
+    def test_trace_file(self):
+        project = Project([], [
+            Target("slow", [], [Step("slow", "sleep", {"sleep": 0.05})]),
+            Target("fast", [], [Step("fast", "sleep", {})]),
+            Target("all", ["slow", "fast"], [Step("all", "sleep", {})]),
+        ])
+        trace_events = self.run_pipeline(project, ["all"])
+
+        jobs = self.get_spans(trace_events, "job")
+        steps = self.get_spans(trace_events, "step")
+        self.assertSetEqual(set(jobs.keys()), {"slow", "fast", "all"})
+        self.assertSetEqual(set(steps.keys()), {"slow", "fast", "all"})
+        self.assertEqual(jobs["all"]["args"]["status"], "success")
+        self.assertEqual(steps["slow"]["args"]["outcome"], "success")
+        self.assertGreaterEqual(jobs["all"]["ts"], jobs["slow"]["ts"] + jobs["slow"]["dur"])
+        self.assertEqual(steps["slow"]["tid"], jobs["slow"]["tid"])
+        self.assertNotEqual(jobs["slow"]["tid"], jobs["fast"]["tid"])
+
+        waits = [e for e in trace_events if e["ph"] == "X" and e["cat"] == "wait" and e["tid"] == jobs["all"]["tid"]]
+        self.assertIn("waiting for dependencies", [e["name"] for e in waits])
+
+        critical = [e["name"] for e in sorted(self.get_spans(trace_events, "critical").values(), key=lambda e: e["ts"])]
+        self.assertListEqual(critical, ["slow", "all"])
+
+        names = [e["args"]["name"] for e in trace_events if e["ph"] == "M"]
+        self.assertIn("critical path", names)
+        self.assertIn("slow", names)
+
+    def test_failed_job(self):
+        project = Project([], [Target("test", [], [Step("test", "unknown", {})])])
+        trace_events = self.run_pipeline(project, ["test"])
+
+        self.assertEqual(self.get_spans(trace_events, "job")["test"]["args"]["status"], "failure")
+        instants = [e for e in trace_events if e["ph"] == "i"]
+        self.assertListEqual([(e["name"], e["args"]["step"]) for e in instants], [("JobStepUnknownTypeEvent", "test")])
+        self.assertFalse([name for name in os.listdir(self.statedir) if name.endswith(".tmp")])
+
+    def test_teardown_track(self):
+        project = Project([], [Target("test", [], [])])
+        parameters = Parameters("runci.yml", ["test"], 0, statedir=self.statedir)
+        context = core.create_context(project, parameters)
+        listener = TraceListener(context)
+        started = listener._started
+        listener.record(event.JobStartEvent(project.targets[0], time_ns=started + 1000000))
+        listener.record(event.JobSuccessEvent(project.targets[0], time_ns=started + 2000000))
+        context.cleanup.spans.append(("project", started + 2000000, started + 5000000))
+
+        teardowns = self.get_spans(listener.get_trace_events(), "teardown")
+        self.assertEqual(teardowns["project"]["ts"], 2000)
+        self.assertEqual(teardowns["project"]["dur"], 3000)
+
+    def test_failing_listener(self):
+        project = Project([], [Target("test", [], [Step("test", "sleep", {})])])
+        parameters = Parameters("runci.yml", ["test"], 0, statedir=self.statedir,
+                                metrics=os.path.join(self.statedir, "file", "runci.prom"))
+        # The metrics file can't be written, as its directory is a file.
+        open(os.path.join(self.statedir, "file"), 'w').close()
+        context = core.create_context(project, parameters)
+        context.runners["sleep"] = SleepRunner
+        # Close the metrics listener first
+        context.observers.sort(key=lambda listener: not isinstance(listener, MetricsListener))
+
+        with patch('sys.stderr', new_callable=io.StringIO) as stderr:
+            status = asyncio.run(run_project(context))
+
+        self.assertEqual(status, JobStatus.SUCCEEDED)
+        self.assertIn("MetricsListener failed to close", stderr.getvalue())
+        self.assertTrue(os.path.isfile(os.path.join(self.statedir, TRACE_FILE)))
+
+    def test_no_statedir(self):
+        project = Project([], [Target("test", [], [])])
+        context = core.create_context(project, Parameters("runci.yml", ["test"], 0))
+        listener = TraceListener(context)
+
+        self.assertDictEqual(listener.event_processors, dict())
+        listener.close()
+
+    def test_interrupted_step(self):
+        target = Target("test", [], [Step("step", "sleep", {})])
+        project = Project([], [target])
+        parameters = Parameters("runci.yml", ["test"], 0, statedir=self.statedir)
+        listener = TraceListener(core.create_context(project, parameters))
+        listener.record(event.JobStartEvent(target, datetime.now()))
+        listener.record(event.JobStepStartEvent(target, target.steps[0]))
+
+        timeline = listener.get_timelines()["test"]
+        self.assertEqual(timeline.steps[0][3], "interrupted")
+        self.assertIsNotNone(timeline.end)
@@ -0,0 +1,119 @@
+import asyncio
+import os
+import sys
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from click.testing import CliRunner
+
+from runci.dal.logstore import LogReader, LogWriter, get_log_paths
+from runci.engine import core
+from runci.engine.runner.base import RunnerBase
+from runci.entities.config import Project, Target, Step
+from runci.entities.context import Context
+from runci.entities.parameters import Parameters
+from runci.viewer.main import main
+
+
+class test_logstore(unittest.TestCase):
+    def setUp(self):
+        self._directory = tempfile.TemporaryDirectory()
+        self.statedir = self._directory.name
+
+    def tearDown(self):
+        self._directory.cleanup()
+
+    def write_log(self, chunks):
+        writer = LogWriter(self.statedir, "test")
+        for chunk in chunks:
+            writer.write(chunk)
+        writer.close()
+
+    def test_lines(self):
+        self.write_log([b"line 1\nli", b"ne 2\n\nline", b" 4"])
+        with LogReader(self.statedir, "test") as reader:
+            self.assertEqual(len(reader), 4)
+            self.assertEqual(reader.get_line(0), b"line 1\n")
+            self.assertEqual(reader.get_line(1), b"line 2\n")
+            self.assertEqual(reader.get_line(2), b"\n")
+            self.assertEqual(reader.get_line(3), b"line 4")
+            self.assertListEqual(list(reader.tail(2)), [(2, b"\n"), (3, b"line 4")])
+
+    def test_grep(self):
+        self.write_log([b"ok\nerror: one\nok\nok error: two error\n"])
+        with LogReader(self.statedir, "test") as reader:
+            self.assertListEqual(list(reader.grep(b"error")), [(1, b"error: one\n"), (3, b"ok error: two error\n")])
+            self.assertListEqual(list(reader.grep(b"^ok$")), [(0, b"ok\n"), (2, b"ok\n")])
+
+    def test_empty_log(self):
+        self.write_log([])
+        with LogReader(self.statedir, "test") as reader:
+            self.assertEqual(len(reader), 0)
+            self.assertListEqual(list(reader.grep(b"error")), [])
+
+    def test_sanitized_names(self):
+        for name in ["a/b", "a_b"]:
+            writer = LogWriter(self.statedir, name)
+            writer.write(name.encode('utf-8'))
+            writer.close()
+
+        self.assertNotEqual(get_log_paths(self.statedir, "a/b"), get_log_paths(self.statedir, "a_b"))
+        for name in ["a/b", "a_b"]:
+            with LogReader(self.statedir, name) as reader:
+                self.assertEqual(reader.get_line(0), name.encode('utf-8'))
+
+    def test_missing_index(self):
+        self.write_log([b"line 1\n"])
+        os.remove(get_log_paths(self.statedir, "test")[1])
+        opened = []
+
+        def open_file(*args):
+            opened.append(open(*args))
+            return opened[-1]
+
+        with patch('runci.dal.logstore.open', side_effect=open_file, create=True), \
+                self.assertRaises(FileNotFoundError):
+            LogReader(self.statedir, "test")
+        self.assertEqual(len(opened), 1)
+        self.assertTrue(opened[0].closed)
+
+    def test_listener(self):
+        class TestRunner(RunnerBase):
+            async def run_internal(self, context: Context):
+                self._log_message(sys.stdout, b"output 1\noutput 2\n")
+
+        project = Project([], [Target("test", [], [Step("test", "mock", {})])])
+        parameters = Parameters("runci.yml", ["test"], 0, statedir=self.statedir)
+        context = core.create_context(project, parameters)
+        context.runners["mock"] = TestRunner
+
+        async def run():
+            task = core.DependencyTree(context).start()
+            await context.bus.run(task)
+
+        asyncio.run(run())
+        with LogReader(self.statedir, "test") as reader:
+            self.assertListEqual(list(reader.grep(b"output")), [(1, b"output 1\n"), (2, b"output 2\n")])
+
+    def test_viewer(self):
+        runner = CliRunner()
+        with runner.isolated_filesystem():
+            self.statedir = os.path.join(os.getcwd(), ".runci")
+            self.write_log([b"line %d\n" % number for number in range(1, 11)])
+
+            result = runner.invoke(main, ['-l', '3', '-c', '2', 'test'])
+            self.assertEqual(result.output, "line 3\nline 4\n")
+
+            result = runner.invoke(main, ['-n', '--tail', '1', 'test'])
+            self.assertEqual(result.output, "10: line 10\n")
+
+            result = runner.invoke(main, ['--grep', 'line 1', 'test'])
+            self.assertEqual(result.output, "line 1\nline 10\n")
+
+            result = runner.invoke(main, ['unknown'])
+            self.assertEqual(result.exit_code, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,87 @@
+import asyncio
+import unittest
+
+from parameterized import parameterized
+
+from runci.engine.pull import PullCoordinator, get_image_key
+
+
+class test_pull_coordinator(unittest.TestCase):
+    @parameterized.expand([
+        ("busybox", "busybox:latest"),
+        ("busybox:1.36", "busybox:1.36"),
+        ("localhost:5000/app", "localhost:5000/app:latest"),
+        ("busybox@sha256:abc", "busybox@sha256:abc"),
+    ])
+    def test_image_key(self, image, key):
+        self.assertEqual(get_image_key(image), key)
+
+    def test_shared_pull(self):
+        pulled = []
+
+        async def puller(image):
+            pulled.append(image)
+            await asyncio.sleep(0.01)
+            return True
+
+        async def run():
+            coordinator = PullCoordinator()
+            results = await asyncio.gather(*[coordinator.pull(image, puller)
+                                             for image in ["busybox", "busybox:latest", "alpine"]])
+            self.assertTrue(coordinator.is_pulled("busybox"))
+            results.append(await coordinator.pull("busybox", puller))
+            return results
+
+        self.assertListEqual(asyncio.run(run()), [True, True, True, True])
+        self.assertListEqual(pulled, ["busybox", "alpine"])
+
+    def test_failed_pull_retried(self):
+        pulled = []
+
+        async def puller(image):
+            pulled.append(image)
+            return len(pulled) > 1
+
+        async def run():
+            coordinator = PullCoordinator()
+            return [await coordinator.pull("busybox", puller), await coordinator.pull("busybox", puller)]
+
+        self.assertListEqual(asyncio.run(run()), [False, True])
+        self.assertEqual(len(pulled), 2)
+
+    def test_max_pulls(self):
+        running = []
+        peak = []
+
+        async def puller(image):
+            running.append(image)
+            peak.append(len(running))
+            await asyncio.sleep(0.01)
+            running.remove(image)
+            return True
+
+        async def run():
+            coordinator = PullCoordinator(2)
+            await asyncio.gather(*[coordinator.pull("image%d" % i, puller) for i in range(6)])
+
+        asyncio.run(run())
+        self.assertEqual(max(peak), 2)
+
+    def test_canceled_waiter(self):
+        async def puller(image):
+            await asyncio.sleep(0.01)
+            return True
+
+        async def run():
+            coordinator = PullCoordinator()
+            first = asyncio.ensure_future(coordinator.pull("busybox", puller))
+            second = asyncio.ensure_future(coordinator.pull("busybox", puller))
+            await asyncio.sleep(0)
+            first.cancel()
+            return await second
+
+        self.assertTrue(asyncio.run(run()))
+
+
+if __name__ == '__main__':
+    unittest.main()
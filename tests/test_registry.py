@@ -0,0 +1,95 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from parameterized import parameterized
+
+from runci.engine import core
+from runci.engine.listener.base import ListenerBase
+from runci.engine.registry import RunnerRegistry, builtin_runners, get_entry_points, load_object
+from runci.engine import registry as registry_module
+from runci.engine.runner.base import RunnerBase
+
+
+class MockRunner(RunnerBase):
+    _selector = "mock"
+
+
+class MockListener(ListenerBase):
+    contexts = []
+
+    def __init__(self, context=None):
+        super().__init__(context)
+        MockListener.contexts.append(context)
+
+
+class test_registry(unittest.TestCase):
+    @parameterized.expand(builtin_runners.items())
+    def test_builtin_runners(self, selector, path):
+        self.assertEqual(load_object(path).get_selector(), selector)
+
+    def test_lazy_import(self):
+        registry = RunnerRegistry({"mock": "tests.test_registry:MockRunner"}, entry_points=None)
+        with patch('runci.engine.registry.load_object', side_effect=load_object) as mock:
+            self.assertIn("mock", registry)
+            self.assertNotIn("unknown", registry)
+            self.assertFalse(registry.is_loaded("mock"))
+            mock.assert_not_called()
+
+            self.assertIs(registry.get("mock"), MockRunner)
+            self.assertIs(registry["mock"], MockRunner)
+            self.assertIsNone(registry.get("unknown"))
+            mock.assert_called_once_with("tests.test_registry:MockRunner")
+
+    def test_assignment(self):
+        registry = RunnerRegistry(entry_points=None)
+        registry["mock"] = MockRunner
+        self.assertListEqual(list(registry), ["mock"])
+        del registry["mock"]
+        self.assertEqual(len(registry), 0)
+
+    @patch('runci.engine.registry.get_entry_points', return_value={"mock": "tests.test_registry:MockRunner"})
+    def test_entry_points(self, mock):
+        registry = RunnerRegistry(builtin_runners)
+        self.assertIs(registry.get("mock"), MockRunner)
+        self.assertIn("docker-pull", list(registry))
+        mock.assert_called_with("runci.runners", None)
+
+    @patch('runci.engine.registry.get_entry_points', return_value={"mock": "tests.test_registry:MockListener"})
+    def test_listener_entry_points(self, mock):
+        context = core.create_context(None, None)
+        self.assertIs(MockListener.contexts[-1], context)
+        self.assertFalse(context.runners.is_loaded("docker-build"))
+
+    def test_entry_points_cache(self):
+        groups = {"runci.runners": {"mock": "tests.test_registry:MockRunner"}}
+        key = [("/site-packages", 1)]
+        with tempfile.TemporaryDirectory() as statedir, \
+                patch('runci.engine.registry._scan_entry_points', return_value=groups) as scan, \
+                patch('runci.engine.registry.get_environment_key', return_value=key):
+            registry_module._get_installed_entry_points.cache_clear()
+            self.assertDictEqual(get_entry_points("runci.runners", statedir), groups["runci.runners"])
+            self.assertDictEqual(get_entry_points("runci.listeners", statedir), dict())
+            self.assertTrue(os.path.isfile(os.path.join(statedir, "entrypoints.cache")))
+
+            # Another run loads the scan from the state directory
+            registry_module._get_installed_entry_points.cache_clear()
+            self.assertDictEqual(get_entry_points("runci.runners", statedir), groups["runci.runners"])
+            self.assertEqual(scan.call_count, 1)
+
+            # Installing a distribution changes the key
+            key.append(("/user-site-packages", 2))
+            registry_module._get_installed_entry_points.cache_clear()
+            get_entry_points("runci.runners", statedir)
+            self.assertEqual(scan.call_count, 2)
+            registry_module._get_installed_entry_points.cache_clear()
+
+    def test_scanned_modules(self):
+        context = core.create_context(None, None, modules=["tests.test_registry"])
+        self.assertIs(context.runners.get("mock"), MockRunner)
+        self.assertIsNone(context.runners.get("docker-pull"))
+
+
+if __name__ == '__main__':
+    unittest.main()
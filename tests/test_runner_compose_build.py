@@ -1,9 +1,12 @@
 import asyncio
+import os
+import tempfile
 import unittest
 from runci.entities.config import Project, Target, Step
 from runci.entities.parameters import Parameters
 from runci.engine.core import create_context, DependencyTree
 from runci.engine.runner.compose_build import ComposeBuildRunner
+from runci.entities.event import JobStepCachedEvent
 from unittest.mock import patch
 
 
@@ -29,6 +32,71 @@ class test_runner_compose_build(unittest.TestCase):
         asyncio.run(run())
         mock.assert_called_once_with('docker-compose -f runci.yml build'.split(' '))
 
+    def run_fingerprinted(self, images_output):
+        events = []
+        build_calls = []
+        with tempfile.TemporaryDirectory() as path:
+            compose_file = os.path.join(path, "docker-compose.yml")
+            with open(compose_file, 'w') as f:
+                f.write("version: '2.4'\nservices:\n  app:\n    build: .\n  db:\n    image: postgres\n")
+            with open(os.path.join(path, "Dockerfile"), 'w') as f:
+                f.write("FROM scratch\n")
+
+            async def run_process(args):
+                with open(args[args.index(compose_file) + 2]) as f:
+                    build_calls.append((args, f.read()))
+
+            step = Step("test", "compose-build", {"file": compose_file, "fingerprint": True})
+            with patch('runci.engine.runner.compose_build.ComposeBuildRunner._get_process_output',
+                       return_value=(0, images_output)), \
+                    patch('runci.engine.runner.compose_build.ComposeBuildRunner._run_process', side_effect=run_process):
+                runner = ComposeBuildRunner(None, step, events.append)
+                context = create_context(self.project, self.parameters)
+                asyncio.run(runner.run(context))
+
+        self.assertTrue(runner.is_succeeded)
+        return events, build_calls
+
+    def test_fingerprint_label(self):
+        events, build_calls = self.run_fingerprinted(b'')
+        self.assertEqual(len(build_calls), 1)
+        args, override = build_calls[0]
+        self.assertListEqual(args[-2:], ['build', 'app'])
+        self.assertIn("runci.fingerprint", override)
+        self.assertFalse(any([e for e in events if isinstance(e, JobStepCachedEvent)]))
+
+    def test_cached(self):
+        events, build_calls = self.run_fingerprinted(b'0123456789ab\n')
+        self.assertEqual(len(build_calls), 0)
+        self.assertTrue(any([e for e in events if isinstance(e, JobStepCachedEvent)]))
+
+    def run_memoized(self, *specs):
+        async def run_process(args):
+            await asyncio.sleep(0.01)
+
+        async def run():
+            context = create_context(self.project, self.parameters)
+            results = []
+            for concurrent_specs in specs:
+                runners = [ComposeBuildRunner(None, Step("test", "compose-build", spec), lambda e: None)
+                           for spec in concurrent_specs]
+                await asyncio.gather(*[runner.run(context) for runner in runners])
+                results.extend([runner.is_succeeded for runner in runners])
+            return results
+
+        with patch('runci.engine.runner.compose_build.ComposeBuildRunner._run_process', side_effect=run_process) as mock:
+            self.assertTrue(all(asyncio.run(run())))
+        return [c[0][0] for c in mock.call_args_list]
+
+    def test_concurrent_builds_shared(self):
+        calls = self.run_memoized([{"services": "app db"}, {"services": "db app"}])
+        self.assertListEqual(calls, ['docker-compose -f runci.yml build app db'.split(' ')])
+
+    def test_build_memoized(self):
+        calls = self.run_memoized([{}], [{"services": "app"}], [{"services": "app", "projectName": "other"}])
+        self.assertListEqual(calls, ['docker-compose -f runci.yml build'.split(' '),
+                                     'docker-compose -f runci.yml -p other build app'.split(' ')])
+
     @patch('runci.engine.runner.compose_build.ComposeBuildRunner.run')
     def test_integration(self, mock):
         context = create_context(self.project, self.parameters)
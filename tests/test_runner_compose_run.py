@@ -1,8 +1,12 @@
 import asyncio
+import os
+import tempfile
 import unittest
 from runci.entities.config import Project, Target, Step
+from runci.entities.context import Context
 from runci.entities.parameters import Parameters
 from runci.engine.core import create_context, DependencyTree
+from runci.engine.runner.compose_build import ComposeBuildRunner
 from runci.engine.runner.compose_run import ComposeRunRunner
 from unittest.mock import patch, call
 
@@ -18,17 +22,144 @@ class test_runner_compose_build(unittest.TestCase):
         )])
     parameters = Parameters(dataconnection="runci.yml", targets=["target"], verbosity=0)
 
+    @patch('runci.engine.cleanup.CleanupQueue._teardown')
     @patch('runci.engine.runner.compose_run.ComposeRunRunner._run_process')
-    def test_command_line_args(self, mock):
+    def test_command_line_args(self, mock, teardown_mock):
         async def run():
             runner = ComposeRunRunner(self.project.targets[0], self.step, lambda e: None)
             context = create_context(self.project, self.parameters)
             await runner.run(context)
+            await context.cleanup.close()
+
+        asyncio.run(run())
+        mock.assert_has_calls([call('docker-compose -f docker-compose.yml -f runci.yml -p test run --rm app'.split(' '))])
+        teardown_mock.assert_called_once_with('test',
+                                              'docker-compose -f docker-compose.yml -f runci.yml -p test down'.split(' '))
+
+    def test_wait_for_teardown(self):
+        calls = []
+
+        async def teardown(name, args):
+            calls.append('down start')
+            await asyncio.sleep(0.02)
+            calls.append('down end')
+
+        async def run_process(args):
+            calls.append(args[-3])
+
+        async def run():
+            context = create_context(self.project, self.parameters)
+            for _ in range(2):
+                await ComposeRunRunner(self.project.targets[0], self.step, lambda e: None).run(context)
+            await context.cleanup.close()
+
+        with patch('runci.engine.cleanup.CleanupQueue._teardown', side_effect=teardown), \
+                patch('runci.engine.runner.compose_run.ComposeRunRunner._run_process', side_effect=run_process):
+            asyncio.run(run())
+
+        self.assertListEqual(calls, ['run', 'down start', 'down end', 'run', 'down start', 'down end'])
+
+    @patch('runci.engine.runner.compose_run.ComposeRunRunner._run_process')
+    def test_inline_teardown(self, mock):
+        async def run():
+            runner = ComposeRunRunner(self.project.targets[0], self.step, lambda e: None)
+            await runner.run(Context(self.project, self.parameters, dict(), dict(), dict()))
 
         asyncio.run(run())
         mock.assert_has_calls([call('docker-compose -f docker-compose.yml -f runci.yml -p test run --rm app'.split(' ')),
                                call('docker-compose -f docker-compose.yml -f runci.yml -p test down'.split(' '))])
 
+    @patch('runci.engine.cleanup.CleanupQueue._teardown')
+    @patch('runci.engine.runner.compose_run.ComposeRunRunner._run_process', side_effect=asyncio.CancelledError())
+    def test_teardown_on_cancel(self, mock, teardown_mock):
+        context = create_context(self.project, self.parameters)
+        with self.assertRaises(asyncio.CancelledError):
+            DependencyTree(context).run()
+        teardown_mock.assert_called_once()
+
+    def run_pooled(self, reset_results):
+        step = Step("test", "compose-run", {"services": "app", "build": False, "pool": True,
+                                            "reset": {"db": "psql -c 'TRUNCATE users'"}})
+        targets = [Target("target%d" % i, [], [step]) for i in range(3)]
+        project = Project(services=[], targets=targets)
+        context = create_context(project, self.parameters._replace(targets=[t.name for t in targets]))
+
+        async def run():
+            runners = []
+            for target in targets:
+                runners.append(ComposeRunRunner(target, step, lambda e: None))
+                await runners[-1].run(context)
+            context.composepool.close(context.cleanup)
+            await context.cleanup.close()
+            return runners
+
+        with patch('runci.engine.runner.compose_run.ComposeRunRunner._run_process', return_value=0) as run_mock, \
+                patch('runci.engine.runner.compose_run.ComposeRunRunner._get_process_output',
+                      side_effect=[(return_code, b"") for return_code in reset_results]) as reset_mock, \
+                patch('runci.engine.cleanup.CleanupQueue._teardown') as teardown_mock:
+            runners = asyncio.run(run())
+
+        self.assertTrue(all([runner.is_succeeded for runner in runners]))
+        projects = [c[0][0][c[0][0].index('-p') + 1] for c in run_mock.call_args_list]
+        torn_down = [c[0][0] for c in teardown_mock.call_args_list]
+        return projects, reset_mock, torn_down
+
+    def test_pooled_project(self):
+        projects, reset_mock, torn_down = self.run_pooled([0, 0])
+        self.assertEqual(len(set(projects)), 1)
+        self.assertEqual(reset_mock.call_count, 2)
+        reset_mock.assert_called_with(['docker-compose', '-f', 'docker-compose.yml', '-f', 'runci.yml', '-p', projects[0],
+                                       'exec', '-T', 'db', 'sh', '-c', "psql -c 'TRUNCATE users'"])
+        self.assertListEqual(torn_down, [projects[0]])
+
+    def test_pooled_project_evicted(self):
+        projects, reset_mock, torn_down = self.run_pooled([1, 0])
+        self.assertNotEqual(projects[0], projects[1])
+        self.assertEqual(projects[1], projects[2])
+        self.assertListEqual(sorted(torn_down), sorted([projects[0], projects[1]]))
+
+    @patch('runci.engine.cleanup.CleanupQueue._teardown')
+    @patch('runci.engine.runner.compose_run.ComposeRunRunner._run_process')
+    def test_build_memoized(self, mock, teardown_mock):
+        step = self.step._replace(spec={"services": "app", "projectName": "test", "build": True})
+
+        async def run():
+            context = create_context(self.project, self.parameters)
+            for _ in range(2):
+                await ComposeRunRunner(self.project.targets[0], step, lambda e: None).run(context)
+            await context.cleanup.close()
+
+        asyncio.run(run())
+        build_calls = [c for c in mock.call_args_list if 'build' in c[0][0]]
+        self.assertListEqual(build_calls,
+                             [call('docker-compose -f docker-compose.yml -f runci.yml -p test build -q'.split(' '))])
+
+    @patch('runci.engine.cleanup.CleanupQueue._teardown')
+    def test_build_shared_with_compose_build(self, teardown_mock):
+        with tempfile.TemporaryDirectory() as path:
+            compose_file = os.path.join(path, "docker-compose.yml")
+            config_file = os.path.join(path, "runci.yml")
+            with open(compose_file, 'w') as f:
+                f.write("version: '2.4'\nservices:\n  app:\n    build: .\n")
+            with open(config_file, 'w') as f:
+                f.write("services:\n  app:\n    environment:\n      - DEBUG=1\n")
+
+            build_step = Step("build", "compose-build", {"file": compose_file})
+            run_step = Step("test", "compose-run", {"file": "%s %s" % (compose_file, config_file), "services": "app"})
+
+            async def run():
+                context = create_context(self.project, self.parameters)
+                await ComposeBuildRunner(self.project.targets[0], build_step, lambda e: None).run(context)
+                await ComposeRunRunner(self.project.targets[0], run_step, lambda e: None).run(context)
+                await context.cleanup.close()
+
+            with patch('runci.engine.runner.compose_build.ComposeBuildRunner._run_process') as build_mock, \
+                    patch('runci.engine.runner.compose_run.ComposeRunRunner._run_process') as run_mock:
+                asyncio.run(run())
+
+        build_calls = [c for c in build_mock.call_args_list + run_mock.call_args_list if 'build' in c[0][0]]
+        self.assertListEqual(build_calls, [call(['docker-compose', '-f', compose_file, 'build'])])
+
     @patch('runci.engine.runner.compose_run.ComposeRunRunner.run')
     def test_integration(self, mock):
         context = create_context(self.project, self.parameters)
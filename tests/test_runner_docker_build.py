@@ -4,6 +4,7 @@ from runci.entities.config import Project, Target, Step
 from runci.entities.parameters import Parameters
 from runci.engine.core import create_context, DependencyTree
 from runci.engine.runner.docker_build import DockerBuildRunner
+from runci.entities.event import JobStepCachedEvent
 from unittest.mock import patch
 
 
@@ -24,14 +25,46 @@ class test_runner_docker_build(unittest.TestCase):
 
     @patch('runci.engine.runner.docker_build.DockerBuildRunner._run_process')
     def test_command_line_args(self, mock):
+        step = self.step._replace(spec=dict(self.step.spec, fingerprint=False))
+
         async def run():
-            runner = DockerBuildRunner(self.project.targets[0], self.step, lambda e: None)
+            runner = DockerBuildRunner(self.project.targets[0], step, lambda e: None)
             context = create_context(self.project, self.parameters)
             await runner.run(context)
 
         asyncio.run(run())
         mock.assert_called_once_with('docker build -f Dockerfile -t runci/tag:latest -t runci/tag:v1.0 .'.split(' '))
 
+    @patch('runci.engine.runner.docker_build.compute_fingerprint', return_value="abc")
+    @patch('runci.engine.runner.docker_build.DockerBuildRunner._get_process_output', return_value=(1, b''))
+    @patch('runci.engine.runner.docker_build.DockerBuildRunner._run_process')
+    def test_fingerprint_label(self, mock, mock_output, mock_fingerprint):
+        async def run():
+            runner = DockerBuildRunner(self.project.targets[0], self.step, lambda e: None)
+            context = create_context(self.project, self.parameters)
+            await runner.run(context)
+
+        asyncio.run(run())
+        mock.assert_called_once_with(('docker build -f Dockerfile -t runci/tag:latest -t runci/tag:v1.0 '
+                                      '--label runci.fingerprint=abc .').split(' '))
+
+    @patch('runci.engine.runner.docker_build.compute_fingerprint', return_value="abc")
+    @patch('runci.engine.runner.docker_build.DockerBuildRunner._get_process_output', return_value=(0, b'abc\nabc\n'))
+    @patch('runci.engine.runner.docker_build.DockerBuildRunner._run_process')
+    def test_cached(self, mock, mock_output, mock_fingerprint):
+        events = []
+
+        async def run():
+            runner = DockerBuildRunner(self.project.targets[0], self.step, events.append)
+            context = create_context(self.project, self.parameters)
+            await runner.run(context)
+            return runner
+
+        runner = asyncio.run(run())
+        self.assertTrue(runner.is_succeeded)
+        mock.assert_not_called()
+        self.assertTrue(any([e for e in events if isinstance(e, JobStepCachedEvent)]))
+
     @patch('runci.engine.runner.docker_build.DockerBuildRunner.run')
     def test_integration(self, mock):
         context = create_context(self.project, self.parameters)
@@ -1,10 +1,17 @@
 import asyncio
+import sys
+import tempfile
 import unittest
 
+from parameterized import parameterized
+
+from runci.dal.imagecache import ImageCache
 from runci.entities.config import Project, Target, Step
 from runci.entities.parameters import Parameters
 from runci.engine.core import create_context, DependencyTree
+from runci.engine.dockerapi import DockerAPIException
 from runci.engine.runner.docker_pull import DockerPullRunner
+from runci.entities import event
 from unittest.mock import patch, call
 
 
@@ -22,7 +29,7 @@ class test_runner_docker_build(unittest.TestCase):
         )])
     parameters = Parameters(dataconnection="runci.yml", targets=["target"], verbosity=0)
 
-    @patch('runci.engine.runner.docker_pull.DockerPullRunner._run_process')
+    @patch('runci.engine.runner.docker_pull.DockerPullRunner._run_process', return_value=0)
     def test_command_line_args(self, mock):
         async def run():
             runner = DockerPullRunner(self.project.targets[0], self.step, lambda e: None)
@@ -34,6 +41,91 @@ class test_runner_docker_build(unittest.TestCase):
             call('docker pull busybox'.split(' ')),
             call('docker pull alpine'.split(' '))])
 
+    @patch('runci.engine.runner.docker_pull.DockerPullRunner._run_process', return_value=0)
+    def test_shared_pulls(self, mock):
+        async def run():
+            context = create_context(self.project, self.parameters)
+            runners = [DockerPullRunner(self.project.targets[0], self.step, lambda e: None) for _ in range(3)]
+            await asyncio.gather(*[runner.run(context) for runner in runners])
+            return runners
+
+        runners = asyncio.run(run())
+        self.assertTrue(all([runner.is_succeeded for runner in runners]))
+        self.assertEqual(mock.call_count, 2)
+
+    @parameterized.expand([
+        (DockerAPIException(404, "pull access denied for busybox"),),
+        (ConnectionRefusedError("Connection refused"),),
+    ])
+    def test_api_pull_failure(self, exception):
+        events = []
+
+        async def pull_image(image):
+            raise exception
+            yield
+
+        async def run():
+            context = create_context(self.project, self.parameters._replace(backend='api'))
+            runner = DockerPullRunner(self.project.targets[0], self.step, events.append)
+            with patch.object(context.docker, 'pull_image', side_effect=pull_image):
+                await runner.run(context)
+            return runner
+
+        runner = asyncio.run(run())
+        self.assertFalse(runner.is_succeeded)
+        errors = [e.data for e in events if isinstance(e, event.JobMessageEvent) and e.stream is sys.stderr]
+        self.assertTrue(any([str(exception) in error for error in errors]))
+
+    def run_cached(self, image_ids, revalidate=False):
+        events = []
+        step = self.step._replace(spec={"image": "busybox", "revalidate": revalidate})
+
+        async def run():
+            context = create_context(self.project, self.parameters._replace(statedir=statedir, pullttl=60))
+            context.images.set("busybox", "sha256:1")
+            runner = DockerPullRunner(self.project.targets[0], step, events.append)
+            await runner.run(context)
+            await context.pulls.wait_background()
+            return runner, context.images.get("busybox")
+
+        with tempfile.TemporaryDirectory() as statedir, \
+                patch('runci.engine.runner.docker_pull.DockerPullRunner._run_process', return_value=0) as run_mock, \
+                patch('runci.engine.runner.docker_pull.DockerPullRunner._get_process_output',
+                      side_effect=[(0, image_id) for image_id in image_ids]) as output_mock:
+            runner, cached = asyncio.run(run())
+
+        self.assertTrue(runner.is_succeeded)
+        return events, run_mock, output_mock, cached
+
+    def test_cached_pull(self):
+        events, run_mock, _, cached = self.run_cached([b"sha256:1\n"])
+        run_mock.assert_not_called()
+        cached_events = [e for e in events if isinstance(e, event.JobImageCachedEvent)]
+        self.assertEqual([(e.image, e.image_id) for e in cached_events], [("busybox", "sha256:1")])
+
+    def test_cached_image_removed(self):
+        events, run_mock, _, cached = self.run_cached([b"", b"sha256:2\n"])
+        run_mock.assert_called_once_with(['docker', 'pull', 'busybox'])
+        self.assertEqual(cached[0], "sha256:2")
+
+    def test_cached_pull_revalidated(self):
+        events, run_mock, output_mock, cached = self.run_cached([b"sha256:1\n", b"", b"sha256:3\n"], revalidate=True)
+        run_mock.assert_not_called()
+        output_mock.assert_any_call(['docker', 'pull', 'busybox'])
+        self.assertEqual(cached[0], "sha256:3")
+
+    def test_cache_saved_after_run(self):
+        with tempfile.TemporaryDirectory() as statedir, \
+                patch('runci.engine.runner.docker_pull.DockerPullRunner._run_process', return_value=0), \
+                patch('runci.engine.runner.docker_pull.DockerPullRunner._get_process_output',
+                      return_value=(0, b"sha256:1\n")):
+            context = create_context(self.project, self.parameters._replace(statedir=statedir, pullttl=60))
+            DependencyTree(context).run()
+
+            cache = ImageCache(statedir, 60)
+            self.assertEqual(cache.get("busybox")[0], "sha256:1")
+            self.assertEqual(cache.get("alpine")[0], "sha256:1")
+
     @patch('runci.engine.runner.docker_pull.DockerPullRunner.run')
     def test_integration(self, mock):
         context = create_context(self.project, self.parameters)
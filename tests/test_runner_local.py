@@ -0,0 +1,96 @@
+import asyncio
+import os
+import sys
+import tempfile
+import unittest
+
+from parameterized import parameterized
+
+from runci.engine.core import create_context, DependencyTree
+from runci.engine.job import JobStatus
+from runci.engine.runner.local import ExecRunner, ShellRunner
+from runci.entities.config import Project, Target, Step
+from runci.entities.event import JobMessageEvent
+from runci.entities.parameters import Parameters
+
+
+@unittest.skipIf(sys.platform == "win32", "Commands are written for a posix shell")
+class test_runner_local(unittest.TestCase):
+    parameters = Parameters(dataconnection="runci.yml", targets=["target"], verbosity=0)
+
+    def run_step(self, runner_class, spec):
+        events = []
+        step = Step("test", runner_class.get_selector(), spec)
+        project = Project([], [Target("target", [], [step])])
+
+        runner = runner_class(project.targets[0], step, events.append)
+        asyncio.run(runner.run(create_context(project, self.parameters)))
+
+        output = b''.join([e.message.message for e in events
+                           if isinstance(e, JobMessageEvent) and isinstance(e.message.message, bytes)])
+        return runner, output.decode()
+
+    @parameterized.expand([
+        ({"_": "echo hello"}, "hello\n"),
+        ({"command": ["echo", "hello world"]}, "hello world\n"),
+        ({"command": "sh -c 'echo $GREETING'", "env": {"GREETING": "hi"}}, "hi\n"),
+    ])
+    def test_exec(self, spec, output):
+        runner, actual_output = self.run_step(ExecRunner, spec)
+        self.assertTrue(runner.is_succeeded)
+        self.assertEqual(actual_output, output)
+
+    def test_shell_workdir(self):
+        with tempfile.TemporaryDirectory() as directory:
+            runner, output = self.run_step(ShellRunner, {"_": "pwd && echo $A$B", "workdir": directory,
+                                                         "env": {"A": 1, "B": "x"}})
+            self.assertTrue(runner.is_succeeded)
+            self.assertEqual(output, "%s\n1x\n" % os.path.realpath(directory))
+
+    def test_concurrent_commands(self):
+        # Each command waits for the other one, which only completes when both run at once.
+        with tempfile.TemporaryDirectory() as directory:
+            commands = ["touch {0}/a; while [ ! -f {0}/b ]; do sleep 0.01; done; echo a",
+                        "touch {0}/b; while [ ! -f {0}/a ]; do sleep 0.01; done; echo b"]
+            runner, output = self.run_step(ShellRunner, {"commands": [c.format(directory) for c in commands]})
+
+        self.assertTrue(runner.is_succeeded)
+        self.assertEqual(sorted(output.split()), ["a", "b"])
+
+    @parameterized.expand([(True, ["next"]), (False, [])])
+    def test_failed_command(self, parallel, output):
+        runner, actual_output = self.run_step(ShellRunner, {"commands": ["exit 1", "echo next"], "parallel": parallel})
+        self.assertFalse(runner.is_succeeded)
+        self.assertEqual(actual_output.split(), output)
+
+    def test_spawn_error_kills_siblings(self):
+        events = []
+        spec = {"commands": [["sh", "-c", "sleep 0.2; echo late output"], ["/non/existent/command"]]}
+        step = Step("test", "exec", spec)
+        project = Project([], [Target("target", [], [step])])
+        runner = ExecRunner(project.targets[0], step, events.append)
+
+        async def run():
+            await runner.run(create_context(project, self.parameters))
+            ended = len(events)
+            await asyncio.sleep(0.4)
+            return ended
+
+        ended = asyncio.run(run())
+        self.assertFalse(runner.is_succeeded)
+        self.assertEqual(len(events), ended)
+        self.assertNotIn(b"late output\n", [e.data for e in events if isinstance(e, JobMessageEvent)])
+
+    def test_missing_command(self):
+        runner, _ = self.run_step(ExecRunner, {})
+        self.assertFalse(runner.is_succeeded)
+
+    def test_integration(self):
+        project = Project([], [Target("target", [], [Step("test", "shell", {"_": "true"})])])
+        context = create_context(project, self.parameters)
+        DependencyTree(context).run()
+        self.assertEqual(context.jobs["target"].status, JobStatus.SUCCEEDED)
+
+
+if __name__ == '__main__':
+    unittest.main()